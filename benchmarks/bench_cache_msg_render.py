@@ -0,0 +1,112 @@
+"""Compares rendering of cache notifications with large inline content.
+
+* legacy - the original format_cache_msg, rewriting the message in place
+  (deepcopy per rewritten link, os.getenv per message), then json.dumps and
+  the encode paho does for str payloads
+* render_cache_msg - Wis2Message.render_cache_msg, an overlay on the
+  untouched original serialized to bytes
+
+and the error notification of a failed record:
+
+* legacy error - deepcopy of the message, json.dumps for the publish and
+  again for the log line
+* overlay error - shallow copy of the message, json_codec.dumps once
+
+Notifications carry base64 inline content of the sizes below and four links.
+The new paths use the json_codec backend, JSON_CODEC=json for the stdlib.
+
+    python benchmarks/bench_cache_msg_render.py [iterations]
+"""
+import base64
+import json
+import os
+import sys
+import time
+from copy import deepcopy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'manager_lambda'))
+os.environ.setdefault('REPORT_BY', 'bench-global-cache')
+
+import json_codec  # noqa: E402
+from wis2_message import Wis2Message  # noqa: E402
+
+ENV = {'s3_bucket_name': 'bench'}
+SIZES = [(1024, '1 KiB'), (100 * 1024, '100 KiB'), (1024 * 1024, '1 MiB'), (4 * 1024 * 1024, '4 MiB')]
+
+
+def notification(size: int) -> dict:
+    href = 'https://dd.weather.gc.ca/bufr/000001.bufr4'
+    return {
+        'id': '00000000-0000-0000-0000-000000000001',
+        'type': 'Feature',
+        'version': 'v04',
+        'geometry': None,
+        'properties': {
+            'data_id': 'ca-eccc-msc/data/core/weather/surface-based-observations/synop/WIGOS_0-20000-0-000001',
+            'pubtime': '2025-01-01T00:00:01Z',
+            'datetime': '2025-01-01T00:00:00Z',
+            'integrity': {'method': 'sha512', 'value': 'x' * 88},
+            'content': {'encoding': 'base64', 'value': base64.b64encode(os.urandom(size)).decode(), 'size': size},
+        },
+        'links': [{'rel': 'canonical', 'type': 'application/bufr', 'href': href},
+                  {'rel': 'via', 'type': 'text/html', 'href': 'https://dd.weather.gc.ca/'},
+                  {'rel': 'update', 'type': 'application/bufr', 'href': href},
+                  {'rel': 'describedby', 'type': 'application/json', 'href': 'https://dd.weather.gc.ca/md'}],
+        'topic': 'origin/a/wis2/ca-eccc-msc/data/core/weather/surface-based-observations/synop',
+    }
+
+
+def legacy_render(wis2_msg: Wis2Message) -> bytes:
+    cache_msg = wis2_msg.msg
+    cache_msg['id'] = wis2_msg.new_uuid
+    cache_msg['properties']['global-cache'] = os.getenv('REPORT_BY')
+    cache_msg.pop('topic', None)
+    for link_type in ['canonical', 'update']:
+        links = [link for link in cache_msg['links'] if link['rel'] == link_type]
+        if links:
+            original_link = cache_msg['links'].pop(cache_msg['links'].index(links[0]))
+            new_link = deepcopy(original_link)
+            new_link['href'] = wis2_msg.dnld_url
+            cache_msg['links'].append(new_link)
+    return json.dumps(cache_msg).encode()
+
+
+def legacy_error(wis2_msg: Wis2Message) -> tuple:
+    error_msg = deepcopy(wis2_msg.msg)
+    error_msg['error'] = {'msg': 'error', 'traceback': ''}
+    # published, then logged
+    return json.dumps(error_msg), f"error msg: {json.dumps(error_msg)}"
+
+
+def overlay_error(wis2_msg: Wis2Message) -> tuple:
+    error_msg = dict(wis2_msg.msg)
+    error_msg['error'] = {'msg': 'error', 'traceback': ''}
+    payload = json_codec.dumps(error_msg)
+    return payload, f"error msg: {payload.decode()}"
+
+
+def timed(render, wis2_msg, iterations) -> float:
+    render(wis2_msg)
+    st = time.perf_counter()
+    for _ in range(iterations):
+        render(wis2_msg)
+    return (time.perf_counter() - st) / iterations * 1000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    strategies = {'legacy': legacy_render, 'render_cache_msg': Wis2Message.render_cache_msg,
+                  'legacy error': legacy_error, 'overlay error': overlay_error}
+    print(f"{'content':<10}" + ''.join(f"{name:>20}" for name in strategies))
+    for size, label in SIZES:
+        row = f"{label:<10}"
+        for name, render in strategies.items():
+            # legacy_render rewrites the message, every strategy gets its own
+            wis2_msg = Wis2Message(notification(size), ENV)
+            wis2_msg.set_bucket_url()
+            row += f"{timed(render, wis2_msg, iterations):>17.3f} ms"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
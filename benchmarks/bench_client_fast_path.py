@@ -0,0 +1,81 @@
+"""Compares the client's old decode/mutate/re-encode path with the pass-through fast path.
+
+The old path did json.loads, added 'topic', and json.dumps'd the whole
+notification for SQS. The fast path decodes once (orjson when installed) to read
+the dedup fields and forwards the original payload with the topic as an SQS
+message attribute.
+
+    python benchmarks/bench_client_fast_path.py
+"""
+import base64
+import json
+import os
+import time
+import uuid
+
+try:
+    from orjson import loads as fast_loads
+except ImportError:
+    fast_loads = None
+
+TOPIC = 'origin/a/wis2/de-dwd/data/core/weather/surface-based-observations/synop'
+
+
+def notification(content_bytes: int) -> bytes:
+    msg = {
+        'id': str(uuid.uuid4()),
+        'conformsTo': ['http://wis.wmo.int/spec/wnm/1/conf/core'],
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [6.95, 50.93]},
+        'properties': {
+            'data_id': 'de-dwd/data/core/weather/surface-based-observations/synop/WIGOS_0-20000-0-10513_20241016T120000',
+            'metadata_id': 'urn:wmo:md:de-dwd:surface-based-observations.synop',
+            'pubtime': '2024-10-16T12:04:31.123456Z',
+            'datetime': '2024-10-16T12:00:00Z',
+            'integrity': {'method': 'sha512', 'value': base64.b64encode(os.urandom(64)).decode()},
+        },
+        'links': [{'href': 'https://opendata.dwd.de/weather/wis2/synop/A_ISMD01EDZW161200.bufr',
+                   'rel': 'canonical', 'type': 'application/bufr', 'length': content_bytes}],
+    }
+    if content_bytes:
+        msg['properties']['content'] = {'encoding': 'base64', 'size': content_bytes,
+                                        'value': base64.b64encode(os.urandom(content_bytes)).decode()}
+    return json.dumps(msg).encode()
+
+
+def old_path(payload: bytes):
+    message_json = json.loads(payload)
+    message_json['topic'] = TOPIC
+    return json.dumps(message_json)
+
+
+def fast_path(loads):
+    def run(payload: bytes):
+        message_json = loads(payload)
+        message_json['topic'] = TOPIC
+        return payload.decode(), {'topic': {'DataType': 'String', 'StringValue': TOPIC}}
+    return run
+
+
+def bench(fn, payload: bytes, min_seconds: float = 0.5) -> float:
+    n, st = 0, time.perf_counter()
+    while time.perf_counter() - st < min_seconds:
+        fn(payload)
+        n += 1
+    return (time.perf_counter() - st) / n * 1e6
+
+
+def main():
+    paths = [('json loads+dumps', old_path), ('json pass-through', fast_path(json.loads))]
+    if fast_loads is not None:
+        paths.append(('orjson pass-through', fast_path(fast_loads)))
+    print(f"{'payload':>10} " + " ".join(f"{name:>22}" for name, _ in paths) + "   (us/message)")
+    # no inline content, a typical BUFR bulletin, and inline content close to the SQS 256 KB limit
+    for content_bytes in (0, 4096, 32 * 1024, 180 * 1024):
+        payload = notification(content_bytes)
+        timings = [bench(fn, payload) for _, fn in paths]
+        print(f"{len(payload):>10,} " + " ".join(f"{t:>22.1f}" for t in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compares the client's BucketedDedupStore with a cachetools TTLCache.
+
+Reports memory per entry (tracemalloc) and insert/lookup throughput. Keys are
+allocated up front, so the TTLCache figure does not include the id strings it
+keeps alive in production (roughly 85 bytes each for a uuid).
+
+    python benchmarks/bench_dedup_store.py [n_entries]
+"""
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'client'))
+from dedup_store import BucketedDedupStore  # noqa: E402
+
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
+
+
+def ttl_cache_check_and_add(cache):
+    # same access pattern as the client's original is_cached()
+    def check_and_add(key):
+        try:
+            cache[key]
+            return True
+        except KeyError:
+            cache[key] = 1
+            return False
+    return check_and_add
+
+
+def run(name, factory, keys):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    store, check_and_add = factory()
+    st = time.perf_counter()
+    for key in keys:
+        check_and_add(key)
+    insert_s = time.perf_counter() - st
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    st = time.perf_counter()
+    for key in keys:
+        check_and_add(key)
+    lookup_s = time.perf_counter() - st
+    n = len(keys)
+    print(f"{name:<22} {used / n:>10.1f} B/entry {n / insert_s:>12,.0f} inserts/s {n / lookup_s:>12,.0f} hits/s")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # message ids as published by the global brokers are uuid strings
+    keys = [str(uuid.uuid4()) for _ in range(n)]
+    print(f"{n:,} entries")
+
+    def bucketed():
+        store = BucketedDedupStore(ttl_seconds=1800, memory_budget_bytes=1024 ** 3)
+        return store, store.check_and_add
+    run('BucketedDedupStore', bucketed, keys)
+
+    if TTLCache is None:
+        print("cachetools not installed, skipping TTLCache")
+        return
+
+    def ttl_cache():
+        cache = TTLCache(maxsize=n, ttl=timedelta(minutes=30), timer=datetime.now)
+        return cache, ttl_cache_check_and_add(cache)
+    run('TTLCache', ttl_cache, keys)
+
+
+if __name__ == '__main__':
+    main()
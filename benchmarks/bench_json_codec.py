@@ -0,0 +1,83 @@
+"""Compares JSON decoding and encoding of WIS2 notifications.
+
+* stdlib str - what the client and lambda did: payload bytes decoded to str,
+  json.loads, json.dumps, str encoded to bytes for paho
+* json_codec[json] - the shared codec on the stdlib, bytes in and bytes out
+* json_codec[orjson] - the shared codec on orjson, if it is installed
+
+Notifications have no inline content (the common case) or base64 inline
+content of the sizes below. Times are per notification, decode and encode.
+
+    python benchmarks/bench_json_codec.py [iterations]
+"""
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'manager_lambda'))
+
+import json_codec  # noqa: E402
+
+SIZES = [(None, 'no content'), (1024, '1 KiB'), (16 * 1024, '16 KiB'), (256 * 1024, '256 KiB'),
+         (1024 * 1024, '1 MiB')]
+
+
+def notification(size) -> bytes:
+    msg = {
+        'id': '6c2e6b1c-8a2f-4b7e-9d3a-2f1e0c9b8a7d',
+        'type': 'Feature',
+        'version': 'v04',
+        'geometry': {'type': 'Point', 'coordinates': [-75.6972, 45.4215, 79.0]},
+        'properties': {
+            'data_id': 'ca-eccc-msc/data/core/weather/surface-based-observations/synop/WIGOS_0-20000-0-71628',
+            'metadata_id': 'urn:wmo:md:ca-eccc-msc:observations.swob',
+            'pubtime': '2025-01-01T00:00:01.123456Z',
+            'datetime': '2025-01-01T00:00:00Z',
+            'integrity': {'method': 'sha512', 'value': base64.b64encode(os.urandom(64)).decode()},
+        },
+        'links': [{'rel': 'canonical', 'type': 'application/bufr',
+                   'href': 'https://dd.weather.gc.ca/20250101/WXO-DD/observations/swob-ml/71628.bufr4',
+                   'length': size or 4096},
+                  {'rel': 'via', 'type': 'text/html', 'href': 'https://dd.weather.gc.ca/'}],
+    }
+    if size:
+        msg['properties']['content'] = {'encoding': 'base64', 'value': base64.b64encode(os.urandom(size)).decode(),
+                                        'size': size}
+    return json.dumps(msg).encode()
+
+
+def stdlib_str(payload: bytes) -> bytes:
+    return json.dumps(json.loads(payload.decode())).encode()
+
+
+def codec(payload: bytes) -> bytes:
+    return json_codec.dumps(json_codec.loads(payload))
+
+
+def timed(round_trip, payload, iterations) -> float:
+    round_trip(payload)
+    st = time.perf_counter()
+    for _ in range(iterations):
+        round_trip(payload)
+    return (time.perf_counter() - st) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    backends = ['json'] + (['orjson'] if json_codec.orjson is not None else [])
+    names = ['stdlib str'] + [f"json_codec[{backend}]" for backend in backends]
+    print(f"{'notification':<14}{'bytes':>10}" + ''.join(f"{name:>22}" for name in names))
+    for size, label in SIZES:
+        payload = notification(size)
+        row = f"{label:<14}{len(payload):>10}{timed(stdlib_str, payload, iterations):>19.1f} us"
+        for backend in backends:
+            json_codec.use_backend(backend)
+            row += f"{timed(codec, payload, iterations):>19.1f} us"
+        print(row)
+    json_codec.use_backend('auto')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Compares the Redis exchanges the manager lambda makes per cached notification.
+
+* sequential - the original calls: GET, GET, SET EX, INCR, SET, SET
+* cache_state - GET plus claim (SET NX PX) pipelined before the download, then
+  the COMMIT_SCRIPT (check-and-set, metric updates, claim release) after the
+  upload
+
+The stand-in keeps the data in a dict and sleeps ``rtt`` per network exchange,
+roughly an ElastiCache round trip from a Lambda in the same AZ. It runs the
+commit script's logic in Python, since no Lua interpreter is available here.
+
+    python benchmarks/bench_lambda_redis.py [n_messages] [rtt_ms]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'manager_lambda'))
+from cache_state import CacheState  # noqa: E402
+
+
+class LatencyRedis:
+    """Dict-backed redis stand-in charging one round trip per command or script call."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.data = {}
+        self.round_trips = 0
+
+    def _exchange(self):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+
+    def get(self, key):
+        self._exchange()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._exchange()
+        self.data[key] = str(value)
+        return True
+
+    def incr(self, key, amount=1):
+        self._exchange()
+        self.data[key] = str(int(self.data.get(key, 0)) + amount)
+        return int(self.data[key])
+
+    def pipeline(self, transaction=True):
+        return LatencyPipeline(self)
+
+    def register_script(self, script):
+        def commit(keys, args):
+            self._exchange()
+            # mirrors COMMIT_SCRIPT
+            if self.data.get(keys[1]) == args[3]:
+                del self.data[keys[1]]
+            last = self.data.get(keys[0])
+            if last is not None and (float(args[0]) <= float(last) or args[1] != '1'):
+                return 0
+            self.data[keys[0]] = str(args[0])
+            for i, key in enumerate(keys[2:]):
+                operation, value = args[4 + 2 * i], args[5 + 2 * i]
+                if operation == 'inc':
+                    self.data[key] = str(int(self.data.get(key, 0)) + int(value))
+                else:
+                    self.data[key] = str(value)
+            return 1
+        return commit
+
+
+class LatencyPipeline:
+    """Buffers commands and runs them in a single round trip on execute()."""
+
+    def __init__(self, client: LatencyRedis):
+        self.client = client
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append(lambda data: data.get(key))
+
+    def set(self, key, value, nx=False, px=None):
+        def run(data):
+            if nx and key in data:
+                return None
+            data[key] = str(value)
+            return True
+        self.commands.append(run)
+
+    def execute(self):
+        self.client._exchange()
+        return [command(self.client.data) for command in self.commands]
+
+
+def sequential(client, data_id, pubtime, centre, dataserver):
+    client.get(data_id)
+    # download and upload happen here
+    client.get(data_id)
+    client.set(data_id, pubtime, ex=21600)
+    client.incr(f"{centre}|wmo_wis2_gc_downloaded_total", 1)
+    client.set(f"{centre}|{dataserver}|wmo_wis2_gc_dataserver_last_download_timestamp_seconds", int(time.time()))
+    client.set(f"{centre}|{dataserver}|wmo_wis2_gc_dataserver_status_flag", 1)
+
+
+def scripted(state, data_id, pubtime, centre, dataserver):
+    state.claim(data_id, pubtime, 'token')
+    # download and upload happen here
+    state.commit(data_id, pubtime, False, 'token', [
+        (f"{centre}|wmo_wis2_gc_downloaded_total", 'inc', 1),
+        (f"{centre}|{dataserver}|wmo_wis2_gc_dataserver_last_download_timestamp_seconds", 'set', int(time.time())),
+        (f"{centre}|{dataserver}|wmo_wis2_gc_dataserver_status_flag", 'set', 1),
+    ])
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rtt = (float(sys.argv[2]) if len(sys.argv) > 2 else 0.5) / 1000
+    messages = [(f"c{i % 40:02d}-nmhs/data/core/weather/synop/WIGOS_0-20000-0-{i:05d}", 1.7e9 + i,
+                 f"c{i % 40:02d}-nmhs", f"data.c{i % 40:02d}.example") for i in range(n)]
+    print(f"{n:,} notifications, {rtt * 1000:.2f} ms per round trip")
+    for name in ('sequential', 'cache_state'):
+        client = LatencyRedis(rtt)
+        state = CacheState(client, 21600)
+        st = time.perf_counter()
+        for message in messages:
+            if name == 'sequential':
+                sequential(client, *message)
+            else:
+                scripted(state, *message)
+        elapsed = time.perf_counter() - st
+        print(f"{name:<12} {client.round_trips / n:>5.1f} round trips/msg {elapsed / n * 1000:>8.2f} ms/msg")
+
+
+if __name__ == '__main__':
+    main()
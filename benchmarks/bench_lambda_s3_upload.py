@@ -0,0 +1,105 @@
+"""Compares per-object upload latency of the manager lambda's S3 strategies.
+
+* client_per_object - the original: boto3.client('s3') and upload_fileobj per object
+* shared_fileobj - one client, upload_fileobj (transfer manager) per object
+* s3_uploads - one tuned client, put_object up to the multipart threshold,
+  concurrent multipart parts above it
+
+Uploads go to a minimal in-process S3 endpoint that discards the data and
+answers every request after ``rtt`` (roughly S3 from a Lambda in region), so
+the figures are client-side overhead plus round trips, not S3 throughput.
+
+    python benchmarks/bench_lambda_s3_upload.py [rtt_ms]
+"""
+import io
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'manager_lambda'))
+
+SIZES = [(1024, '1 KiB', 50), (100 * 1024, '100 KiB', 50), (2 * 1024 * 1024, '2 MiB', 20),
+         (24 * 1024 * 1024, '24 MiB', 4)]
+
+
+def s3_endpoint(rtt: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _read_body(self):
+            if self.headers.get('Transfer-Encoding') == 'chunked':
+                while True:
+                    size = int(self.rfile.readline().split(b';')[0], 16)
+                    self.rfile.read(size + 2)
+                    if size == 0:
+                        # trailers end with an empty line
+                        while self.rfile.readline() not in (b'\r\n', b''):
+                            pass
+                        return
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        def _reply(self, body=b''):
+            time.sleep(rtt)
+            self.send_response(200)
+            self.send_header('ETag', '"0"')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_PUT(self):
+            self._read_body()
+            self._reply()
+
+        def do_POST(self):
+            self._read_body()
+            if 'uploads' in self.path.split('?', 1)[-1]:
+                self._reply(b'<InitiateMultipartUploadResult><Bucket>b</Bucket><Key>k</Key>'
+                            b'<UploadId>1</UploadId></InitiateMultipartUploadResult>')
+            else:
+                self._reply(b'<CompleteMultipartUploadResult><Bucket>b</Bucket><Key>k</Key>'
+                            b'<ETag>"0"</ETag></CompleteMultipartUploadResult>')
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    rtt = (float(sys.argv[1]) if len(sys.argv) > 1 else 10) / 1000
+    server = s3_endpoint(rtt)
+    os.environ.update({'AWS_ENDPOINT_URL_S3': f"http://127.0.0.1:{server.server_port}",
+                       'AWS_ACCESS_KEY_ID': 'bench', 'AWS_SECRET_ACCESS_KEY': 'bench',
+                       'AWS_DEFAULT_REGION': 'us-east-1'})
+    import boto3
+    import s3_uploads
+
+    shared = boto3.client('s3')
+    strategies = {
+        'client_per_object': lambda key, body: boto3.client('s3').upload_fileobj(io.BytesIO(body), 'bench', key),
+        'shared_fileobj': lambda key, body: shared.upload_fileobj(io.BytesIO(body), 'bench', key),
+        's3_uploads': lambda key, body: s3_uploads.put_bytes('bench', key, body),
+    }
+    print(f"{rtt * 1000:.1f} ms per S3 request, multipart above {s3_uploads.MULTIPART_THRESHOLD // 2 ** 20} MiB, "
+          f"{s3_uploads.MULTIPART_PART_SIZE // 2 ** 20} MiB parts x {s3_uploads.MULTIPART_CONCURRENCY}")
+    print(f"{'size':<10}" + ''.join(f"{name:>20}" for name in strategies))
+    for size, label, repeat in SIZES:
+        body = os.urandom(size)
+        row = f"{label:<10}"
+        for name, upload in strategies.items():
+            # warm up connections and lazily created clients
+            upload('warmup', body)
+            st = time.perf_counter()
+            for i in range(repeat):
+                upload(f"data/{i}", body)
+            row += f"{(time.perf_counter() - st) / repeat * 1000:>17.1f} ms"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compares the SQS FIFO message group strategies of the client.
+
+For a synthetic synoptic-hour burst (a few hot centres, a long tail of small
+ones) it reports, per strategy:
+
+* groups - distinct MessageGroupIds, the ceiling on concurrent Lambda batches
+* hottest - share of messages in the busiest group, which is processed serially
+* drain - time to drain the burst with N concurrent consumers relative to an
+  unordered queue (FIFO allows one in-flight batch per group)
+* ordering - the ordering guarantee the strategy gives
+* keys/s - cost of computing the group id, first call and memoized
+
+    python benchmarks/bench_message_groups.py [consumers]
+"""
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'client'))
+import message_groups  # noqa: E402
+
+ORDERING = {
+    'data_id': 'per data_id',
+    'sharded': 'per data_id (and per shard)',
+    'centre': 'per data_id (and per centre)',
+}
+
+
+def burst(n_messages: int = 50000, n_centres: int = 150, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    # zipf-like centre sizes: a handful of centres publish most of the hour
+    weights = [1 / (rank + 1) for rank in range(n_centres)]
+    centres = [f"c{rank:03d}-nmhs" for rank in range(n_centres)]
+    messages = []
+    for centre in rng.choices(centres, weights=weights, k=n_messages):
+        station = rng.randrange(2000)
+        data_id = f"{centre}/data/core/weather/surface-based-observations/synop/WIGOS_0-20000-0-{station:05d}"
+        messages.append((data_id, f"origin/a/wis2/{centre}/data/core/weather/surface-based-observations/synop"))
+    return messages
+
+
+def drain_ratio(group_sizes: Counter, consumers: int) -> float:
+    total = sum(group_sizes.values())
+    unordered = total / consumers
+    # each group is consumed serially, so the biggest group bounds the drain time
+    return max(unordered, max(group_sizes.values())) / unordered
+
+
+def keys_per_second(strategy, messages: list) -> float:
+    st = time.perf_counter()
+    for data_id, topic in messages:
+        strategy(data_id, topic)
+    return len(messages) / (time.perf_counter() - st)
+
+
+def main():
+    consumers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    messages = burst()
+    print(f"{len(messages):,} messages, {consumers} concurrent consumers")
+    print(f"{'strategy':<14}{'groups':>8}{'hottest':>9}{'drain':>8}  {'ordering':<30}{'keys/s cold':>13}{'keys/s warm':>13}")
+    for name, shards in (('data_id', 0), ('sharded', 32), ('sharded', 256), ('centre', 0)):
+        for fn in (message_groups.data_id_group, message_groups.sharded_group, message_groups.centre_group):
+            fn.cache_clear()
+        strategy = message_groups.make_group_strategy(name, shards=shards or 32)
+        cold = keys_per_second(strategy, messages)
+        warm = keys_per_second(strategy, messages)
+        sizes = Counter(strategy(data_id, topic) for data_id, topic in messages)
+        label = f"{name}/{shards}" if shards else name
+        print(f"{label:<14}{len(sizes):>8}{max(sizes.values()) / len(messages):>9.1%}"
+              f"{drain_ratio(sizes, consumers):>7.1f}x  {ORDERING[name]:<30}{cold:>13,.0f}{warm:>13,.0f}")
+
+
+if __name__ == '__main__':
+    main()
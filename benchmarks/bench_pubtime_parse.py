@@ -0,0 +1,84 @@
+"""Compares pubtime parsing in the manager lambda.
+
+* legacy - the original init_parse: strptime, then string surgery and a
+  second strptime for fractions, naive (local time) timestamp()
+* parse_rfc3339 (cold) - rfc3339.parse_rfc3339 without its cache
+* parse_rfc3339 (burst) - with the cache, a burst of BURST notifications
+  sharing DISTINCT pubtimes, as when a centre publishes a batch at once
+
+Also prints what each parser makes of the RFC 3339 variants WIS2 centres
+emit, next to the epoch datetime.fromisoformat gives.
+
+    python benchmarks/bench_pubtime_parse.py [iterations]
+"""
+import os
+import sys
+import time
+from datetime import datetime as dt, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'manager_lambda'))
+
+from rfc3339 import parse_rfc3339  # noqa: E402
+
+VARIANTS = [
+    ('2025-01-01T00:00:00Z', '2025-01-01T00:00:00+00:00'),
+    ('2025-01-01T00:00:00.123Z', '2025-01-01T00:00:00.123+00:00'),
+    ('2025-01-01T00:00:00.123456Z', '2025-01-01T00:00:00.123456+00:00'),
+    ('2025-01-01T00:00:00.123456789Z', '2025-01-01T00:00:00.123456+00:00'),
+    ('2025-01-01T00:00:00:123Z', '2025-01-01T00:00:00.123+00:00'),
+    ('2025-01-01T00:00:00+00:00', '2025-01-01T00:00:00+00:00'),
+    ('2025-01-01T02:00:00.5+02:00', '2025-01-01T02:00:00.5+02:00'),
+]
+BURST = 1000
+DISTINCT = 20
+
+
+def legacy(pubtime: str) -> float:
+    try:
+        return dt.strptime(pubtime, '%Y-%m-%dT%H:%M:%SZ').timestamp()
+    except:  # noqa: E722
+        if len(pubtime.split(':')) == 4:
+            pubtime = pubtime.rsplit(':', 1)[0] + '.' + pubtime.rsplit(':', 1)[1]
+        dt_parts = pubtime.split('.')
+        dt_seconds = dt_parts[1]
+        if len(dt_seconds) > 4:
+            dt_seconds = dt_seconds[:3] + "Z"
+        new_dt = ".".join([dt_parts[0], dt_seconds])
+        return dt.strptime(new_dt, '%Y-%m-%dT%H:%M:%S.%fZ').timestamp()
+
+
+def attempt(parse, value):
+    try:
+        return f"{parse(value):.6f}"
+    except Exception as e:
+        return type(e).__name__
+
+
+def timed(parse, values, iterations) -> float:
+    st = time.perf_counter()
+    for _ in range(iterations):
+        for value in values:
+            parse(value)
+    return (time.perf_counter() - st) / (iterations * len(values)) * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"local timezone: {time.strftime('%Z')}, legacy results shift with it\n")
+    print(f"{'pubtime':<32}{'expected':>20}{'legacy':>20}{'parse_rfc3339':>20}")
+    for value, iso in VARIANTS:
+        expected = dt.fromisoformat(iso).astimezone(timezone.utc).timestamp()
+        print(f"{value:<32}{expected:>20.6f}{attempt(legacy, value):>20}{attempt(parse_rfc3339, value):>20}")
+
+    burst = [f"2025-01-01T00:00:{i % DISTINCT:02d}.{i % 7}Z" for i in range(BURST)]
+    unique = [f"2025-01-{1 + i // 86400 % 28:02d}T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000:03d}Z"
+              for i in range(BURST)]
+    print(f"\n{'parser':<24}{'us/pubtime':>12}")
+    print(f"{'legacy':<24}{timed(legacy, unique, iterations):>12.2f}")
+    print(f"{'parse_rfc3339 (cold)':<24}{timed(parse_rfc3339.__wrapped__, unique, iterations):>12.2f}")
+    parse_rfc3339.cache_clear()
+    print(f"{'parse_rfc3339 (burst)':<24}{timed(parse_rfc3339, burst, iterations):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
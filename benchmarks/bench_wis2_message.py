@@ -0,0 +1,85 @@
+"""Micro-benchmark of Wis2Message construction and cache-notification formatting.
+
+Builds a Wis2Message for every notification of a batch, sets the bucket url
+and formats the cache notification, as process_record does, for batches of
+1k to 100k notifications with one (canonical) and four links (canonical,
+update and two others). Per-message time should stay flat as the batch
+grows. The object size is the Wis2Message instance itself, with its
+attribute dict if it has one; the values it refers to are shared with the
+notification or the same either way.
+
+    python benchmarks/bench_wis2_message.py [max_batch]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'manager_lambda'))
+os.environ.setdefault('REPORT_BY', 'bench-global-cache')
+
+from wis2_message import Wis2Message  # noqa: E402
+
+ENV = {'s3_bucket_name': 'bench'}
+BATCHES = [1000, 10000, 100000]
+
+
+def notification(i: int, n_links: int) -> dict:
+    links = [{'rel': 'canonical', 'type': 'application/bufr',
+              'href': f"https://dd.weather.gc.ca/bufr/{i:06d}.bufr4"}]
+    if n_links > 1:
+        links += [{'rel': 'via', 'type': 'text/html', 'href': 'https://dd.weather.gc.ca/'},
+                  {'rel': 'update', 'type': 'application/bufr',
+                   'href': f"https://dd.weather.gc.ca/bufr/{i:06d}.bufr4"},
+                  {'rel': 'describedby', 'type': 'application/json', 'href': 'https://dd.weather.gc.ca/md'}][:n_links - 1]
+    return {
+        'id': f"00000000-0000-0000-0000-{i:012d}",
+        'type': 'Feature',
+        'version': 'v04',
+        'geometry': None,
+        'properties': {
+            'data_id': f"ca-eccc-msc/data/core/weather/surface-based-observations/synop/WIGOS_0-20000-0-{i:06d}",
+            'pubtime': f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z",
+            'datetime': '2025-01-01T00:00:00Z',
+            'integrity': {'method': 'sha512', 'value': 'x' * 88},
+        },
+        'links': links,
+        'topic': 'origin/a/wis2/ca-eccc-msc/data/core/weather/surface-based-observations/synop',
+    }
+
+
+def process(notifications: list) -> list:
+    messages = []
+    for msg in notifications:
+        wis2_msg = Wis2Message(msg, ENV)
+        wis2_msg.set_bucket_url()
+        wis2_msg.format_cache_msg()
+        messages.append(wis2_msg)
+    return messages
+
+
+def object_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def run(batch: int, n_links: int):
+    notifications = [notification(i, n_links) for i in range(batch)]
+    st = time.perf_counter()
+    messages = process(notifications)
+    elapsed = time.perf_counter() - st
+    return elapsed / batch * 1e6, object_size(messages[-1])
+
+
+def main():
+    max_batch = int(sys.argv[1]) if len(sys.argv) > 1 else BATCHES[-1]
+    print(f"{'batch':>8} {'links':>6} {'us/message':>12} {'object bytes':>13}")
+    for n_links in (1, 4):
+        for batch in [b for b in BATCHES if b <= max_batch]:
+            us, size = run(batch, n_links)
+            print(f"{batch:>8} {n_links:>6} {us:>12.2f} {size:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Cold-start and warm-path profile of the manager lambda.
+
+* cold start - ``python -X importtime -c "import wis2_lambda_consumer"`` in a
+  fresh interpreter, median of several runs, with the heaviest imports, and
+  the import of redis-py the first invocation pays
+* warm path - msg_handler on batches of 10 records, pass through and inline
+  content (cached), after a first warm-up invocation, with a cProfile of
+  the records
+
+The warm path runs against fakeredis (which executes the Lua scripts) and
+stubs for the MQTT brokers and S3, so it measures the lambda's own CPU time,
+not network round trips. The output is markdown; the checked-in report is
+benchmarks/lambda_profile.md, regenerate it after changes to the lambda, on
+the lambda's runtime and architecture where possible:
+
+    docker run --rm --platform linux/arm64 -v "$PWD":/repo -w /repo --entrypoint bash \
+        public.ecr.aws/lambda/python:3.10 -c "python -m pip install -q -r manager_lambda/requirements.txt \
+        fakeredis lupa > /dev/null && python benchmarks/profile_lambda.py" > benchmarks/lambda_profile.md
+
+or with the local interpreter:
+
+    python benchmarks/profile_lambda.py > benchmarks/lambda_profile.md
+"""
+import base64
+import cProfile
+import hashlib
+import io
+import json
+import os
+import platform
+import pstats
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'manager_lambda')
+ENV = {'CACHE_ENDPOINT': 'localhost', 'MQTT_BROKER_HOST': 'localhost', 'dest_bucket_name': 'bench',
+       'dest_bucket_region': 'us-east-1', 'REPORT_BY': 'bench-global-cache', 'DNS_CACHE_TTL_SECONDS': '0'}
+LAMBDA_MODULES = r'wis2_|rfc3339|lazy_redis|cache_state|circuit_breaker|mqtt_publisher|s3_uploads|http_sessions'
+# regressions past these show up as "over budget" in the report
+COLD_START_BUDGET_MS = 150
+# set on python 3.11 at 2.0 ms, the lambda's 3.10 runs the same records about a quarter slower
+WARM_RECORD_BUDGET_MS = 2.5
+COLD_START_RUNS = 15
+# runtime and architecture of the function, see deploy/stacks/wis2_lambda_stack.py
+LAMBDA_PYTHON = '3.10'
+LAMBDA_MACHINES = ('aarch64', 'arm64')
+WARM_INVOCATIONS = 50
+
+
+def cold_start():
+    env = dict(os.environ, **ENV)
+    totals, runs, deferred = [], [], []
+    for _ in range(COLD_START_RUNS):
+        # redis-py is imported by the first invocation (lazy_redis), not at cold start
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                                 'import wis2_lambda_consumer; import redis'],
+                                cwd=LAMBDA_DIR, env=env, capture_output=True, text=True, check=True)
+        # import time: self [us] | cumulative | imported package, children are listed before their parent
+        imports = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            imports.append((name.strip(), int(cumulative), (len(name) - len(name.lstrip())) // 2))
+        # interpreter startup (site) is listed first, the handler module last
+        handler_at = max(i for i, (name, _, depth) in enumerate(imports) if name == 'wis2_lambda_consumer')
+        direct = []
+        for name, cumulative, depth in reversed(imports[:handler_at]):
+            if depth == 0:
+                break
+            if depth == 1:
+                direct.append((cumulative, name))
+        totals.append(imports[handler_at][1])
+        runs.append(direct)
+        deferred.append(sum(cumulative for name, cumulative, depth in imports[handler_at + 1:] if depth == 0))
+    median_run = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    heaviest = sorted(median_run, reverse=True)[:8]
+    return statistics.median(totals), heaviest, statistics.median(deferred)
+
+
+class StubPublishInfo:
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return True
+
+
+class StubPublisher:
+    host = 'stub-broker'
+
+    def publish(self, topic, payload):
+        return StubPublishInfo()
+
+    def flush(self, timeout=30):
+        return 0
+
+
+class StubS3:
+    def put_object(self, **kwargs):
+        return {}
+
+
+def notification(i: int, cache: bool) -> dict:
+    body = f"synop bulletin {i}".encode()
+    msg = {
+        'id': str(uuid.uuid4()),
+        'type': 'Feature',
+        'version': 'v04',
+        'geometry': None,
+        'properties': {
+            'data_id': f"ca-eccc-msc/data/core/weather/surface-based-observations/synop/WIGOS_0-20000-0-{i:05d}",
+            'pubtime': f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z",
+            'datetime': '2025-01-01T00:00:00Z',
+            'integrity': {'method': 'sha512',
+                          'value': base64.b64encode(hashlib.sha512(body).digest()).decode()},
+            'content': {'encoding': 'base64', 'value': base64.b64encode(body).decode(), 'size': len(body)},
+        },
+        'links': [{'rel': 'canonical', 'type': 'application/bufr',
+                   'href': f"https://dd.weather.gc.ca/bufr/{i:05d}.bufr4"}],
+        'topic': 'origin/a/wis2/ca-eccc-msc/data/core/weather/surface-based-observations/synop',
+    }
+    if not cache:
+        msg['properties']['cache'] = False
+        del msg['properties']['content']
+    return msg
+
+
+def batch(start: int, cache: bool) -> dict:
+    records = []
+    for i in range(start, start + 10):
+        records.append({'messageId': str(uuid.uuid4()), 'body': json.dumps(notification(i, cache)),
+                        'attributes': {'MessageGroupId': f"group-{i}"}})
+    return {'Records': records}
+
+
+def warm_path():
+    import fakeredis
+
+    os.environ.update(ENV)
+    sys.path.insert(0, LAMBDA_DIR)
+    import circuit_breaker
+    import cache_state
+    import s3_uploads
+    import wis2_lambda_consumer as consumer
+
+    client = fakeredis.FakeRedis(decode_responses=True)
+    consumer.redis_host = client
+    consumer.cache_state = cache_state.CacheState(client, consumer.ttl_minutes * 60)
+    consumer.breaker = circuit_breaker.CircuitBreaker(client)
+    consumer.publishers = [StubPublisher()]
+    s3_uploads._client = StubS3()
+
+    results = {}
+    profile = cProfile.Profile()
+    sequence = 0
+    for name, cache in (('pass through', False), ('inline content, cached', True)):
+        consumer.msg_handler(batch(sequence, cache), None)
+        sequence += 10
+        timings = []
+        for _ in range(WARM_INVOCATIONS):
+            event = batch(sequence, cache)
+            sequence += 10
+            st = time.perf_counter()
+            response = consumer.msg_handler(event, None)
+            timings.append(time.perf_counter() - st)
+            assert not response['batchItemFailures'], response
+        results[name] = statistics.median(timings)
+        # records run on the handler's worker threads, profile them one by one on this thread
+        for _ in range(WARM_INVOCATIONS):
+            records = batch(sequence, cache)['Records']
+            sequence += 10
+            profile.enable()
+            consumer.process_group(records)
+            profile.disable()
+    stream = io.StringIO()
+    # the redis stand-in dominates own time, so list the lambda's functions by cumulative time
+    pstats.Stats(profile, stream=stream).strip_dirs().sort_stats('cumulative').print_stats(LAMBDA_MODULES, 15)
+    return results, stream.getvalue()
+
+
+def budget(value: float, limit: float) -> str:
+    return 'ok' if value <= limit else 'over budget'
+
+
+def main():
+    print('# Manager lambda profile\n')
+    print(f"python {platform.python_version()} on {platform.machine()}, "
+          f"generated by benchmarks/profile_lambda.py\n")
+    if not platform.python_version().startswith(f"{LAMBDA_PYTHON}.") or platform.machine() not in LAMBDA_MACHINES:
+        print(f"Not the lambda's python {LAMBDA_PYTHON} on arm64: timings only compare with reports from the "
+              f"same host.\n")
+    total, heaviest, deferred = cold_start()
+    print('## Cold start\n')
+    print(f"`import wis2_lambda_consumer`: **{total / 1000:.1f} ms** (median of {COLD_START_RUNS}), "
+          f"budget {COLD_START_BUDGET_MS} ms: {budget(total / 1000, COLD_START_BUDGET_MS)}\n")
+    print('| import | cumulative ms |')
+    print('|---|---|')
+    for us, name in heaviest:
+        print(f"| {name} | {us / 1000:.1f} |")
+    print(f"\nredis-py, imported by the first invocation: {deferred / 1000:.1f} ms\n")
+    # keep the handler's print() output out of the report
+    real_stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        results, profile_text = warm_path()
+    finally:
+        sys.stdout = real_stdout
+    print('## Warm path\n')
+    print(f"msg_handler, batches of 10 records, median of {WARM_INVOCATIONS} invocations\n")
+    print(f"| batch | per invocation ms | per record ms | budget {WARM_RECORD_BUDGET_MS} ms/record |")
+    print('|---|---|---|---|')
+    for name, seconds in results.items():
+        print(f"| {name} | {seconds * 1000:.2f} | {seconds * 100:.3f} | "
+              f"{budget(seconds * 100, WARM_RECORD_BUDGET_MS)} |")
+    print(f"\n### Lambda functions by cumulative time ({2 * WARM_INVOCATIONS * 10} records, both batch kinds)\n")
+    print('Redis calls run against fakeredis here, their share is far larger than on ElastiCache.\n')
+    print('```')
+    print(profile_text.strip())
+    print('```')
+
+
+if __name__ == '__main__':
+    main()
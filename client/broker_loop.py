@@ -0,0 +1,96 @@
+import logging
+import select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 120
+
+
+class BrokerEventLoop:
+    """Drives several paho clients from a single thread with select().
+
+    Replaces one ``loop_forever()`` thread per broker: the loop reads and
+    writes whichever sockets are ready, runs keepalive housekeeping for every
+    client, and reconnects dropped clients with exponential backoff. Clients
+    must have been set up with ``connect_async`` (or ``connect``) first.
+
+    ``reconnect()`` blocks for up to paho's connect timeout, so it runs on a
+    short-lived thread per attempt. The loop leaves a client alone while it
+    connects and picks it up once the attempt is over, so an unreachable
+    broker does not hold up the others. Reconnects are counted by the
+    client's on_connect callback.
+    """
+
+    def __init__(self, clients: list):
+        self.clients = clients
+        self._next_attempt = {id(client): 0.0 for client in clients}
+        self._delay = {id(client): MIN_RECONNECT_DELAY for client in clients}
+        # ids of the clients a connect attempt is running for
+        self._connecting = set()
+        self._lock = threading.Lock()
+
+    def _reconnect(self, client, now: float):
+        key = id(client)
+        if now < self._next_attempt[key]:
+            return
+        with self._lock:
+            self._connecting.add(key)
+        threading.Thread(target=self._connect, args=(client,), name=f"mqtt-connect-{client.host}",
+                         daemon=True).start()
+
+    def _connect(self, client):
+        key = id(client)
+        try:
+            client.reconnect()
+            self._delay[key] = MIN_RECONNECT_DELAY
+        except Exception as e:
+            logger.warning(f"connecting to {client.host} failed, retrying in {self._delay[key]}s: {e}")
+            self._next_attempt[key] = time.monotonic() + self._delay[key]
+            self._delay[key] = min(self._delay[key] * 2, MAX_RECONNECT_DELAY)
+        finally:
+            with self._lock:
+                self._connecting.discard(key)
+
+    def run_once(self, timeout: float = 1.0):
+        now = time.monotonic()
+        sockets = {}
+        rlist, wlist = [], []
+        with self._lock:
+            connecting = set(self._connecting)
+        for client in self.clients:
+            if id(client) in connecting:
+                continue
+            sock = client.socket()
+            if sock is None:
+                self._reconnect(client, now)
+                continue
+            sockets[sock] = client
+            rlist.append(sock)
+            if client.want_write():
+                wlist.append(sock)
+            # TLS sockets can hold decrypted bytes that select() will not report
+            if hasattr(sock, 'pending') and sock.pending() > 0:
+                timeout = 0.0
+        if rlist:
+            readable, writable, _ = select.select(rlist, wlist, [], timeout)
+        else:
+            readable, writable = [], []
+            time.sleep(timeout)
+        for sock, client in sockets.items():
+            if sock in readable or (hasattr(sock, 'pending') and sock.pending() > 0):
+                client.loop_read()
+            if client.socket() is not None and (sock in writable or client.want_write()):
+                client.loop_write()
+            if client.socket() is not None:
+                client.loop_misc()
+
+    def run_forever(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Unexpected error in broker event loop: {e}. Continuing...", exc_info=True)
+                time.sleep(1)
@@ -0,0 +1,110 @@
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateCoalescer:
+    """Holds notifications briefly so rapid successive updates of a data_id collapse into one.
+
+    The first notification for a data_id is held for ``window_seconds``. A
+    notification with a newer pubtime arriving in that time replaces it and
+    restarts the window, as does one with the same pubtime and a higher
+    ``rank`` (a deletion or update following a canonical notification). The
+    others are discarded. A held notification is always forwarded within
+    ``max_delay_seconds`` of the first arrival for its data_id, however often
+    it is superseded. ``close`` forwards everything still held, for a clean
+    shutdown, and later notifications are forwarded without being held.
+    """
+
+    def __init__(self, forward, window_seconds: float = 2.0, max_delay_seconds: float = 10.0,
+                 clock=time.monotonic):
+        self.forward = forward
+        self.window_seconds = window_seconds
+        self.max_delay_seconds = max(max_delay_seconds, window_seconds)
+        self.clock = clock
+        # data_id -> [deadline, hard deadline, (pubtime epoch, rank), forward args]
+        self._held = {}
+        # (deadline, data_id) entries, stale ones are skipped when popped
+        self._deadlines = []
+        self._cond = threading.Condition()
+        self._closed = False
+        # stats
+        self.forwarded = 0
+        self.superseded = 0
+        self.discarded = 0
+        threading.Thread(target=self._run, name='update-coalescer', daemon=True).start()
+
+    def offer(self, data_id: str, pubtime_epoch: float, *args, rank: int = 0):
+        """Holds the forward arguments for data_id until its window closes."""
+        now = self.clock()
+        version = (pubtime_epoch, rank)
+        with self._cond:
+            closed = self._closed
+            if closed:
+                self.forwarded += 1
+        if closed:
+            self._forward(data_id, args)
+            return
+        with self._cond:
+            held = self._held.get(data_id)
+            if held is None:
+                deadline = now + self.window_seconds
+                self._held[data_id] = [deadline, now + self.max_delay_seconds, version, args]
+            else:
+                if version <= held[2]:
+                    self.discarded += 1
+                    return
+                # the held notification will never be downloaded
+                self.superseded += 1
+                deadline = min(now + self.window_seconds, held[1])
+                held[0], held[2], held[3] = deadline, version, args
+            heapq.heappush(self._deadlines, (deadline, data_id))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._deadlines:
+                        self._cond.wait()
+                        continue
+                    deadline, data_id = self._deadlines[0]
+                    held = self._held.get(data_id)
+                    if held is None or held[0] != deadline:
+                        # superseded entry
+                        heapq.heappop(self._deadlines)
+                        continue
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                heapq.heappop(self._deadlines)
+                args = self._held.pop(data_id)[3]
+                self.forwarded += 1
+            self._forward(data_id, args)
+
+    def _forward(self, data_id: str, args: tuple):
+        try:
+            self.forward(*args)
+        except Exception:
+            logger.exception(f"failed to forward coalesced notification for {data_id}")
+
+    def close(self):
+        """Forwards every held notification now, in order of first arrival, and stops holding new ones."""
+        with self._cond:
+            self._closed = True
+            held = [(data_id, entry[3]) for data_id, entry in self._held.items()]
+            self._held.clear()
+            self._deadlines.clear()
+            self.forwarded += len(held)
+        for data_id, args in held:
+            self._forward(data_id, args)
+
+    def stats(self) -> dict:
+        """Returns held, forwarded, superseded (downloads saved) and discarded counts."""
+        with self._cond:
+            return {'held': len(self._held), 'forwarded': self.forwarded, 'superseded': self.superseded,
+                    'discarded': self.discarded}
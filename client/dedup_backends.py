@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from dedup_store import BucketedDedupStore, digest64
+
+logger = logging.getLogger(__name__)
+
+# redis key prefix, kept clear of the data_id and wmo_wis2_gc_* keys written by the manager lambda
+REDIS_KEY_PREFIX = 'client-dedup:'
+
+
+class DedupBackend(ABC):
+    """Decides which client forwards a notification.
+
+    ``claim_many`` takes a list of dedup keys and returns, for each one, True
+    if this client is the first to claim it within the ttl.
+    """
+
+    @abstractmethod
+    def claim_many(self, keys: list) -> list:
+        """Claims each key, True for the keys this client forwards."""
+
+    def stats(self) -> dict:
+        return {}
+
+
+class LocalDedupBackend(DedupBackend):
+    """In-process dedup, only suppresses copies seen by this client."""
+
+    def __init__(self, store: BucketedDedupStore):
+        self.store = store
+
+    def claim_many(self, keys: list) -> list:
+        return [not self.store.check_and_add(key) for key in keys]
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+class RedisDedupBackend(DedupBackend):
+    """Dedup shared by all clients through the global cache redis replication group.
+
+    Keys already seen by this client are answered by a short-lived local front
+    cache. The rest are claimed in a single pipelined batch of ``SET NX EX``
+    commands, so only the first client to see a key forwards it. If redis is
+    unreachable the batch is forwarded, leaving the manager lambda's uniqueness
+    check to catch the duplicates.
+    """
+
+    def __init__(self, redis_client, ttl_seconds: float = 1800, front: BucketedDedupStore = None):
+        self.redis_client = redis_client
+        self.ttl_seconds = int(ttl_seconds)
+        self.front = front if front is not None else BucketedDedupStore(ttl_seconds=300, bucket_seconds=30)
+        self._lock = threading.Lock()
+        # stats
+        self.front_hits = 0
+        self.claimed = 0
+        self.lost = 0
+        self.errors = 0
+
+    def claim_many(self, keys: list) -> list:
+        results = [False] * len(keys)
+        remote = [i for i, key in enumerate(keys) if not self.front.check_and_add(key)]
+        if remote:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for i in remote:
+                pipe.set(f"{REDIS_KEY_PREFIX}{digest64(keys[i]):016x}", 1, nx=True, ex=self.ttl_seconds)
+            try:
+                replies = pipe.execute()
+            except Exception as e:
+                logger.warning(f"shared dedup unavailable, forwarding {len(remote)} notification(s): {e}")
+                replies = [True] * len(remote)
+                with self._lock:
+                    self.errors += 1
+            for i, reply in zip(remote, replies):
+                results[i] = bool(reply)
+        won = sum(results)
+        with self._lock:
+            self.front_hits += len(keys) - len(remote)
+            self.claimed += won
+            self.lost += len(remote) - won
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'front_hits': self.front_hits,
+                'claimed': self.claimed,
+                'lost': self.lost,
+                'errors': self.errors,
+                'front': self.front.stats(),
+            }
+
+
+class InMemoryRedis:
+    """Stand-in for the subset of redis-py used by RedisDedupBackend.
+
+    Sharing one instance between several backends reproduces the cross-client
+    behaviour without a redis server.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def set(self, name, value, nx: bool = False, ex: int = None):
+        now = self.clock()
+        with self._lock:
+            current = self._data.get(name)
+            if nx and current is not None and (current[1] is None or current[1] > now):
+                return None
+            self._data[name] = (value, now + ex if ex else None)
+            return True
+
+    def pipeline(self, transaction: bool = True):
+        return _InMemoryPipeline(self)
+
+
+class _InMemoryPipeline:
+    def __init__(self, client: InMemoryRedis):
+        self.client = client
+        self._commands = []
+
+    def set(self, *args, **kwargs):
+        self._commands.append((args, kwargs))
+        return self
+
+    def execute(self):
+        replies = [self.client.set(*args, **kwargs) for args, kwargs in self._commands]
+        self._commands = []
+        return replies
+
+
+def create_backend(kind: str, ttl_seconds: float, memory_budget_bytes: int, redis_host: str = None,
+                   redis_port: int = 6379, front_ttl_seconds: float = 300) -> DedupBackend:
+    """Builds the dedup backend selected by configuration ('local' or 'redis')."""
+    if kind == 'local':
+        return LocalDedupBackend(BucketedDedupStore(ttl_seconds=ttl_seconds,
+                                                    memory_budget_bytes=memory_budget_bytes))
+    if kind == 'redis':
+        if not redis_host:
+            raise ValueError("redis dedup backend requires a redis host")
+        # optional dependency, only needed for the shared backend
+        import redis
+        front = BucketedDedupStore(ttl_seconds=front_ttl_seconds, bucket_seconds=min(60, front_ttl_seconds),
+                                   memory_budget_bytes=memory_budget_bytes)
+        return RedisDedupBackend(redis.Redis(redis_host, port=redis_port, socket_timeout=2),
+                                 ttl_seconds=ttl_seconds, front=front)
+    raise ValueError(f"dedup backend {kind} not supported")
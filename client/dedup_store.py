@@ -0,0 +1,129 @@
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+
+# approximate cost of one entry: a 64-bit int object plus its slot in a set's hash table
+ENTRY_BYTES = 80
+
+
+def digest64(key: str) -> int:
+    """Returns a fixed-width 64-bit digest of a dedup key."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+class BucketedDedupStore:
+    """Time-bucketed set of 64-bit key digests used to drop duplicate notifications.
+
+    Keys are stored as 64-bit digests in a ring of buckets, each covering
+    ``bucket_seconds``. Expiry drops whole buckets once they fall outside
+    ``ttl_seconds``, so there is no per-entry bookkeeping. Capacity is derived
+    from ``memory_budget_bytes``; when it is exceeded the oldest bucket is
+    dropped early rather than evicting entries one by one.
+    """
+
+    def __init__(self, ttl_seconds: float = 1800, bucket_seconds: float = 60,
+                 memory_budget_bytes: int = 64 * 1024 * 1024, clock=time.monotonic):
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = max(1, math.ceil(ttl_seconds / bucket_seconds))
+        self.max_entries = max(1, memory_budget_bytes // ENTRY_BYTES)
+        self.clock = clock
+        # deque of (bucket number, set of digests), newest on the right
+        self._buckets = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+        # stats
+        self.hits = 0
+        self.misses = 0
+        self.evicted_early = 0
+
+    def _expire(self, bucket_no: int):
+        # caller must hold self._lock
+        oldest_allowed = bucket_no - self.n_buckets + 1
+        while self._buckets and self._buckets[0][0] < oldest_allowed:
+            self._size -= len(self._buckets.popleft()[1])
+        if not self._buckets or self._buckets[-1][0] != bucket_no:
+            self._buckets.append((bucket_no, set()))
+
+    def check_and_add(self, key: str) -> bool:
+        """Returns True if key was already seen within the ttl, otherwise records it and returns False."""
+        digest = digest64(key)
+        bucket_no = int(self.clock() // self.bucket_seconds)
+        with self._lock:
+            self._expire(bucket_no)
+            for _, digests in self._buckets:
+                if digest in digests:
+                    self.hits += 1
+                    return True
+            self._buckets[-1][1].add(digest)
+            self._size += 1
+            self.misses += 1
+            while self._size > self.max_entries and len(self._buckets) > 1:
+                dropped = len(self._buckets.popleft()[1])
+                self._size -= dropped
+                self.evicted_early += dropped
+            return False
+
+    def __len__(self):
+        return self._size
+
+    def stats(self) -> dict:
+        """Returns occupancy and hit counters."""
+        with self._lock:
+            return {
+                'entries': self._size,
+                'buckets': len(self._buckets),
+                'capacity': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evicted_early': self.evicted_early,
+            }
+
+
+class SuppressionStats:
+    """Per-subscription counts of received and suppressed duplicate notifications."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._received = {}
+        self._suppressed = {}
+
+    def record(self, source: str, suppressed: bool):
+        with self._lock:
+            self._received[source] = self._received.get(source, 0) + 1
+            if suppressed:
+                self._suppressed[source] = self._suppressed.get(source, 0) + 1
+
+    def stats(self) -> dict:
+        """Returns received, suppressed and suppression ratio keyed by source."""
+        with self._lock:
+            return {
+                source: {
+                    'received': received,
+                    'suppressed': self._suppressed.get(source, 0),
+                    'ratio': round(self._suppressed.get(source, 0) / received, 3),
+                }
+                for source, received in self._received.items()
+            }
+
+
+class ArrivalStats:
+    """Per-broker counts of notifications received and of first arrivals forwarded."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._arrivals = {}
+        self._first = {}
+
+    def record(self, broker: str, first: bool):
+        with self._lock:
+            self._arrivals[broker] = self._arrivals.get(broker, 0) + 1
+            if first:
+                self._first[broker] = self._first.get(broker, 0) + 1
+
+    def stats(self) -> dict:
+        """Returns arrivals and first-arrival wins keyed by broker."""
+        with self._lock:
+            return {broker: {'arrivals': arrivals, 'first_arrivals': self._first.get(broker, 0)}
+                    for broker, arrivals in self._arrivals.items()}
@@ -0,0 +1,140 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# backpressure policies when the queue is full:
+#   drop - discard the incoming message immediately
+#   park - block the network thread (and therefore PUBACKs) until there is room or park_timeout expires
+BACKPRESSURE_POLICIES = ('drop', 'park')
+# how often a parked submit checks whether the pipeline is closing
+PARK_POLL_SECONDS = 0.5
+
+
+class IngestPipeline:
+    """Bounded hand-off between the paho network thread and a pool of workers.
+
+    The network thread only calls ``submit`` with the raw topic, payload and
+    the broker it came from. Workers take up to ``batch_size`` items at a time
+    off the queue and pass them to ``handler`` as a list of
+    ``(topic, payload, broker)`` tuples, so parsing,
+    dedup and forwarding never run on the network thread. ``close`` stops
+    taking messages and waits for the queued ones, for a clean shutdown.
+    """
+
+    def __init__(self, handler, workers: int = 4, max_depth: int = 10000, policy: str = 'park',
+                 park_timeout: float = 60, batch_size: int = 10):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"backpressure policy {policy} not supported, use one of {BACKPRESSURE_POLICIES}")
+        self.handler = handler
+        self.policy = policy
+        self.park_timeout = park_timeout
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._lock = threading.Lock()
+        # set by close(), a parked submit stops waiting for room
+        self._closed = False
+        # stats
+        self.enqueued = 0
+        self.dropped = 0
+        self.parked = 0
+        self.parked_seconds = 0.0
+        self.processed = 0
+        self.handler_errors = 0
+        self.max_depth_seen = 0
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f'ingest-worker-{i}', daemon=True).start()
+
+    def submit(self, topic: str, payload: bytes, broker: str = None) -> bool:
+        """Queues a raw message, returns False if it was dropped."""
+        item = (topic, payload, broker)
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                return False
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == 'drop' or not self._park(item):
+                return self._drop(topic)
+        depth = self._queue.qsize()
+        with self._lock:
+            self.enqueued += 1
+            if depth > self.max_depth_seen:
+                self.max_depth_seen = depth
+        return True
+
+    def _park(self, item: tuple) -> bool:
+        # waits in short steps, close() may run on this very thread from a signal handler
+        st = time.monotonic()
+        deadline = st + self.park_timeout
+        try:
+            while not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    self._queue.put(item, timeout=min(remaining, PARK_POLL_SECONDS))
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            with self._lock:
+                self.parked += 1
+                self.parked_seconds += time.monotonic() - st
+
+    def _drop(self, topic: str) -> bool:
+        with self._lock:
+            self.dropped += 1
+        logger.debug(f"ingest queue full, dropped message on {topic}")
+        return False
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.handler(batch)
+            except Exception:
+                logger.exception(f"failed to process batch of {len(batch)} messages")
+                with self._lock:
+                    self.handler_errors += 1
+            with self._lock:
+                self.processed += len(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def close(self, timeout: float = 10) -> bool:
+        """Stops taking messages and waits up to timeout for the queued ones, returns False if some are left."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._closed = True
+        # Queue.join() without its unbounded wait, a parked item is not counted until it is queued
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self) -> dict:
+        """Returns queue depth and backpressure counters."""
+        with self._lock:
+            return {
+                'depth': self._queue.qsize(),
+                'max_depth': self.max_depth_seen,
+                'enqueued': self.enqueued,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'parked': self.parked,
+                'parked_seconds': round(self.parked_seconds, 3),
+                'handler_errors': self.handler_errors,
+            }
@@ -1,20 +1,33 @@
-import json
 import logging
 import os
-from json import JSONDecodeError
-import re
+import signal
+import sys
+try:
+    import json_codec
+except ImportError:
+    # the image has the modules shared with the manager lambda next to main.py, a checkout has them in manager_lambda/
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'manager_lambda'))
+    import json_codec
+from json_codec import JSONDecodeError
+from rfc3339 import parse_rfc3339
 from urllib.parse import urlparse
 
 import boto3
 import dotenv
 import paho.mqtt.client as mqtt
-from cachetools import TTLCache
-from datetime import datetime, timedelta
 from paho.mqtt.properties import Properties
 from paho.mqtt.packettypes import PacketTypes
-from botocore.exceptions import ClientError
 import threading
 import time
+from sqs_batcher import SqsBatchSender
+from spill_buffer import SpillBuffer
+from ingest_pipeline import IngestPipeline
+from broker_loop import BrokerEventLoop
+from coalescer import UpdateCoalescer
+from dedup_store import ArrivalStats, SuppressionStats
+from dedup_backends import create_backend
+from message_groups import make_group_strategy
+from metrics import CallbackMetric, Counter, Histogram, MetricsRegistry
 
 # Set log level and format
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -29,25 +42,78 @@ logger = logging.getLogger()
 dotenv.load_dotenv()
 
 SESSION_EXPIRY = 300
+# SQS batching: how long a partial batch may wait for more messages before it is sent
+SQS_BATCH_LINGER_MS = int(os.getenv('SQS_BATCH_LINGER_MS', 50))
+SQS_SEND_THREADS = int(os.getenv('SQS_SEND_THREADS', 4))
+SQS_MAX_ATTEMPTS = int(os.getenv('SQS_MAX_ATTEMPTS', 3))
+# local write-ahead buffer for messages SQS cannot take, set SPILL_DIR to an empty string to disable
+SPILL_DIR = os.getenv('SPILL_DIR', '/tmp/wis2-gc-spill')
+SPILL_SEGMENT_MB = float(os.getenv('SPILL_SEGMENT_MB', 16))
+SPILL_MAX_MB = float(os.getenv('SPILL_MAX_MB', 1024))
+# worker pipeline between the paho network thread and message processing
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 4))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 10000))
+# 'park' blocks the network thread when the queue is full, 'drop' discards the message
+INGEST_BACKPRESSURE = os.getenv('INGEST_BACKPRESSURE', 'park')
+# keep well below the 5 minute keepalive so a parked network thread does not lose the connection
+INGEST_PARK_TIMEOUT = float(os.getenv('INGEST_PARK_TIMEOUT', 60))
+# on SIGTERM, time to finish queued messages and hand their batches to SQS, within the 30s ECS stop timeout
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', 20))
+# duplicate detection window and memory budget for the in-process dedup store
+DEDUP_TTL_MINUTES = float(os.getenv('DEDUP_TTL_MINUTES', 30))
+DEDUP_MEMORY_MB = float(os.getenv('DEDUP_MEMORY_MB', 64))
+# 'local' dedups within this client, 'redis' shares claims with every other client via DEDUP_REDIS_HOST
+DEDUP_BACKEND = os.getenv('DEDUP_BACKEND', 'local')
+DEDUP_REDIS_HOST = os.getenv('DEDUP_REDIS_HOST')
+DEDUP_REDIS_PORT = int(os.getenv('DEDUP_REDIS_PORT', 6379))
+DEDUP_FRONT_TTL_MINUTES = float(os.getenv('DEDUP_FRONT_TTL_MINUTES', 5))
+# hold notifications this long so rapid updates of one data_id collapse into the newest, 0 disables
+COALESCE_WINDOW_SECONDS = float(os.getenv('COALESCE_WINDOW_SECONDS', 0))
+# hard cap on the latency the coalescing window may add
+COALESCE_MAX_DELAY_SECONDS = float(os.getenv('COALESCE_MAX_DELAY_SECONDS', 10))
+# how notifications map to SQS FIFO message groups: 'data_id', 'sharded' or 'centre'
+MESSAGE_GROUP_STRATEGY = os.getenv('MESSAGE_GROUP_STRATEGY', 'data_id')
+MESSAGE_GROUP_SHARDS = int(os.getenv('MESSAGE_GROUP_SHARDS', 32))
+message_group_id = make_group_strategy(MESSAGE_GROUP_STRATEGY, shards=MESSAGE_GROUP_SHARDS)
+# port for the prometheus/openmetrics endpoint, set to an empty string to disable
+METRICS_PORT = os.getenv('METRICS_PORT', '9100')
+SUBSCRIPTIONS = [
+    "origin/a/wis2/+/data/core/#",
+    "origin/a/wis2/+/metadata/#",
+    "cache/a/wis2/+/data/core/#",
+    "cache/a/wis2/+/metadata/#"
+]
 # random 6 character string
 MQTT_CLIENT_ID = f"UK-US-GC-{os.urandom(6).hex()}"
 logger.debug(f"MQTT_CLIENT_ID: {MQTT_CLIENT_ID}")
-global id_cache
-id_cache = TTLCache(maxsize=100000, ttl=timedelta(minutes=60), timer=datetime.now)
+suppression_stats = SuppressionStats()
+arrival_stats = ArrivalStats()
+
+# hot path metrics, everything else is read from the component stats at scrape time
+metrics_registry = MetricsRegistry()
+received_counter = metrics_registry.register(Counter(
+    'wis2_client_received', 'Notifications received per subscription', ('subscription',)))
+reconnect_counter = metrics_registry.register(Counter(
+    'wis2_client_reconnects', 'Reconnections per global broker', ('broker',)))
+sqs_send_histogram = metrics_registry.register(Histogram(
+    'wis2_client_sqs_send_seconds', 'Latency of SQS send_message_batch calls',
+    (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)))
+lag_histogram = metrics_registry.register(Histogram(
+    'wis2_client_lag_seconds', 'Time from notification pubtime to forwarding to SQS',
+    (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)))
+connected_brokers = set()
 
 def on_connect(client, userdata, flags, reason_code, properties):
-    logger.info(f"Connected to host. client id: {MQTT_CLIENT_ID}")
+    logger.info(f"Connected to host {userdata['broker']}. client id: {MQTT_CLIENT_ID}")
     if flags.session_present:
         # Handle session present
         pass
     if reason_code == 0:
         # success connect
-        for topic in [
-            "origin/a/wis2/+/data/core/#",
-            "origin/a/wis2/+/metadata/#",
-            "cache/a/wis2/+/data/core/#",
-            "cache/a/wis2/+/metadata/#"
-        ]:
+        if userdata['broker'] in connected_brokers:
+            reconnect_counter.inc(userdata['broker'])
+        connected_brokers.add(userdata['broker'])
+        for topic in SUBSCRIPTIONS:
             client.subscribe(topic, qos=1)
     if reason_code > 0:
         # error processing
@@ -56,49 +122,109 @@ def on_connect(client, userdata, flags, reason_code, properties):
 
 def on_disconnect(client, userdata, disconnect_flags, reason_code, properties):
     if reason_code == 0:
-        logger.warning("Disconnected successfully with reason code 0")
+        logger.warning(f"Disconnected from {userdata['broker']} successfully with reason code 0")
     else:
-        logger.error(f"Unexpected disconnection with reason code {reason_code}.")
-        # loop_forever() handles reconnection automatically — don't do it manually here
+        logger.error(f"Unexpected disconnection from {userdata['broker']} with reason code {reason_code}.")
+        # loop_forever() / BrokerEventLoop handle reconnection automatically — don't do it manually here
 
 def on_message(client, userdata, message):
-    global id_cache
+    # runs on the network thread: hand off and return so PUBACKs are not held up
+    pipeline.submit(message.topic, message.payload, userdata['broker'])
+
+def process_messages(batch):
+    candidates, payloads, brokers = [], [], []
+    for topic, payload, broker in batch:
+        received_counter.inc(subscription_for(topic))
+        message_json = parse_message(topic, payload)
+        if message_json is not None:
+            candidates.append(message_json)
+            payloads.append(payload)
+            brokers.append(broker)
+    if not candidates:
+        return
+    # one dedup round trip for the whole batch
+    claims = dedup_backend.claim_many([dedup_key(message_json) for message_json in candidates])
+    for message_json, payload, broker, is_first in zip(candidates, payloads, brokers, claims):
+        suppression_stats.record(subscription_for(message_json['topic']), not is_first)
+        arrival_stats.record(broker, is_first)
+        if not is_first:
+            logger.debug("--Duplicate message '%s'--Not sent to SQS", message_json['properties']['data_id'])
+            continue
+        try:
+            msg_grp_data_id = message_group_id(message_json['properties']['data_id'], message_json['topic'])
+            # forward the payload untouched, the topic travels as a message attribute
+            body = payload.decode() if isinstance(payload, bytes) else payload
+            attributes = {'topic': {'DataType': 'String', 'StringValue': message_json['topic']}}
+            pubtime = pubtime_epoch(message_json['properties'].get('pubtime'))
+            if pubtime is not None:
+                lag_histogram.observe(time.time() - pubtime)
+            if coalescer is not None and pubtime is not None:
+                coalescer.offer(message_json['properties']['data_id'], pubtime, body, msg_grp_data_id, attributes,
+                                rank=LINK_KIND_RANK[link_kind(message_json)])
+            else:
+                sqs_sender.send(body, msg_grp_data_id, attributes)
+        except Exception as error:
+            logger.exception("Failed to send message to SQS Queue: %s", message_json['id'])
+
+def parse_message(topic, payload):
+    """
+    parses a raw notification, returns None if it should not be forwarded
+    """
     try:
-        message_json = json.loads(message.payload)
-        message_json['topic'] = message.topic
+        message_json = json_codec.loads(payload)
+        message_json['topic'] = topic
         data_id = message_json['properties']['data_id']
-        msg_id = message_json['id']
         if 'links' not in message_json:
             logger.debug(f'no links: {data_id}')
-            return
+            return None
         hrefs = [link.get('href') for link in message_json['links']]
         if any(destination_bucket_name in href for href in hrefs):
             logger.debug(f'already cached: {data_id}')
-            return
-        if not is_cached(msg_id):
-            msg_grp_data_id = re.sub(r'\W+', '', data_id)[-127:]
-            response = queue.send_message(MessageBody=json.dumps(message_json),
-                                          MessageGroupId=msg_grp_data_id)
-            logger.debug(
-                "Response from SQS id: %s", response.get('MessageId'))
-        else:
-            logger.debug("--Duplicate message '%s'--Not sent to SQS", message_json['properties']['data_id'])
+            return None
+        return message_json
     except JSONDecodeError as error:
-        logger.exception("Received message with invalid json: %s", message.payload)
-    except ClientError as error:
-        logger.exception("Failed to send message to SQS Queue: %s", message.payload)
+        logger.exception("Received message with invalid json: %s", payload)
     except Exception as error:
-        logger.exception("Failed to process message: %s", message.payload)
+        logger.exception("Failed to process message: %s", payload)
+    return None
+
+# precedence of the link kinds, as in Wis2Message
+LINK_KIND_RANK = {'canonical': 0, 'update': 1, 'deletion': 2}
+
+def link_kind(message_json):
+    """
+    'deletion', 'update' or 'canonical', following the deletion > update > canonical precedence of Wis2Message
+    """
+    rels = {link.get('rel') for link in message_json['links']}
+    return 'deletion' if 'deletion' in rels else 'update' if 'update' in rels else 'canonical'
 
-def is_cached(message_id):
-    global id_cache
+def dedup_key(message_json):
+    """
+    key identifying a dataset update independent of which broker or cache relayed it.
+    the link kind is part of the key, so an update or deletion is never suppressed by an earlier
+    notification with the same pubtime.
+    """
+    pubtime = message_json['properties'].get('pubtime')
+    if pubtime is None:
+        # cannot identify the update, fall back to the per-publisher message id
+        return message_json['id']
+    return f"{message_json['properties']['data_id']}|{pubtime}|{link_kind(message_json)}"
+
+def pubtime_epoch(pubtime):
+    """
+    notification pubtime as a unix epoch, None if the pubtime cannot be parsed.
+    parsed like the manager lambda does, so both agree on which notifications have a pubtime
+    """
     try:
-        id_cache[message_id]
-        return True
-    except:
-        id_cache[message_id] = 1
-        logger.debug(f"cached message id {message_id}\n cache size: {id_cache.currsize}")
-        return False
+        return parse_rfc3339(pubtime)
+    except (TypeError, ValueError):
+        return None
+
+def subscription_for(topic):
+    for subscription in SUBSCRIPTIONS:
+        if mqtt.topic_matches_sub(subscription, topic):
+            return subscription
+    return topic.split('/', 1)[0]
 
 def parse_connection_string(connection_string:str):
     s1 = connection_string.split(':')
@@ -108,27 +234,19 @@ def parse_connection_string(connection_string:str):
     port = int(s1[3].strip('/'))
     return user, password, host, port
 
-def monitor_in_flight(client):
-    print("Monitoring queue size")
-    while True:
-        in_flight = len(client._out_messages)
-        if in_flight > 0:
-            logger.info(f"Count in_flight: {in_flight}")
-        time.sleep(1)
+def broker_connection_strings():
+    """
+    global broker connection strings, GB_CONNECTION_STRINGS (whitespace or comma separated) takes
+    precedence over the single GB_CONNECTION_STRING
+    """
+    connection_strings = os.getenv('GB_CONNECTION_STRINGS')
+    if connection_strings:
+        return connection_strings.replace(',', ' ').split()
+    return [os.getenv('GB_CONNECTION_STRING')]
 
-def main():
-    global queue
-    sqs = boto3.resource('sqs')
-    queue_name = os.getenv('QUEUE_NAME')
-    queue = sqs.get_queue_by_name(QueueName=queue_name)
-    connection_string = os.getenv('GB_CONNECTION_STRING')
-    global destination_bucket_name
-    destination_bucket_name = os.getenv('BUCKET_NAME')
-    global id_cache
-    id_cache = TTLCache(maxsize=100000, ttl=timedelta(minutes=30), timer=datetime.now)
-    connection_info = urlparse(connection_string)
-    logger.debug(f"Connection info hostname: {connection_info.hostname}")
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=MQTT_CLIENT_ID, protocol=mqtt.MQTTv5)
+def create_client(connection_info):
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=MQTT_CLIENT_ID, protocol=mqtt.MQTTv5,
+                         userdata={'broker': connection_info.hostname})
     client.on_connect = on_connect
     client.on_disconnect = on_disconnect
     client.on_message = on_message
@@ -137,8 +255,6 @@ def main():
     client.max_queued_messages_set(20000)
     client.max_inflight_messages_set(10000)
 
-    properties = Properties(PacketTypes.CONNECT)
-    properties.SessionExpiryInterval = SESSION_EXPIRY
     if os.getenv('MQTT_TLS', 'true').lower() != 'false':
         client.tls_set()
     # client.will_set(
@@ -147,16 +263,160 @@ def main():
     #     qos=1,
     #     retain=True
     # )
-    client.connect(
-        host=connection_info.hostname,
-        port=connection_info.port,
-        clean_start=False,
-        keepalive=60*5,
-        properties=properties)
-    logger.debug(f"Connection status: {client.is_connected()}")
     client.enable_logger(logger)
+    return client
+
+def register_metrics(clients):
+    def stat(component, key):
+        return lambda: component.stats()[key]
+
+    def per_key(stats, key):
+        return lambda: {source: values[key] for source, values in stats.stats().items()}
+
+    for metric in [
+        CallbackMetric('wis2_client_duplicates_suppressed', 'Duplicate notifications suppressed per subscription',
+                       per_key(suppression_stats, 'suppressed'), ('subscription',), 'counter'),
+        CallbackMetric('wis2_client_broker_arrivals', 'Notifications parsed per global broker',
+                       per_key(arrival_stats, 'arrivals'), ('broker',), 'counter'),
+        CallbackMetric('wis2_client_first_arrivals', 'Notifications forwarded because this broker delivered them first',
+                       per_key(arrival_stats, 'first_arrivals'), ('broker',), 'counter'),
+        CallbackMetric('wis2_client_queue_depth', 'Messages waiting in each client queue',
+                       lambda: {'ingest': pipeline.stats()['depth'],
+                                'sqs_pending': sqs_sender.stats()['pending'],
+                                'mqtt_inflight': sum(len(client._out_messages) for client in clients)},
+                       ('queue',)),
+        CallbackMetric('wis2_client_ingest_dropped', 'Messages dropped because the ingest queue was full',
+                       stat(pipeline, 'dropped'), metric_type='counter'),
+        CallbackMetric('wis2_client_sqs_sent', 'Messages accepted by SQS', stat(sqs_sender, 'entries_sent'),
+                       metric_type='counter'),
+        CallbackMetric('wis2_client_sqs_dropped', 'Messages SQS did not accept and that were not spilled',
+                       stat(sqs_sender, 'entries_dropped'), metric_type='counter'),
+        CallbackMetric('wis2_client_sqs_batch_fill_ratio', 'Average entries per SQS batch over the batch limit',
+                       stat(sqs_sender, 'fill_ratio')),
+    ]:
+        metrics_registry.register(metric)
+    if coalescer is not None:
+        metrics_registry.register(CallbackMetric('wis2_client_coalesced', 'Notifications superseded by a newer '
+                                                 'update of the same data_id within the coalescing window',
+                                                 lambda: coalescer.stats()['superseded'], metric_type='counter'))
+        metrics_registry.register(CallbackMetric('wis2_client_coalescing_discarded', 'Notifications discarded '
+                                                 'because a newer or equal update of the data_id was held',
+                                                 lambda: coalescer.stats()['discarded'], metric_type='counter'))
+        metrics_registry.register(CallbackMetric('wis2_client_coalescing_held', 'Notifications held in the '
+                                                 'coalescing window', lambda: coalescer.stats()['held']))
+    if spill_buffer is not None:
+        metrics_registry.register(CallbackMetric('wis2_client_spill_bytes', 'Bytes held in the spill buffer',
+                                                 lambda: spill_buffer.stats()['bytes']))
+        metrics_registry.register(CallbackMetric('wis2_client_spill_segments', 'Segments held in the spill buffer',
+                                                 lambda: spill_buffer.stats()['segments']))
+        # rate(wis2_client_spill_drained_total[5m]) is the drain rate
+        metrics_registry.register(CallbackMetric('wis2_client_spill_spilled', 'Messages written to the spill buffer',
+                                                 stat(spill_buffer, 'spilled'), metric_type='counter'))
+        metrics_registry.register(CallbackMetric('wis2_client_spill_drained', 'Spilled messages accepted by SQS',
+                                                 stat(spill_buffer, 'drained'), metric_type='counter'))
+        metrics_registry.register(CallbackMetric('wis2_client_spill_dropped', 'Messages the spill buffer dropped, '
+                                                 'full or undecodable', stat(spill_buffer, 'dropped'),
+                                                 metric_type='counter'))
+        metrics_registry.register(CallbackMetric('wis2_client_spill_rejected', 'Spilled messages SQS refused for '
+                                                 'good, moved to the reject file', stat(spill_buffer, 'rejected'),
+                                                 metric_type='counter'))
+
+def monitor_in_flight(clients):
+    print("Monitoring queue size")
+    last_report = time.monotonic()
+    while True:
+        in_flight = sum(len(client._out_messages) for client in clients)
+        if in_flight > 0:
+            logger.info(f"Count in_flight: {in_flight}")
+        if time.monotonic() - last_report >= 60:
+            last_report = time.monotonic()
+            logger.info(f"ingest pipeline: {pipeline.stats()}")
+            logger.info(f"SQS batching: {sqs_sender.stats()}")
+            if spill_buffer is not None:
+                logger.info(f"spill buffer: {spill_buffer.stats()}")
+            if coalescer is not None:
+                logger.info(f"update coalescing: {coalescer.stats()}")
+            logger.info(f"dedup backend: {dedup_backend.stats()}")
+            logger.info(f"duplicate suppression: {suppression_stats.stats()}")
+            logger.info(f"broker arrivals: {arrival_stats.stats()}")
+        time.sleep(1)
+
+def shutdown(signum, frame):
+    """Drains the ingest pipeline, the coalescer and the pending SQS batches, then exits."""
+    logger.warning(f"received signal {signum}, draining {pipeline.stats()['depth']} queued messages")
+    deadline = time.monotonic() + SHUTDOWN_DRAIN_SECONDS
+    if not pipeline.close(timeout=SHUTDOWN_DRAIN_SECONDS):
+        logger.error(f"ingest pipeline not drained after {SHUTDOWN_DRAIN_SECONDS}s: {pipeline.stats()}")
+    if coalescer is not None:
+        # held notifications are already claimed in the dedup backend, nobody else will send them
+        coalescer.close()
+    if not sqs_sender.flush(timeout=max(deadline - time.monotonic(), 0)):
+        logger.error(f"SQS batches not flushed before exit: {sqs_sender.stats()}")
+    sys.exit(0)
+
+def main():
+    print(f"json codec: {json_codec.backend}")
+    global queue
+    sqs = boto3.resource('sqs')
+    queue_name = os.getenv('QUEUE_NAME')
+    queue = sqs.get_queue_by_name(QueueName=queue_name)
+    global spill_buffer
+    spill_buffer = None
+    if SPILL_DIR:
+        spill_buffer = SpillBuffer(queue, SPILL_DIR, segment_bytes=int(SPILL_SEGMENT_MB * 1024 * 1024),
+                                   max_bytes=int(SPILL_MAX_MB * 1024 * 1024))
+    global sqs_sender
+    sqs_sender = SqsBatchSender(queue, linger_seconds=SQS_BATCH_LINGER_MS / 1000,
+                                send_threads=SQS_SEND_THREADS, max_attempts=SQS_MAX_ATTEMPTS,
+                                spill=spill_buffer, latency_histogram=sqs_send_histogram)
+    global coalescer
+    coalescer = None
+    if COALESCE_WINDOW_SECONDS > 0:
+        coalescer = UpdateCoalescer(sqs_sender.send, window_seconds=COALESCE_WINDOW_SECONDS,
+                                    max_delay_seconds=COALESCE_MAX_DELAY_SECONDS)
+    global dedup_backend
+    dedup_backend = create_backend(DEDUP_BACKEND, ttl_seconds=DEDUP_TTL_MINUTES * 60,
+                                   memory_budget_bytes=int(DEDUP_MEMORY_MB * 1024 * 1024),
+                                   redis_host=DEDUP_REDIS_HOST, redis_port=DEDUP_REDIS_PORT,
+                                   front_ttl_seconds=DEDUP_FRONT_TTL_MINUTES * 60)
+    global pipeline
+    pipeline = IngestPipeline(process_messages, workers=INGEST_WORKERS, max_depth=INGEST_QUEUE_SIZE,
+                              policy=INGEST_BACKPRESSURE, park_timeout=INGEST_PARK_TIMEOUT)
+    signal.signal(signal.SIGTERM, shutdown)
+    global destination_bucket_name
+    destination_bucket_name = os.getenv('BUCKET_NAME')
+
+    clients = []
+    connection_strings = broker_connection_strings()
+    for connection_string in connection_strings:
+        connection_info = urlparse(connection_string)
+        logger.debug(f"Connection info hostname: {connection_info.hostname}")
+        client = create_client(connection_info)
+        properties = Properties(PacketTypes.CONNECT)
+        properties.SessionExpiryInterval = SESSION_EXPIRY
+        connect_args = dict(host=connection_info.hostname, port=connection_info.port, clean_start=False,
+                            keepalive=60*5, properties=properties)
+        if len(connection_strings) == 1:
+            client.connect(**connect_args)
+            logger.debug(f"Connection status: {client.is_connected()}")
+        else:
+            # the event loop connects each broker, so one unreachable broker does not block the others
+            client.connect_async(**connect_args)
+        clients.append(client)
+
+    register_metrics(clients)
+    if METRICS_PORT:
+        metrics_registry.serve(int(METRICS_PORT))
+
+    if len(clients) > 1:
+        # all brokers share one process, dedup store and SQS sender
+        event_loop = BrokerEventLoop(clients)
+        threading.Thread(target=monitor_in_flight, args=(clients,), daemon=True).start()
+        event_loop.run_forever()
+        return
 
-    threading.Thread(target=monitor_in_flight, args=(client,), daemon=True).start()
+    client = clients[0]
+    threading.Thread(target=monitor_in_flight, args=(clients,), daemon=True).start()
 
     while True:
         try:
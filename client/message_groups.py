@@ -0,0 +1,52 @@
+import re
+from functools import lru_cache
+
+from dedup_store import digest64
+
+# SQS FIFO MessageGroupId: up to 128 alphanumeric/punctuation characters
+MAX_GROUP_ID_LENGTH = 127
+_NON_WORD = re.compile(r'\W+')
+
+# every strategy maps a given data_id to a single group, so updates of one data_id stay in order
+GROUP_STRATEGIES = ('data_id', 'sharded', 'centre')
+
+
+def _group_id(key: str) -> str:
+    # SQS refuses an empty MessageGroupId, a key with no word characters gets a stable digest instead
+    group_id = _NON_WORD.sub('', key)[-MAX_GROUP_ID_LENGTH:]
+    return group_id or f"key-{digest64(key)}"
+
+
+@lru_cache(maxsize=65536)
+def data_id_group(data_id: str) -> str:
+    """One message group per data_id (maximum parallelism, ordering per data_id)."""
+    return _group_id(data_id)
+
+
+@lru_cache(maxsize=65536)
+def sharded_group(data_id: str, shards: int) -> str:
+    """data_ids hashed into a fixed number of groups (bounded parallelism, ordering per shard)."""
+    # blake2b rather than hash() so every client process maps a data_id to the same shard
+    return f"shard-{digest64(data_id) % shards}"
+
+
+@lru_cache(maxsize=4096)
+def centre_group(topic: str) -> str:
+    """One message group per centre (parallelism limited to the number of centres, ordering per centre)."""
+    # topic: <channel>/a/wis2/<centre-id>/...
+    parts = topic.split('/')
+    centre = parts[3] if len(parts) > 3 else topic
+    return _group_id(centre)
+
+
+def make_group_strategy(name: str, shards: int = 32):
+    """Returns a function (data_id, topic) -> MessageGroupId for the named strategy."""
+    if name == 'data_id':
+        return lambda data_id, topic: data_id_group(data_id)
+    if name == 'sharded':
+        if shards < 1:
+            raise ValueError("sharded message groups need at least one shard")
+        return lambda data_id, topic: sharded_group(data_id, shards)
+    if name == 'centre':
+        return lambda data_id, topic: centre_group(topic)
+    raise ValueError(f"message group strategy {name} not supported, use one of {GROUP_STRATEGIES}")
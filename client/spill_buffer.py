@@ -0,0 +1,248 @@
+import glob
+import logging
+import os
+import threading
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+import json_codec
+
+from sqs_batcher import MAX_BATCH_BYTES, MAX_BATCH_ENTRIES, message_size
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = 'segment-*.log'
+# records SQS refuses for good, kept for inspection or a manual replay
+REJECT_FILE = 'rejected.log'
+MAX_DRAIN_BACKOFF = 30
+# error codes of SQS and the AWS request layer worth retrying, any other client error will not go away
+TRANSIENT_ERROR_CODES = frozenset({
+    'ServiceUnavailable', 'InternalError', 'InternalFailure', 'RequestTimeout', 'RequestTimeoutException',
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottled', 'RequestLimitExceeded',
+    'KmsThrottled', 'KMS.ThrottlingException', 'AWS.SimpleQueueService.KmsThrottled',
+})
+
+
+def is_transient(error: ClientError) -> bool:
+    """Whether a client error of SQS is worth retrying: a throttle or a server side failure."""
+    code = error.response.get('Error', {}).get('Code')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+    return code in TRANSIENT_ERROR_CODES or status >= 500
+
+
+class SpillBuffer:
+    """Append-only, segment-based local buffer for notifications SQS could not take.
+
+    Records are appended as JSON lines to the current segment file, which is
+    rotated once it reaches ``segment_bytes``. A background thread drains the
+    oldest segment to the queue in send_message_batch calls once SQS accepts
+    messages again, and deletes the segment when every record in it has been
+    acknowledged. Delivery is at-least-once: segments left over from a previous
+    run are drained from the start, and the manager lambda drops the repeats.
+    Throttling and server errors pause the drain; records SQS refuses for good
+    are moved to ``rejected.log`` in the same directory instead of blocking it.
+    """
+
+    def __init__(self, queue, directory: str, segment_bytes: int = 16 * 1024 * 1024,
+                 max_bytes: int = 1024 ** 3):
+        self.queue = queue
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        existing = self._segments()
+        self._next_seq = int(os.path.basename(existing[-1])[8:-4]) + 1 if existing else 0
+        self._bytes = sum(os.path.getsize(path) for path in existing)
+        self._current = None
+        self._current_path = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # records of the segment being drained that are not acknowledged yet
+        self._draining_path = None
+        self._remaining = []
+        # stats
+        self.spilled = 0
+        self.drained = 0
+        self.dropped = 0
+        self.rejected = 0
+        if existing:
+            logger.warning(f"{len(existing)} spill segment(s) found in {directory}, draining")
+            self._wake.set()
+        threading.Thread(target=self._drain_forever, name='spill-drain', daemon=True).start()
+
+    def _segments(self) -> list:
+        return sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)))
+
+    def append(self, body: str, group_id: str, attributes: dict = None) -> bool:
+        """Writes a message to the current segment, returns False if the buffer is full."""
+        record = json_codec.dumps({'body': body, 'group_id': group_id, 'attributes': attributes}) + b'\n'
+        size = len(record)
+        with self._lock:
+            if self._bytes + size > self.max_bytes:
+                self.dropped += 1
+                logger.error(f"spill buffer full ({self._bytes} bytes), dropping message for group {group_id}")
+                return False
+            if self._current is None:
+                self._current_path = os.path.join(self.directory, f"segment-{self._next_seq:012d}.log")
+                self._next_seq += 1
+                self._current = open(self._current_path, 'ab')
+            self._current.write(record)
+            self._current.flush()
+            self._bytes += size
+            self.spilled += 1
+            if self._current.tell() >= self.segment_bytes:
+                self._rotate()
+        self._wake.set()
+        return True
+
+    def _rotate(self):
+        # caller must hold self._lock
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+            self._current_path = None
+
+    def _next_segment(self) -> str | None:
+        with self._lock:
+            closed = [path for path in self._segments() if path != self._current_path]
+            if not closed and self._current is not None:
+                # nothing sealed yet, seal the open segment so it can drain
+                self._rotate()
+                closed = self._segments()
+            return closed[0] if closed else None
+
+    def _drain_forever(self):
+        backoff = 1
+        while True:
+            self._wake.wait(timeout=5)
+            self._wake.clear()
+            while True:
+                try:
+                    path = self._draining_path or self._next_segment()
+                    if path is None:
+                        break
+                    if self._drain_segment(path):
+                        backoff = 1
+                        continue
+                    # SQS still refusing, keep the records and try again later
+                except Exception as e:
+                    logger.error(f"Unexpected error draining the spill buffer: {e}. Retrying in {backoff}s",
+                                 exc_info=True)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_DRAIN_BACKOFF)
+
+    def _load_segment(self, path: str) -> list:
+        """Reads the records of a segment, skipping lines that do not decode.
+
+        A crash in the middle of append leaves a torn last line, which would
+        otherwise stop the segment, and every one after it, from draining.
+        """
+        records = []
+        with open(path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json_codec.loads(line)
+                    if not isinstance(record.get('body'), str) or not isinstance(record.get('group_id'), str):
+                        raise ValueError('body and group_id must be strings')
+                except (ValueError, AttributeError) as e:
+                    logger.error(f"skipping undecodable line {number} of {path}: {e}")
+                    with self._lock:
+                        self.dropped += 1
+                    continue
+                records.append(record)
+        return records
+
+    def _drain_segment(self, path: str) -> bool:
+        """Sends the remaining records of a segment, returns False if SQS did not take all of them."""
+        if self._draining_path != path:
+            self._remaining = self._load_segment(path)
+            self._draining_path = path
+        while self._remaining:
+            batch, batch_bytes = [], 0
+            for record in self._remaining:
+                size = message_size(record['body'], record.get('attributes'))
+                if len(batch) == MAX_BATCH_ENTRIES or (batch and batch_bytes + size > MAX_BATCH_BYTES):
+                    break
+                batch.append(record)
+                batch_bytes += size
+            if batch_bytes > MAX_BATCH_BYTES:
+                # a single record SQS can never take
+                self._reject(batch[0], 'MessageTooLong')
+                self._remaining = self._remaining[1:]
+                continue
+            try:
+                retry = self._send(batch)
+            except (ClientError, BotoCoreError) as e:
+                logger.warning(f"spill drain paused, SQS unavailable: {e}")
+                return False
+            self._remaining = retry + self._remaining[len(batch):]
+            if retry:
+                return False
+        with self._lock:
+            self._bytes -= os.path.getsize(path)
+            os.remove(path)
+        self._draining_path = None
+        return True
+
+    def _send(self, batch: list) -> list:
+        """Sends a batch of records, returns the ones to send again.
+
+        A batch refused as a whole for a permanent error is split in half
+        until the record causing it is alone, which is then rejected. Halves
+        sent before SQS becomes unavailable are sent again with the rest.
+
+        Raises:
+            ClientError, BotoCoreError: If SQS is unavailable, the batch is kept as it is.
+        """
+        entries = []
+        for i, record in enumerate(batch):
+            entry = {'Id': str(i), 'MessageBody': record['body'], 'MessageGroupId': record['group_id']}
+            if record.get('attributes'):
+                entry['MessageAttributes'] = record['attributes']
+            entries.append(entry)
+        try:
+            failed = self.queue.send_message_batch(Entries=entries).get('Failed', [])
+        except ClientError as e:
+            if is_transient(e):
+                raise
+            code = e.response.get('Error', {}).get('Code')
+            if len(batch) > 1:
+                logger.warning(f"SQS refused a batch of {len(batch)} spilled messages ({code}), splitting it")
+                half = len(batch) // 2
+                return self._send(batch[:half]) + self._send(batch[half:])
+            self._reject(batch[0], code)
+            return []
+        retry = set()
+        for failure in failed:
+            if failure.get('SenderFault'):
+                self._reject(batch[int(failure['Id'])], failure.get('Code'))
+            else:
+                retry.add(int(failure['Id']))
+        with self._lock:
+            self.drained += len(batch) - len(failed)
+        return [record for i, record in enumerate(batch) if i in retry]
+
+    def _reject(self, record: dict, code: str | None):
+        """Moves a record SQS will never take to the reject file, so it stops holding up the drain."""
+        logger.error(f"SQS rejected spilled message for group {record['group_id']} ({code}), "
+                     f"moving it to {REJECT_FILE}")
+        line = json_codec.dumps({**record, 'error': code}) + b'\n'
+        with self._lock:
+            with open(os.path.join(self.directory, REJECT_FILE), 'ab') as f:
+                f.write(line)
+            self.rejected += 1
+
+    def stats(self) -> dict:
+        """Returns segment count, buffered bytes and the spilled, drained, dropped and rejected totals."""
+        with self._lock:
+            return {
+                'segments': len(self._segments()),
+                'bytes': self._bytes,
+                'spilled': self.spilled,
+                'drained': self.drained,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+            }
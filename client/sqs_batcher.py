@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger(__name__)
+
+# SQS hard limits for a single send_message_batch call
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+
+def message_size(body: str, attributes: dict = None) -> int:
+    """Size of a message as SQS counts it towards MAX_BATCH_BYTES, attribute names, types and values included."""
+    return len(body.encode()) + sum(len(name) + len(value['DataType']) + len(value['StringValue'])
+                                    for name, value in (attributes or {}).items())
+
+
+class _PendingEntry:
+    __slots__ = ('body', 'group_id', 'attributes', 'size', 'attempts', 'enqueued')
+
+    def __init__(self, body: str, group_id: str, attributes: dict = None):
+        self.body = body
+        self.group_id = group_id
+        self.attributes = attributes
+        self.size = message_size(body, attributes)
+        self.attempts = 0
+        self.enqueued = time.monotonic()
+
+    def to_entry(self, entry_id: str) -> dict:
+        entry = {'Id': entry_id, 'MessageBody': self.body, 'MessageGroupId': self.group_id}
+        if self.attributes:
+            entry['MessageAttributes'] = self.attributes
+        return entry
+
+
+class SqsBatchSender:
+    """Accumulates notifications and forwards them with send_message_batch.
+
+    A batch is flushed as soon as it holds MAX_BATCH_ENTRIES entries, reaches
+    MAX_BATCH_BYTES, or its oldest entry has waited ``linger_seconds``. Batches
+    are sent from a small thread pool so the caller (the MQTT network thread)
+    never waits on an SQS round trip unless ``max_pending`` entries are queued.
+    Entries reported as failed by SQS are retried individually up to
+    ``max_attempts`` times. With more than one send thread, batches for the
+    same message group can reach SQS out of order; the manager Lambda's
+    pubtime check already tolerates this.
+
+    If a ``spill`` buffer is given, entries that exhaust their attempts, and
+    new entries arriving while ``max_pending`` entries are already queued, are
+    written to it instead of being dropped or blocking the caller.
+    """
+
+    def __init__(self, queue, linger_seconds: float = 0.05, send_threads: int = 4,
+                 max_attempts: int = 3, max_pending: int = 10000, spill=None, latency_histogram=None):
+        self.queue = queue
+        self.spill = spill
+        # optional metrics.Histogram observing each send_message_batch call
+        self.latency_histogram = latency_histogram
+        self.linger_seconds = linger_seconds
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self._pending = []
+        self._pending_bytes = 0
+        # entries cut into a batch and not sent, dropped or spilled yet, retries waiting on a timer included
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._send_slots = threading.BoundedSemaphore(send_threads)
+        self._executor = ThreadPoolExecutor(max_workers=send_threads, thread_name_prefix='sqs-batch')
+        # stats
+        self.batches_sent = 0
+        self.entries_sent = 0
+        self.entries_retried = 0
+        self.entries_dropped = 0
+        self.entries_spilled = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        threading.Thread(target=self._run, name='sqs-batch-flusher', daemon=True).start()
+
+    def send(self, body: str, group_id: str, attributes: dict = None):
+        """Queues a message body, with optional SQS string message attributes, for the next batch."""
+        entry = _PendingEntry(body, group_id, attributes)
+        if entry.size > MAX_BATCH_BYTES:
+            logger.error(f"message for group {group_id} exceeds {MAX_BATCH_BYTES} bytes, not sent to SQS")
+            with self._cond:
+                self.entries_dropped += 1
+            return
+        with self._cond:
+            if self.spill is None:
+                while len(self._pending) >= self.max_pending:
+                    self._cond.wait()
+            elif len(self._pending) >= self.max_pending:
+                self._spill(entry)
+                return
+            self._append(entry)
+
+    def _spill(self, entry: _PendingEntry):
+        # caller must hold self._cond
+        if self.spill.append(entry.body, entry.group_id, entry.attributes):
+            self.entries_spilled += 1
+        else:
+            self.entries_dropped += 1
+
+    def _append(self, entry: _PendingEntry, front: bool = False):
+        # caller must hold self._cond
+        if front:
+            self._pending.insert(0, entry)
+        else:
+            self._pending.append(entry)
+        self._pending_bytes += entry.size
+        self._cond.notify_all()
+
+    def _batch_ready(self) -> bool:
+        return len(self._pending) >= MAX_BATCH_ENTRIES or self._pending_bytes >= MAX_BATCH_BYTES
+
+    def _cut_batch(self) -> list:
+        # caller must hold self._cond
+        batch, batch_bytes = [], 0
+        for entry in self._pending:
+            if len(batch) == MAX_BATCH_ENTRIES or batch_bytes + entry.size > MAX_BATCH_BYTES:
+                break
+            batch.append(entry)
+            batch_bytes += entry.size
+        del self._pending[:len(batch)]
+        self._pending_bytes -= batch_bytes
+        self._in_flight += len(batch)
+        self._cond.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            self._send_slots.acquire()
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._pending[0].enqueued + self.linger_seconds
+                while self._pending and not self._batch_ready():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._cut_batch()
+            if batch:
+                self._executor.submit(self._send_batch, batch)
+            else:
+                self._send_slots.release()
+
+    def _send_batch(self, batch: list):
+        retries = []
+        try:
+            entries = [entry.to_entry(str(i)) for i, entry in enumerate(batch)]
+            st = time.monotonic()
+            try:
+                response = self.queue.send_message_batch(Entries=entries)
+                failed = response.get('Failed', [])
+            except (ClientError, BotoCoreError) as e:
+                logger.warning(f"send_message_batch failed for {len(batch)} entries: {e}")
+                failed = [{'Id': entry['Id'], 'SenderFault': False, 'Code': type(e).__name__}
+                          for entry in entries]
+            now = time.monotonic()
+            if self.latency_histogram is not None:
+                self.latency_histogram.observe(now - st)
+            failed_ids = {int(f['Id']) for f in failed}
+            with self._cond:
+                sent = len(batch) - len(failed_ids)
+                if sent:
+                    self.batches_sent += 1
+                    self.entries_sent += sent
+                    flush_seconds = now - min(entry.enqueued for entry in batch)
+                    self.flush_seconds_total += flush_seconds
+                    self.flush_seconds_max = max(self.flush_seconds_max, flush_seconds)
+            held = [entry for entry in (self._check_retry(batch[int(f['Id'])], f) for f in failed) if entry]
+            if held:
+                # short backoff before the failed entries rejoin the head of the queue
+                backoff = threading.Timer(min(0.1 * 2 ** max(entry.attempts for entry in held), 2),
+                                          self._requeue, args=(held,))
+                backoff.daemon = True
+                backoff.start()
+                retries = held
+        except Exception:
+            logger.exception(f"unexpected error sending batch of {len(batch)} entries to SQS")
+        finally:
+            with self._cond:
+                # retries stay in flight until they are requeued
+                self._in_flight -= len(batch) - len(retries)
+                self._cond.notify_all()
+            self._send_slots.release()
+
+    def _requeue(self, retries: list):
+        with self._cond:
+            self.entries_retried += len(retries)
+            self._in_flight -= len(retries)
+            for entry in reversed(retries):
+                self._append(entry, front=True)
+
+    def _check_retry(self, entry: _PendingEntry, failure: dict) -> _PendingEntry | None:
+        entry.attempts += 1
+        if not failure.get('SenderFault') and entry.attempts >= self.max_attempts and self.spill is not None:
+            logger.warning(f"SQS unavailable after {entry.attempts} attempt(s), spilling message for group "
+                           f"{entry.group_id}: {failure.get('Code')}")
+            with self._cond:
+                self._spill(entry)
+            return None
+        if failure.get('SenderFault') or entry.attempts >= self.max_attempts:
+            logger.error(f"dropping message for group {entry.group_id} after {entry.attempts} attempt(s): "
+                         f"{failure.get('Code')} {failure.get('Message', '')}")
+            with self._cond:
+                self.entries_dropped += 1
+            return None
+        return entry
+
+    def stats(self) -> dict:
+        """Returns batching counters: fill ratio is entries per batch over MAX_BATCH_ENTRIES."""
+        with self._cond:
+            batches = self.batches_sent
+            return {
+                'pending': len(self._pending),
+                'in_flight': self._in_flight,
+                'batches_sent': batches,
+                'entries_sent': self.entries_sent,
+                'entries_retried': self.entries_retried,
+                'entries_dropped': self.entries_dropped,
+                'entries_spilled': self.entries_spilled,
+                'fill_ratio': self.entries_sent / (batches * MAX_BATCH_ENTRIES) if batches else 0.0,
+                'flush_latency_avg': self.flush_seconds_total / batches if batches else 0.0,
+                'flush_latency_max': self.flush_seconds_max,
+            }
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Blocks until every entry has been sent, dropped or spilled, retries included, or timeout expires.
+
+        Returns False if entries were still pending or in flight at the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
@@ -55,25 +55,28 @@ wis2_client_cluster = Wis2ClientClusterStack(app, "wis2-client-cluster", vpc_id=
 fr_client_stack = Wis2ClientStack(app, "wis2-client-france", cluster=wis2_client_cluster.cluster,
                                   broker_connection_secret_arn=fr_broker_secret_arn,
                                   queue_name=wis2_sqs_stack.queue_name, bucket_name=destination_bucket_name,
-                                  env=env)
+                                  redis_endpoint=redis_stack.redis_primary, env=env)
 fr_client_stack.add_dependency(wis2_client_cluster)
 fr_client_stack.add_dependency(wis2_sqs_stack)
+fr_client_stack.add_dependency(redis_stack)
 
 # Global Broker - Brazil
 br_client_stack = Wis2ClientStack(app, "wis2-client-brazil", cluster=wis2_client_cluster.cluster,
                                   broker_connection_secret_arn=br_broker_secret_arn,
                                   queue_name=wis2_sqs_stack.queue_name, bucket_name=destination_bucket_name,
-                                  env=env)
+                                  redis_endpoint=redis_stack.redis_primary, env=env)
 br_client_stack.add_dependency(wis2_client_cluster)
 br_client_stack.add_dependency(wis2_sqs_stack)
+br_client_stack.add_dependency(redis_stack)
 
 # Global Broker - NWS NOAA
 nws_client_stack = Wis2ClientStack(app, "wis2-client-nws-noaa", cluster=wis2_client_cluster.cluster,
                                   broker_connection_secret_arn=nws_noaa_broker_secret_arn,
                                   queue_name=wis2_sqs_stack.queue_name, bucket_name=destination_bucket_name,
-                                  env=env)
+                                  redis_endpoint=redis_stack.redis_primary, env=env)
 nws_client_stack.add_dependency(wis2_client_cluster)
 nws_client_stack.add_dependency(wis2_sqs_stack)
+nws_client_stack.add_dependency(redis_stack)
 
 # Broker
 emqx_broker_stack = EmqxBrokerStack(
@@ -98,6 +101,7 @@ manager_lambda_stack = Wis2ManagerLambdaStack(
     static_broker_url,
     queue_name=wis2_sqs_stack.node.id,
     queue_arn=wis2_sqs_stack.queue_arn,
+    dlq_arn=wis2_sqs_stack.dlq_arn,
     cache_bucket_name=destination_bucket_name,
     cache_bucket_region=dest_bucket_region,
     memory_footprint=lambda_memory,
@@ -97,6 +97,7 @@ manager_lambda_stack = Wis2ManagerLambdaStack(
     static_broker_url,
     queue_name=wis2_sqs_stack.node.id,
     queue_arn=wis2_sqs_stack.queue_arn,
+    dlq_arn=wis2_sqs_stack.dlq_arn,
     cache_bucket_name=dest_bucket_stack.bucket.bucket_name,
     cache_bucket_region=env['region'],
     memory_footprint=lambda_memory,
@@ -28,7 +28,7 @@ class Wis2ClientClusterStack(Stack):
 
 
 class Wis2ClientStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, cluster: ecs.Cluster, broker_connection_string: str, queue_name: str,bucket_name:str, subnet_ids: list=None, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, cluster: ecs.Cluster, broker_connection_string: str, queue_name: str,bucket_name:str, subnet_ids: list=None, redis_endpoint: str=None, **kwargs) -> None:
         super().__init__(scope, construct_id,
                          description=f"Client to listen for messages from {broker_connection_string} for WMO/WIS2.0 Global Cache.",
                          **kwargs)
@@ -51,10 +51,14 @@ class Wis2ClientStack(Stack):
                                                 description="Allow MQTT access",
                                                 disable_inline_rules=True
                                                 )
+        # allow prometheus scraping of the client metrics endpoint from inside the vpc
+        mqtt_security_group.add_ingress_rule(ec2.Peer.ipv4(vpc.vpc_cidr_block), ec2.Port.tcp(9100),
+                                             'allow metrics scraping')
 
-        # Build docker image
+        # Build docker image from the repository root, it copies in the json codec of the manager lambda
         asset = DockerImageAsset(self, f"{construct_id}-image",
-                                 directory="../client",
+                                 directory="..",
+                                 file="client/Dockerfile",
                                  platform=Platform.LINUX_AMD64
                                  )
 
@@ -88,12 +92,17 @@ class Wis2ClientStack(Stack):
 
             image=ecs.ContainerImage.from_registry(asset.image_uri),
             essential=True,
+            port_mappings=[ecs.PortMapping(container_port=9100)],
         )
 
         # Set container env variables
         app_container.add_environment("QUEUE_NAME", queue_name)
         app_container.add_environment("BUCKET_NAME", bucket_name)
         app_container.add_environment("GB_CONNECTION_STRING", broker_connection_string)
+        if redis_endpoint:
+            # share duplicate detection with the other global broker clients
+            app_container.add_environment("DEDUP_BACKEND", "redis")
+            app_container.add_environment("DEDUP_REDIS_HOST", redis_endpoint)
 
         self.service = fargate_service = ecs.FargateService(
             self, f"{construct_id}-service",
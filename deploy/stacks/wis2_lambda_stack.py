@@ -24,6 +24,7 @@ class Wis2ManagerLambdaStack(Stack):
                  broker_url: str,
                  queue_name: str,
                  queue_arn: str,
+                 dlq_arn: str,
                  cache_bucket_name: str,
                  cache_bucket_region: str,
                  memory_footprint: int,
@@ -52,6 +53,8 @@ class Wis2ManagerLambdaStack(Stack):
 
         # Get existing SQS queue from ARN
         wis2_lambda_queue = sqs.Queue.from_queue_arn(self, id=queue_name, queue_arn=queue_arn)
+        # records that keep failing are moved to the dlq by the lambda
+        wis2_lambda_dlq = sqs.Queue.from_queue_arn(self, id=f"{queue_name}-dlq", queue_arn=dlq_arn)
 
         # Use provided IAM Role ARN
         wis2_lambda_role = iam.Role.from_role_arn(
@@ -84,6 +87,9 @@ class Wis2ManagerLambdaStack(Stack):
             code=_lambda.Code.from_asset('../manager_lambda',
                                          bundling=BundlingOptions(
                                              image=DockerImage.from_registry("python:3.10"),
+                                             # install the arm64 wheels of the function (orjson), not the
+                                             # ones of the build host
+                                             platform="linux/arm64",
                                              command=[
                                                  'bash', '-c',
                                                  'pip install -r requirements.txt -t /asset-output && cp -au . '
@@ -102,7 +108,9 @@ class Wis2ManagerLambdaStack(Stack):
                 "MQTT_PUB_USER": wis2_mqtt_publisher.get('user'),
                 "MQTT_BROKER_HOST": broker_url,
                 "CACHE_ENDPOINT": cache_endpoint,
-                "REPORT_BY": report_by
+                "REPORT_BY": report_by,
+                "MAX_WORKERS": "10",
+                "DLQ_ARN": dlq_arn
             },
             insights_version=_lambda.LambdaInsightsVersion.VERSION_1_0_119_0 if include_insights else None,
             dead_letter_queue_enabled=True,
@@ -115,8 +123,9 @@ class Wis2ManagerLambdaStack(Stack):
             )
         )
 
-        event_source = event_sources.SqsEventSource(wis2_lambda_queue, batch_size=1,
+        event_source = event_sources.SqsEventSource(wis2_lambda_queue, batch_size=10,
                                                     report_batch_item_failures=True,
                                                     max_concurrency=500)
         wis2_lambda.add_event_source(event_source)
+        wis2_lambda_dlq.grant_send_messages(wis2_lambda)
         self.lambda_function = wis2_lambda
\ No newline at end of file
@@ -25,7 +25,10 @@ class Wis2SQSStack(Stack):
                                     receive_message_wait_time = Duration.seconds(2),
                                     # visibility cannot be less than lambda function timeout
                                     visibility_timeout=Duration.minutes(15),
-                                    dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=2, queue=wis2_work_dlq),
+                                    # a backstop only: the manager lambda moves a record to the dlq itself after
+                                    # MAX_RECORD_FAILURES failed attempts. SQS counts every receive, deferrals while
+                                    # a dataserver is unavailable included, so this leaves room for MAX_DEFERRALS
+                                    dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=12, queue=wis2_work_dlq),
                                     content_based_deduplication=True,
                                     # setting deduplication scope to message group (this is specified at time of queueing by the mqtt client)
                                     deduplication_scope=sqs.DeduplicationScope.MESSAGE_GROUP,
@@ -36,4 +39,5 @@ class Wis2SQSStack(Stack):
         self.queue_arn = wis2_work_queue.queue_arn
         self.queue_name = wis2_work_queue.queue_name
         self.dlq_name = wis2_work_dlq.queue_name
+        self.dlq_arn = wis2_work_dlq.queue_arn
         self.queue_url = wis2_work_queue.queue_url
@@ -0,0 +1,128 @@
+# claims are held while a notification is downloaded and cached, so concurrent copies skip it
+CLAIM_PREFIX = 'claim:'
+# "method:digest" of the object last stored at an s3 key, so byte-identical republications are not uploaded again
+DIGEST_PREFIX = 'digest:'
+
+# atomically: re-check uniqueness of the notification, record its pubtime, apply the metric updates
+# and release the claim.
+# KEYS[1] - data_id, KEYS[2] - claim key, KEYS[3..n] - metric keys
+# ARGV[1] - pubtime epoch, ARGV[2] - '1' if the notification is an update/deletion, ARGV[3] - ttl seconds,
+# ARGV[4] - claim token, ARGV[5] - ttl seconds of 'set_ex' keys, then an (operation, value) pair per key,
+# operation being 'inc', 'set', or 'set_ex' to expire the key after ARGV[5] seconds
+COMMIT_SCRIPT = """
+if redis.call('GET', KEYS[2]) == ARGV[4] then
+    redis.call('DEL', KEYS[2])
+end
+local last = redis.call('GET', KEYS[1])
+if last then
+    if tonumber(ARGV[1]) <= tonumber(last) or ARGV[2] ~= '1' then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+for i = 3, #KEYS do
+    local op = ARGV[2 * i]
+    local value = ARGV[2 * i + 1]
+    if op == 'inc' then
+        redis.call('INCRBY', KEYS[i], value)
+    elseif op == 'set_ex' then
+        redis.call('SET', KEYS[i], value, 'EX', ARGV[5])
+    else
+        redis.call('SET', KEYS[i], value)
+    end
+end
+return 1
+"""
+
+# deletes the claim in KEYS[1] if it is still held with the token in ARGV[1]
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def claim_key(data_id, pubtime_epoch):
+    return f"{CLAIM_PREFIX}{data_id}|{pubtime_epoch}"
+
+
+def digest_key(s3_key):
+    return f"{DIGEST_PREFIX}{s3_key}"
+
+
+class CacheState:
+    """
+    redis state of the global cache for one notification, in two round trips:
+    claim() before the download and commit() once the data object is in the bucket.
+    """
+
+    def __init__(self, client, ttl_seconds, claim_seconds=120, digest_seconds=None):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.claim_seconds = claim_seconds
+        # how long after an upload its digest is trusted to describe the object in the bucket,
+        # must stay below the lifecycle expiration of the bucket
+        self.digest_seconds = digest_seconds or ttl_seconds
+        self._commit = client.register_script(COMMIT_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def claim(self, data_id, pubtime_epoch, token, s3_key=None):
+        """
+        reads the last cached pubtime of data_id and claims (data_id, pubtime) for this invocation
+        Parameters
+        ----------
+        data_id - str - data_id of the notification
+        pubtime_epoch - float - pubtime of the notification
+        token - str - identifies the claim holder, e.g. the uuid of the cache notification
+        s3_key - str - bucket key the data object would be cached at, None for pass through notifications
+
+        Returns
+        -------
+        tuple - (pubtime epoch of the last notification cached for data_id or None,
+                 True if the claim was taken, False if another invocation holds it,
+                 "method:digest" of the object stored at s3_key or None)
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(data_id)
+        pipe.set(claim_key(data_id, pubtime_epoch), token, nx=True, px=int(self.claim_seconds * 1000))
+        if s3_key is not None:
+            pipe.get(digest_key(s3_key))
+        results = pipe.execute()
+        cached_digest = results[2] if s3_key is not None else None
+        return results[0], bool(results[1]), cached_digest
+
+    def release(self, data_id, pubtime_epoch, token):
+        """
+        gives up a claim without recording the notification, so a retry can take it straight away
+        """
+        self._release(keys=[claim_key(data_id, pubtime_epoch)], args=[token])
+
+    def commit(self, data_id, pubtime_epoch, is_update, token, metrics=(), s3_key=None, digest=None):
+        """
+        records the notification as cached unless a newer one got there first, updates the metrics with it
+        and releases the claim
+        Parameters
+        ----------
+        data_id - str - data_id of the notification
+        pubtime_epoch - float - pubtime of the notification
+        is_update - bool - notification carries an update or deletion link
+        token - str - token the claim was taken with
+        metrics - iterable of (key, operation, value) - operation is 'inc' or 'set'
+        s3_key - str - bucket key the data object was uploaded to
+        digest - str - "method:digest" of the uploaded data object, indexed under s3_key for digest_seconds.
+                 only pass it for an actual upload, the bucket expires the object on its own schedule
+
+        Returns
+        -------
+        bool - True if the notification is unique and was recorded, False if it is a duplicate
+        """
+        keys = [data_id, claim_key(data_id, pubtime_epoch)]
+        args = [pubtime_epoch, '1' if is_update else '0', self.ttl_seconds, token, self.digest_seconds]
+        for key, operation, value in metrics:
+            keys.append(key)
+            args.extend([operation, value])
+        if s3_key is not None and digest is not None:
+            keys.append(digest_key(s3_key))
+            args.extend(['set_ex', digest])
+        return self._commit(keys=keys, args=args) == 1
@@ -0,0 +1,180 @@
+import time
+from contextlib import contextmanager
+
+BREAKER_PREFIX = 'breaker:'
+# the state is reported in the <centre>|<dataserver>|wmo_wis2_gc_dataserver_breaker_status metric:
+# 0 - closed, 1 - half-open, 2 - open
+
+# takes an in-flight slot for a download unless the breaker is open or the dataserver is at its cap.
+# an open breaker turns half-open once open seconds passed, and then lets a single probe through.
+# KEYS[1] - breaker hash, KEYS[2] - in-flight zset, KEYS[3] - status metric key
+# ARGV[1] - now, ARGV[2] - open seconds, ARGV[3] - max in flight, ARGV[4] - lease seconds, ARGV[5] - token
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+-- slots of invocations that died without releasing them
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[4]))
+local in_flight = redis.call('ZCARD', KEYS[2])
+if state == 'open' then
+    if now - tonumber(redis.call('HGET', KEYS[1], 'opened_at') or '0') < tonumber(ARGV[2]) then
+        return 'open'
+    end
+    state = 'half_open'
+    redis.call('HSET', KEYS[1], 'state', state)
+    redis.call('SET', KEYS[3], 1)
+end
+if state == 'half_open' and in_flight > 0 then
+    return 'open'
+end
+if in_flight >= tonumber(ARGV[3]) then
+    return 'busy'
+end
+redis.call('ZADD', KEYS[2], now, ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return 'ok'
+"""
+
+# releases the in-flight slot, records the outcome and latency in the current window bucket and moves
+# the breaker: half-open closes on a successful download that was not slow and re-opens otherwise,
+# closed opens once the error rate or the rate of slow downloads over the window reaches its threshold.
+# KEYS[1] - breaker hash, KEYS[2] - in-flight zset, KEYS[3] - status metric key,
+# KEYS[4] - current window bucket, KEYS[5..n] - the other buckets of the window
+# ARGV[1] - token, ARGV[2] - outcome 'ok', 'error' or 'ignore', ARGV[3] - latency ms, ARGV[4] - now,
+# ARGV[5] - window seconds, ARGV[6] - error rate threshold, ARGV[7] - minimum requests in the window,
+# ARGV[8] - slow download ms, ARGV[9] - slow rate threshold
+RECORD_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+local previous = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if ARGV[2] == 'ignore' then
+    return previous
+end
+local slow = tonumber(ARGV[3]) >= tonumber(ARGV[8])
+redis.call('HINCRBY', KEYS[4], 'requests', 1)
+if ARGV[2] == 'error' then
+    redis.call('HINCRBY', KEYS[4], 'errors', 1)
+end
+if slow then
+    redis.call('HINCRBY', KEYS[4], 'slow', 1)
+end
+redis.call('EXPIRE', KEYS[4], ARGV[5])
+local state = previous
+if previous == 'half_open' then
+    state = (ARGV[2] == 'ok' and not slow) and 'closed' or 'open'
+elseif previous == 'closed' and (ARGV[2] == 'error' or slow) then
+    local requests, errors, slows = 0, 0, 0
+    for i = 4, #KEYS do
+        local bucket = redis.call('HMGET', KEYS[i], 'requests', 'errors', 'slow')
+        requests = requests + tonumber(bucket[1] or '0')
+        errors = errors + tonumber(bucket[2] or '0')
+        slows = slows + tonumber(bucket[3] or '0')
+    end
+    if requests >= tonumber(ARGV[7]) and (errors / requests >= tonumber(ARGV[6])
+                                          or slows / requests >= tonumber(ARGV[9])) then
+        state = 'open'
+    end
+end
+if state ~= previous then
+    redis.call('HSET', KEYS[1], 'state', state, 'opened_at', ARGV[4])
+end
+redis.call('EXPIRE', KEYS[1], 86400)
+redis.call('SET', KEYS[3], ({closed = 0, half_open = 1, open = 2})[state])
+return state
+"""
+
+
+class DataserverUnavailable(Exception):
+    """raised when the breaker of a dataserver is open or its in-flight downloads are at the cap"""
+
+
+class CircuitBreaker:
+    """
+    per dataserver circuit breaker shared by all lambda invocations through redis.
+
+    the error rate and download latency are counted over a rolling window of window_seconds, split in
+    buckets. the breaker opens once at least min_requests downloads in the window failed at error_rate
+    or more, or took slow_seconds or longer at slow_rate or more, so a dataserver that answers but
+    crawls is shed as well. it rejects downloads for open_seconds, then lets a single probe through
+    (half-open) that closes or re-opens it.
+    independent of its state, at most max_in_flight downloads run against a dataserver at once; a
+    download finding the dataserver at its cap is not waited for, the caller defers it.
+    """
+
+    def __init__(self, client, error_rate=0.5, min_requests=10, window_seconds=60, open_seconds=30,
+                 max_in_flight=20, lease_seconds=900, buckets=6, slow_seconds=10, slow_rate=0.5):
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.max_in_flight = max_in_flight
+        self.lease_seconds = lease_seconds
+        self.buckets = buckets
+        self.bucket_seconds = max(window_seconds // buckets, 1)
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._record = client.register_script(RECORD_SCRIPT)
+
+    def _window_keys(self, dataserver, now):
+        current = int(now // self.bucket_seconds)
+        return [f"{BREAKER_PREFIX}{dataserver}:window:{current - i}" for i in range(self.buckets)]
+
+    def acquire(self, dataserver, token, status_key):
+        """
+        takes an in-flight slot for a download from dataserver, without waiting for one
+        Parameters
+        ----------
+        dataserver - str - host the data object is downloaded from
+        token - str - identifies the slot, released again by record()
+        status_key - str - metric key the breaker state is reported under
+
+        Raises
+        -------
+        DataserverUnavailable - if the breaker is open or the dataserver is at its in-flight cap
+        """
+        keys = [f"{BREAKER_PREFIX}{dataserver}", f"{BREAKER_PREFIX}{dataserver}:in_flight", status_key]
+        # a busy dataserver is not waited for, sleeping here would bill idle lambda time and hold a worker
+        result = self._acquire(keys=keys, args=[time.time(), self.open_seconds, self.max_in_flight,
+                                                 self.lease_seconds, token])
+        if result != 'ok':
+            raise DataserverUnavailable(f"dataserver {dataserver} unavailable: {result}")
+
+    def record(self, dataserver, token, outcome, latency_seconds, status_key):
+        """
+        releases the in-flight slot and records the outcome of the download
+        Parameters
+        ----------
+        dataserver - str - host the data object was downloaded from
+        token - str - token the slot was acquired with
+        outcome - str - 'ok', 'error', or 'ignore' for failures that are not the dataserver's
+        latency_seconds - float - duration of the download
+        status_key - str - metric key the breaker state is reported under
+
+        Returns
+        -------
+        str - breaker state after the outcome: closed, half_open or open
+        """
+        now = time.time()
+        keys = [f"{BREAKER_PREFIX}{dataserver}", f"{BREAKER_PREFIX}{dataserver}:in_flight", status_key]
+        keys.extend(self._window_keys(dataserver, now))
+        state = self._record(keys=keys, args=[token, outcome, int(latency_seconds * 1000), now,
+                                               self.window_seconds, self.error_rate, self.min_requests,
+                                               int(self.slow_seconds * 1000), self.slow_rate])
+        return state
+
+    @contextmanager
+    def guard(self, dataserver, token, status_key, failures=(Exception,)):
+        """
+        runs the body as a download from dataserver: acquires a slot before and records the outcome after.
+        exceptions in failures count as errors, any other exception does not count.
+        """
+        self.acquire(dataserver, token, status_key)
+        st = time.monotonic()
+        try:
+            yield
+        except failures:
+            self.record(dataserver, token, 'error', time.monotonic() - st, status_key)
+            raise
+        except Exception:
+            self.record(dataserver, token, 'ignore', time.monotonic() - st, status_key)
+            raise
+        self.record(dataserver, token, 'ok', time.monotonic() - st, status_key)
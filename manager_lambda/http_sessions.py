@@ -0,0 +1,176 @@
+import functools
+import os
+import socket
+import threading
+import time
+
+
+# connections kept per dataserver, one per concurrently processed record is enough
+pool_maxsize = int(os.environ.get('HTTP_POOL_MAXSIZE', os.environ.get('MAX_WORKERS', 10)))
+dns_ttl_seconds = int(os.environ.get('DNS_CACHE_TTL_SECONDS', 60))
+
+
+class SessionRegistry:
+    """
+    container wide requests sessions, one per dataserver, so downloads from a host that was
+    already seen in this container reuse its keep-alive connections and skip tcp and tls setup.
+    """
+
+    def __init__(self, pool_maxsize=10, dns_cache=None):
+        self.pool_maxsize = pool_maxsize
+        # resolves the dataserver hostnames of these sessions only, redis, s3 and the broker are not cached
+        self.dns_cache = dns_cache
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self):
+        # imported on first download, containers that only pass notifications through never load it
+        import requests
+
+        session = requests.Session()
+        # Configure limited retries to fail faster
+        retries = requests.packages.urllib3.util.retry.Retry(
+            total=2,  # Only retry once
+            backoff_factor=0.5,  # Short delay between retries
+            status_forcelist=[500, 502, 503, 504]  # Only retry on server errors
+        )
+        # Apply configuration to both HTTP and HTTPS connections
+        adapter = requests.adapters.HTTPAdapter(max_retries=retries, pool_connections=1,
+                                                pool_maxsize=self.pool_maxsize)
+        if self.dns_cache is not None:
+            adapter.poolmanager.pool_classes_by_scheme = resolving_pool_classes(self.dns_cache)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def get(self, dataserver):
+        """
+        Parameters
+        ----------
+        dataserver - str - host (netloc) the data object is downloaded from
+
+        Returns
+        -------
+        requests.Session - the session of the dataserver, created on first use
+        """
+        session = self._sessions.get(dataserver)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(dataserver)
+                if session is None:
+                    session = self._sessions[dataserver] = self._create_session()
+        return session
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict - per dataserver: requests made, connections opened and requests that reused a connection
+        """
+        stats = {}
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for dataserver, session in sessions:
+            n_requests = n_connections = 0
+            pools = session.get_adapter('https://').poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                n_requests += pool.num_requests
+                n_connections += pool.num_connections
+            stats[dataserver] = {'requests': n_requests, 'connections': n_connections,
+                                 'reused': max(n_requests - n_connections, 0)}
+        return stats
+
+
+class DnsCache:
+    """
+    caches the addresses of dataserver hostnames for ttl_seconds, a warm container otherwise resolves
+    them again for every new connection. only the download sessions of a SessionRegistry use it, so a
+    redis failover or a new s3 endpoint is picked up at once.
+    """
+
+    def __init__(self, ttl_seconds=60, resolve=socket.getaddrinfo, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self._resolve = resolve
+        self.clock = clock
+        self._cache = {}
+        # stats
+        self.hits = 0
+        self.misses = 0
+
+    def addresses(self, host, port):
+        """
+        Parameters
+        ----------
+        host - str - hostname to resolve
+        port - int - port of the connection
+
+        Returns
+        -------
+        list - ip addresses of the host, in the resolver's order
+
+        Raises
+        ------
+        socket.gaierror - the host does not resolve, failures are not cached
+        """
+        key = (host, port)
+        entry = self._cache.get(key)
+        now = self.clock()
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        addresses = list(dict.fromkeys(info[4][0] for info in self._resolve(host, port, 0, socket.SOCK_STREAM)))
+        self._cache[key] = (now + self.ttl_seconds, addresses)
+        return addresses
+
+
+@functools.lru_cache(maxsize=None)
+def resolving_pool_classes(dns_cache):
+    """
+    Parameters
+    ----------
+    dns_cache - DnsCache - cache the connections of the pools resolve their host with
+
+    Returns
+    -------
+    dict - urllib3 connection pool classes by scheme, for a PoolManager's pool_classes_by_scheme
+    """
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+    def resolving(connection_cls):
+        class ResolvingConnection(connection_cls):
+            # connects to a cached address of the host, tls and the Host header still use self.host
+            def _new_conn(self):
+                host = self._dns_host
+                try:
+                    addresses = dns_cache.addresses(host, self.port)
+                except OSError:
+                    # let urllib3 resolve it and raise its usual error
+                    return super()._new_conn()
+                for i, address in enumerate(addresses):
+                    self._dns_host = address
+                    try:
+                        return super()._new_conn()
+                    except (ConnectTimeoutError, NewConnectionError):
+                        if i == len(addresses) - 1:
+                            raise
+                    finally:
+                        self._dns_host = host
+        return ResolvingConnection
+
+    class ResolvingHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = resolving(HTTPConnection)
+
+    class ResolvingHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = resolving(HTTPSConnection)
+
+    return {'http': ResolvingHTTPConnectionPool, 'https': ResolvingHTTPSConnectionPool}
+
+
+dns_cache = DnsCache(dns_ttl_seconds)
+sessions = SessionRegistry(pool_maxsize=pool_maxsize, dns_cache=dns_cache if dns_ttl_seconds > 0 else None)
@@ -0,0 +1,53 @@
+import json
+import os
+
+# json codec shared by the mqtt client and the manager lambda, client/Dockerfile copies this file into the client image.
+# loads takes bytes or str and dumps returns compact utf-8 bytes, so notifications go from the wire to
+# python objects and back without a str round trip. orjson is used when it can be imported,
+# the stdlib otherwise, JSON_CODEC=json forces the stdlib.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError subclasses it, catch this one for either backend
+JSONDecodeError = json.JSONDecodeError
+
+backend = None
+loads = None
+dumps = None
+
+
+# json.dumps builds a new encoder for every call with non-default arguments
+_stdlib_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+def _stdlib_dumps(obj):
+    return _stdlib_encoder.encode(obj).encode()
+
+
+def use_backend(name):
+    """
+    selects the codec of the whole process. callers look loads and dumps up on the module
+    (json_codec.loads), so the switch applies to every later call
+    Parameters
+    ----------
+    name - str - 'orjson', 'json' or 'auto' for orjson if it is installed
+    """
+    global backend, loads, dumps
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson':
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+        loads, dumps = orjson.loads, orjson.dumps
+    elif name == 'json':
+        # json.loads detects the encoding of bytes itself
+        loads, dumps = json.loads, _stdlib_dumps
+    else:
+        raise ValueError(f"unknown json backend: {name}")
+    backend = name
+
+
+use_backend(os.environ.get('JSON_CODEC', 'auto'))
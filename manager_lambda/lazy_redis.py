@@ -0,0 +1,50 @@
+import threading
+
+
+class LazyRedis:
+    """
+    redis client that imports redis-py and connects on first use. redis-py imports redis.asyncio, and with
+    it asyncio and ssl, from its package __init__, two thirds of the lambda's cold start. scripts registered
+    before that are registered with the real client on their first call.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._args = args
+        self._kwargs = kwargs
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """
+        Returns
+        -------
+        redis.Redis - the client, created on first use
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+
+                    self._client = redis.Redis(*self._args, **self._kwargs)
+        return self._client
+
+    def register_script(self, script):
+        return LazyScript(self, script)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class LazyScript:
+    """lua script of a LazyRedis, registered with the client on its first call"""
+
+    def __init__(self, lazy_redis, script):
+        self.lazy_redis = lazy_redis
+        self.script = script
+        self._registered = None
+
+    def __call__(self, keys=[], args=[], client=None):
+        if self._registered is None:
+            self._registered = self.lazy_redis.client.register_script(self.script)
+        return self._registered(keys=keys, args=args, client=client)
@@ -0,0 +1,121 @@
+import logging
+import ssl
+import threading
+from uuid import uuid4
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger()
+
+
+class MqttPublisher:
+    """
+    long lived mqtt publisher for one broker, kept at module level so a warm lambda container
+    connects once instead of once per notification.
+
+    publishes are QoS 1 and asynchronous: publish() returns as soon as the message is queued and
+    the network thread (loop_start) sends it while the caller moves on. the returned
+    MQTTMessageInfo can be waited on, and flush() waits for every publish still awaiting its
+    PUBACK. only the network thread reconnects when the connection dropped, e.g. while the
+    container was frozen between invocations; publish() waits for it to be back.
+    """
+
+    def __init__(self, host, port, username, password, connect_timeout=10, max_inflight=100):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self.max_inflight = max_inflight
+        self.client_id = f"wis2_{uuid4().hex[:12]}"
+        self._client = None
+        self._connected = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = []
+        # stats
+        self.connects = 0
+        self.published = 0
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.error(f"mqtt publisher failed to connect to {self.host}: {reason_code}")
+            return
+        self.connects += 1
+        self._connected.set()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        self._connected.clear()
+        logger.warning(f"mqtt publisher disconnected from {self.host}: {reason_code}")
+
+    def _create_client(self):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id, protocol=mqtt.MQTTv5)
+        client.username_pw_set(self.username, self.password)
+        # same tls settings publish.single was called with
+        client.tls_set(ca_certs=None, tls_version=ssl.PROTOCOL_TLSv1_2)
+        client.tls_insecure_set(True)
+        client.max_inflight_messages_set(self.max_inflight)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        # the network thread's reconnect backoff, kept under the time publish() waits for it
+        client.reconnect_delay_set(min_delay=1, max_delay=max(1, self.connect_timeout // 2))
+        client.connect(self.host, self.port)
+        client.loop_start()
+        return client
+
+    def _ensure_connected(self):
+        """
+        connects on first use, and waits for the network thread to reconnect if the connection dropped
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = self._create_client()
+        if not self._connected.wait(self.connect_timeout):
+            raise ConnectionError(f"mqtt publisher could not connect to {self.host}:{self.port}")
+
+    def publish(self, topic, payload):
+        """
+        queues a QoS 1 publish
+        Parameters
+        ----------
+        topic - str - topic to publish to
+        payload - str or bytes - message payload
+
+        Returns
+        -------
+        MQTTMessageInfo - call wait_for_publish() on it to block until the broker acknowledged it
+        """
+        self._ensure_connected()
+        info = self._client.publish(topic, payload, qos=1)
+        if info.rc == mqtt.MQTT_ERR_NO_CONN:
+            # the connection dropped between the check and the publish. paho keeps QoS 1 messages
+            # queued and sends them once the network thread reconnected, so publishing again would
+            # duplicate it; clear the error so flush() waits for the PUBACK instead
+            info.rc = mqtt.MQTT_ERR_SUCCESS
+        with self._lock:
+            self._pending.append(info)
+            self.published += 1
+        return info
+
+    def flush(self, timeout=30):
+        """
+        waits until every queued publish was acknowledged
+        Parameters
+        ----------
+        timeout - float - seconds to wait per outstanding publish
+
+        Returns
+        -------
+        int - number of publishes that were not acknowledged
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        failed = 0
+        for info in pending:
+            try:
+                info.wait_for_publish(timeout)
+                if not info.is_published():
+                    failed += 1
+            except (RuntimeError, ValueError) as e:
+                logger.error(f"mqtt publish to {self.host} failed: {e}")
+                failed += 1
+        return failed
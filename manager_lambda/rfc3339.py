@@ -0,0 +1,53 @@
+import re
+from datetime import date
+from functools import lru_cache
+
+# RFC 3339 parser shared by the mqtt client and the manager lambda, client/Dockerfile copies this file into the
+# client image.
+
+# RFC 3339 date-time as emitted by WIS2 centres: T, t or space separator, any number of fractional
+# digits (some centres separate them with a colon), Z, z or a +hh:mm / +hhmm offset, UTC if missing
+RFC3339_RE = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})[Tt ](\d{2}):(\d{2}):(\d{2})(?:[.,:](\d+))?'
+    r'(?:[Zz]|([+-])(\d{2}):?(\d{2}))?'
+)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# pubtimes seen recently, a burst of notifications often shares a few of them
+PUBTIME_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PUBTIME_CACHE_SIZE)
+def parse_rfc3339(value: str) -> float:
+    """Parses an RFC 3339 date-time to a UTC epoch.
+
+    Fractional seconds are kept to the microsecond, the same value
+    datetime.timestamp() gives for the aware datetime.
+
+    Args:
+        value: The date-time string, e.g. a notification pubtime.
+
+    Returns:
+        Seconds since the epoch.
+
+    Raises:
+        ValueError: If the value is not an RFC 3339 date-time.
+    """
+    match = RFC3339_RE.fullmatch(value)
+    if match is None:
+        raise ValueError(f"invalid RFC 3339 date-time: {value}")
+    year, month, day, hour, minute, second, fraction, sign, offset_hour, offset_minute = match.groups()
+    hour, minute, second = int(hour), int(minute), int(second)
+    # a leap second (60) is allowed
+    if hour > 23 or minute > 59 or second > 60:
+        raise ValueError(f"invalid RFC 3339 date-time: {value}")
+    # date() validates the day of the month
+    seconds = (date(int(year), int(month), int(day)).toordinal() - EPOCH_ORDINAL) * 86400
+    seconds += hour * 3600 + minute * 60 + second
+    if sign is not None:
+        offset_hour, offset_minute = int(offset_hour), int(offset_minute)
+        if offset_hour > 23 or offset_minute > 59:
+            raise ValueError(f"invalid RFC 3339 offset: {value}")
+        offset = offset_hour * 3600 + offset_minute * 60
+        seconds += -offset if sign == '+' else offset
+    microseconds = int(fraction[:6].ljust(6, '0')) if fraction else 0
+    return (seconds * 1000000 + microseconds) / 1000000
@@ -0,0 +1,108 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MIB = 1024 * 1024
+# objects up to this size are stored with a single put_object, larger ones with a multipart upload
+MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD_MB', 8)) * MIB
+# S3 requires at least 5 MiB for every part but the last
+MULTIPART_PART_SIZE = max(int(os.environ.get('S3_MULTIPART_PART_SIZE_MB', 8)), 5) * MIB
+# parts of one object uploaded at the same time
+MULTIPART_CONCURRENCY = int(os.environ.get('S3_MULTIPART_CONCURRENCY', 4))
+# http connections of the shared client, every concurrently processed record may hold some
+MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 32))
+
+_client = None
+_client_lock = threading.Lock()
+_part_executor = None
+
+
+def s3_client():
+    """
+    the S3 client shared by the whole container, created on first use
+    Returns
+    -------
+    botocore client for s3
+    """
+    global _client, _part_executor
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # boto3 takes a good part of the cold start, load it when the first object is stored
+                import boto3
+                from botocore.config import Config
+
+                config = Config(max_pool_connections=MAX_POOL_CONNECTIONS, tcp_keepalive=True,
+                                retries={'max_attempts': 3, 'mode': 'standard'})
+                _part_executor = ThreadPoolExecutor(max_workers=MAX_POOL_CONNECTIONS,
+                                                    thread_name_prefix='s3-part')
+                _client = boto3.client('s3', config=config)
+    return _client
+
+
+class MultipartUpload:
+    """
+    multipart upload fed one part at a time, with up to concurrency parts in flight.
+    nothing is visible in the bucket until complete(), abort() discards the parts.
+    """
+
+    def __init__(self, bucket, key, metadata=None, concurrency=MULTIPART_CONCURRENCY):
+        self.client = s3_client()
+        self.bucket = bucket
+        self.key = key
+        self.concurrency = max(concurrency, 1)
+        self.upload_id = self.client.create_multipart_upload(Bucket=bucket, Key=key,
+                                                             Metadata=metadata or {})['UploadId']
+        self._in_flight = deque()
+        self._parts = []
+
+    def _upload_part(self, part_number, body):
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                           PartNumber=part_number, Body=body)
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def add_part(self, body):
+        """queues the next part, blocks while concurrency parts are still uploading"""
+        while len(self._in_flight) >= self.concurrency:
+            self._parts.append(self._in_flight.popleft().result())
+        part_number = len(self._parts) + len(self._in_flight) + 1
+        self._in_flight.append(_part_executor.submit(self._upload_part, part_number, body))
+
+    def complete(self):
+        while self._in_flight:
+            self._parts.append(self._in_flight.popleft().result())
+        self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                              MultipartUpload={'Parts': self._parts})
+
+    def abort(self):
+        # wait for parts still uploading, otherwise they would outlive the abort
+        for future in self._in_flight:
+            future.exception()
+        self._in_flight.clear()
+        # do not leave the parts behind, they are billed until aborted
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+def put_bytes(bucket, key, body, metadata=None):
+    """
+    stores body at key, with a single put_object up to MULTIPART_THRESHOLD and a multipart upload above it
+    Parameters
+    ----------
+    bucket - str - bucket name
+    key - str - object key
+    body - bytes - object data
+    metadata - dict - user metadata stored with the object
+    """
+    if len(body) <= MULTIPART_THRESHOLD:
+        s3_client().put_object(Bucket=bucket, Key=key, Body=body, Metadata=metadata or {})
+        return
+    upload = MultipartUpload(bucket, key, metadata)
+    try:
+        view = memoryview(body)
+        for offset in range(0, len(body), MULTIPART_PART_SIZE):
+            upload.add_part(bytes(view[offset:offset + MULTIPART_PART_SIZE]))
+        upload.complete()
+    except Exception:
+        upload.abort()
+        raise
@@ -1,24 +1,20 @@
 import json
 import os
 import traceback
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from random import randint
 # from aws_embedded_metrics import metric_scope
-import redis
-import gc
-import glob
-import paho.mqtt.publish
-import boto3
-import requests as requests
-from botocore.exceptions import ClientError
 from datetime import datetime as dt
-import paho.mqtt.client as mqtt
+import threading
 import time
 import logging
-from enum import Enum
-import ssl
-from wis2_message import Wis2Message
+import http_sessions
+import json_codec
+from lazy_redis import LazyRedis
+from cache_state import CacheState
+from circuit_breaker import CircuitBreaker, DataserverUnavailable
+from mqtt_publisher import MqttPublisher
+from wis2_message import IntegrityError, Wis2Message
 
 logger = logging.getLogger()
 logger.setLevel(logging.WARN)
@@ -26,7 +22,6 @@ logger.setLevel(logging.WARN)
 # bucket info
 s3_bucket_region = os.environ.get('dest_bucket_region')
 s3_bucket_name = os.environ.get('dest_bucket_name')
-s3_client_obj = boto3.client('s3')
 # mqtt broker info
 broker_host = os.environ.get('MQTT_BROKER_HOST')
 broker_user = os.environ.get('MQTT_PUB_USER')
@@ -35,13 +30,51 @@ env = {'s3_bucket_name': s3_bucket_name, 's3_bucket_region': s3_bucket_region}
 brokers = [
     {"host": broker_host, "port": 8883, "username": broker_user, "password": broker_pw},
 ]
+# one connection per broker for the lifetime of the container, connected on first publish
+publishers = [MqttPublisher(broker['host'], broker['port'], broker['username'], broker['password'])
+              for broker in brokers]
+publish_timeout = int(os.environ.get('MQTT_PUBLISH_TIMEOUT', 30))
 redis_endpoint = os.environ.get('CACHE_ENDPOINT')
 # redis cache
-redis_host = redis.Redis(redis_endpoint, port=6379, decode_responses=True)
+# connected on the first invocation, importing redis-py would otherwise dominate the cold start
+redis_host = LazyRedis(redis_endpoint, port=6379, decode_responses=True)
 ttl_minutes = 360
+# lifecycle expiration of the cache bucket, an unchanged object is only skipped while well within it
+object_ttl_seconds = int(os.environ.get('OBJECT_TTL_DAYS', 1)) * 86400
+cache_state = CacheState(redis_host, ttl_minutes * 60, claim_seconds=int(os.environ.get('CLAIM_TTL_SECONDS', 120)),
+                         digest_seconds=min(ttl_minutes * 60, object_ttl_seconds - 3600))
+# dataserver health shared by all invocations, downloads from a failing dataserver are deferred
+breaker = CircuitBreaker(redis_host,
+                         error_rate=float(os.environ.get('BREAKER_ERROR_RATE', 0.5)),
+                         min_requests=int(os.environ.get('BREAKER_MIN_REQUESTS', 10)),
+                         window_seconds=int(os.environ.get('BREAKER_WINDOW_SECONDS', 60)),
+                         open_seconds=int(os.environ.get('BREAKER_OPEN_SECONDS', 30)),
+                         slow_seconds=float(os.environ.get('BREAKER_SLOW_SECONDS', 10)),
+                         slow_rate=float(os.environ.get('BREAKER_SLOW_RATE', 0.5)),
+                         max_in_flight=int(os.environ.get('DATASERVER_MAX_IN_FLIGHT', 20)))
+# deferred records come back after this delay, doubled on every receive, instead of the visibility timeout
+defer_seconds = int(os.environ.get('DEFER_SECONDS', breaker.open_seconds))
+max_defer_seconds = 900
+# a record is moved to the dlq after this many failed attempts. SQS counts deferrals as receives as well,
+# so they are counted in redis and not held against the record, up to max_deferrals of them
+max_record_failures = int(os.environ.get('MAX_RECORD_FAILURES', 2))
+max_deferrals = int(os.environ.get('MAX_DEFERRALS', 8))
+DEFERRALS_PREFIX = 'deferrals:'
+# records are kept for a day by the work queue
+deferrals_ttl_seconds = 86400
+dlq_arn = os.environ.get('DLQ_ARN')
+# process_record result of a record deferred because its dataserver is unavailable
+DEFERRED = 'deferred'
+_sqs_client = None
+_sqs_client_lock = threading.Lock()
+# records of one batch are processed concurrently, one thread per message group
+max_workers = int(os.environ.get('MAX_WORKERS', 10))
+record_executor = ThreadPoolExecutor(max_workers=max_workers)
 global dev_mode
 dev_mode = os.environ.get('DEV-MODE', 'False') not in ['True', 'true', '1']
 logging.info(f"dev mode: {dev_mode}")
+# orjson is only used if the bundled wheel matches the lambda architecture, the stdlib otherwise
+print(f"json codec: {json_codec.backend}")
 
 
 def timer(func):
@@ -148,24 +181,333 @@ def cache_metric(cache_client, key, cache_value, operation='set'):
         print(f"failed to cache {key} with value {cache_value}")
         # raise e
 
-def cleanup_tmp_directory():
+
+def release_claim(wis2_msg):
     """
-    Cleans up old files in the /tmp directory to prevent disk space issues
+    releases the claim on a notification this invocation did not cache, errors are logged
+    Parameters
+    ----------
+    wis2_msg - Wis2Message - the claimed notification
     """
     try:
-        # Clean up any files in /tmp that might be left from previous executions
-        files = glob.glob("/tmp/*")
-        for f in files:
-            try:
-                if os.path.isfile(f):
-                    os.remove(f)
-                    print(f"Cleaned up old file: {f}")
-            except Exception as e:
-                print(f"Failed to clean up file {f}: {e}")
-        return len(files)
+        cache_state.release(wis2_msg.data_id, wis2_msg.pubtime_epoch, wis2_msg.new_uuid)
+    except Exception:
+        logger.error(f"failed to release claim: {wis2_msg.data_id}", exc_info=True)
+
+
+def process_record(sqs_msg):
+    """
+    processes a single sqs record: dedup, cache the data object, publish the cache notification
+    Parameters
+    ----------
+    sqs_msg - dict - sqs record
+
+    Returns
+    -------
+    bool or str - True if the record was handled (including duplicates), False if it failed,
+                  DEFERRED if its dataserver is unavailable
+    """
+    wis2_msg = None
+    msg_centre = 'unknown'
+    claimed = False
+    try:
+        # if body is a string, convert to dict
+        if isinstance(sqs_msg['body'], (str, bytes)):
+            msg_body = json_codec.loads(sqs_msg['body'])
+        else:
+            msg_body = sqs_msg['body']
+        # the mqtt client sends the topic as a message attribute rather than re-serializing the notification.
+        # it is the topic the notification was received on and wins over a topic in the payload,
+        # which would otherwise let a publisher write into the key space of another centre
+        topic_attribute = nested_get(sqs_msg, ['messageAttributes', 'topic', 'stringValue'])
+        if topic_attribute is not None:
+            msg_body['topic'] = topic_attribute
+        wis2_msg = Wis2Message(msg_body, env)
+        # topic split
+        topic_keys = wis2_msg.topic.split('/')
+        msg_centre = topic_keys[3]
+        # check last cached, and claim the notification so concurrent copies do not download it as well
+        s3_key = wis2_msg.format_s3_key() if wis2_msg.do_cache else None
+        last_cached, claimed, cached_digest = cache_state.claim(wis2_msg.data_id, wis2_msg.pubtime_epoch,
+                                                                wis2_msg.new_uuid, s3_key=s3_key)
+        # print(f"received message: {wis2_msg.data_id}-{wis2_msg.pubtime}")
+        if not wis2_msg.is_unique(last_cached):
+            print(f"non-unique: {wis2_msg.data_id}-{wis2_msg.pubtime}")
+            return True
+        elif not claimed:
+            # another invocation is caching this notification, it is released again if that one fails
+            print(f"in progress elsewhere: {wis2_msg.data_id}-{wis2_msg.pubtime}")
+            return True
+        else:
+            downloaded = False
+            if wis2_msg.do_cache and cached_digest is not None and wis2_msg.integrity_digest() == cached_digest:
+                # byte-identical to the object already in the bucket, neither download nor upload it
+                print(f"unchanged, not uploading: {wis2_msg.data_id}-{wis2_msg.pubtime}")
+                bucket_path = wis2_msg.set_bucket_url()
+            elif wis2_msg.do_cache:
+                # the GC should cache the message, the data object is only stored if its checksum validates
+                try:
+                    if wis2_msg.has_content():
+                        bucket_path = wis2_msg.cache_to_bucket()
+                    else:
+                        status_key = "|".join(
+                            [msg_centre, wis2_msg.dataserver, 'wmo_wis2_gc_dataserver_breaker_status'])
+                        # only failures to reach or read from the dataserver count against it,
+                        # requests is loaded on the first download, not at cold start
+                        from requests.exceptions import RequestException
+                        with breaker.guard(wis2_msg.dataserver, wis2_msg.new_uuid, status_key,
+                                           failures=(RequestException,)):
+                            bucket_path = wis2_msg.cache_to_bucket()
+                    downloaded = True
+                except TypeError:
+                    print(f"bad source link, skipping: {wis2_msg.data_id}")
+                    # a copy with a usable link must not wait for the claim to expire
+                    release_claim(wis2_msg)
+                    return True
+                except IntegrityError as e:
+                    print(f"failed integrity validation: {wis2_msg.data_id}")
+                    integrity_status = cache_metric(redis_host, "|".join(
+                        [msg_centre, 'wmo_wis2_gc_integrity_failed_total']), cache_value=1, operation='inc')
+                    # metrics.put_metric("wmo_wis2_gc_integrity_failed", 1)
+                    raise e
+            # otherwise - this is a pass through message, we relay but do not cache the data object
+            # check uniqueness again, record the pubtime and update the metrics in one atomic script
+            if downloaded:
+                metric_updates = [
+                    ("|".join([msg_centre, 'wmo_wis2_gc_downloaded_total']), 'inc', 1),
+                    ("|".join([msg_centre, wis2_msg.dataserver,
+                               'wmo_wis2_gc_dataserver_last_download_timestamp_seconds']), 'set', int(time.time())),
+                    ("|".join([msg_centre, wis2_msg.dataserver, 'wmo_wis2_gc_dataserver_status_flag']), 'set', 1),
+                ]
+            elif not wis2_msg.do_cache:
+                metric_updates = [("|".join([msg_centre, 'wmo_wis2_gc_no_cache_total']), 'inc', 1)]
+            else:
+                metric_updates = []
+            # the digest is only indexed for an upload, a skipped object keeps the expiry of its upload
+            if not cache_state.commit(wis2_msg.data_id, wis2_msg.pubtime_epoch, wis2_msg.is_update(),
+                                      wis2_msg.new_uuid, metric_updates, s3_key=s3_key,
+                                      digest=wis2_msg.integrity_digest() if downloaded else None):
+                print(f"non-unique (last minute dump): {wis2_msg.data_id}-{wis2_msg.pubtime}")
+                return True
+            print(f"is_unique: {wis2_msg.data_id}-{wis2_msg.pubtime}")
+            # now format message, even if we did not cache it (pass through)
+            payload = wis2_msg.render_cache_msg()
+            # send to mqtt broker/s, publishes to all brokers are in flight at the same time
+            in_flight = []
+            for publisher in publishers:
+                try:
+                    in_flight.append((publisher, publisher.publish(wis2_msg.new_topic, payload)))
+                except Exception as e:
+                    print(f"failed to publish data_id {wis2_msg.data_id} to {publisher.host} on topic {wis2_msg.new_topic}")
+                    if not dev_mode:
+                        raise e
+            for publisher, info in in_flight:
+                try:
+                    info.wait_for_publish(publish_timeout)
+                    if not info.is_published():
+                        raise TimeoutError(f"no PUBACK from {publisher.host} after {publish_timeout} seconds")
+                except Exception as e:
+                    print(f"failed to publish data_id {wis2_msg.data_id} to {publisher.host} on topic {wis2_msg.new_topic}")
+                    if not dev_mode:
+                        raise e
+
+        return True
+    except DataserverUnavailable as e:
+        # deferred, not failed: the record goes back to the queue without an error notification
+        print(f"deferred {wis2_msg.data_id}-{wis2_msg.pubtime}: {e}")
+        release_claim(wis2_msg)
+        return DEFERRED
     except Exception as e:
-        print(f"Error cleaning up /tmp directory: {e}")
+        logger.error(f"failed to process message: {sqs_msg['messageId']}", exc_info=True)
+        if claimed:
+            # let the retry of this record (or a copy of it) take the claim straight away
+            release_claim(wis2_msg)
+        error_msg = {}
+        # add error to cache_message
+        error_topic = ['error']
+        # check if wis2_msg exists
+        if wis2_msg is not None:
+            msg_topic = wis2_msg.topic
+            error_topic = error_topic + msg_topic.split('/')
+            # merge error message with original message, which is never modified
+            error_msg = dict(wis2_msg.msg)
+        error_msg['error'] = {"msg": str(e), "traceback": traceback.format_exc()}
+        error_payload = json_codec.dumps(error_msg)
+        # just the first broker for now, flushed before the handler returns
+        error_topic = "/".join(error_topic)
+        try:
+            publishers[0].publish(error_topic, error_payload)
+            logger.error(f"published error msg: {error_topic}")
+        except Exception:
+            logger.error(f"failed to publish error msg: {error_topic}", exc_info=True)
+        logger.error(f"error msg: {error_payload.decode()}")
+        # metrics
+        # todo - move parsing of these metrics components and or the metrics interactions to a different place
+        ds_name = 'unknown_dataserver'
+        if wis2_msg is not None and wis2_msg.dataserver is not None:
+            ds_name = wis2_msg.dataserver
+        dnld_error_total = cache_metric(redis_host, "|".join(
+            [msg_centre, ds_name, 'wmo_wis2_gc_downloaded_errors_total']), cache_value=1,
+                                        operation='inc')
+        if wis2_msg is not None and wis2_msg.dataserver is not None:
+            dataserver_status = cache_metric(redis_host, "|".join(
+                [msg_centre, wis2_msg.dataserver, 'wmo_wis2_gc_dataserver_status_flag']), cache_value=0,
+                                             operation='set')
+        return False
+
+
+def sqs_client():
+    """
+    the SQS client of the container, created on the first deferral or move to the dlq
+    """
+    global _sqs_client
+    if _sqs_client is None:
+        with _sqs_client_lock:
+            if _sqs_client is None:
+                import boto3
+                _sqs_client = boto3.client('sqs')
+    return _sqs_client
+
+
+def queue_url(queue_arn):
+    """
+    url of the queue with the arn arn:aws:sqs:<region>:<account>:<name>
+    """
+    _, _, _, region, account, name = queue_arn.split(':')
+    return f"https://sqs.{region}.amazonaws.com/{account}/{name}"
+
+
+def defer_records(records):
+    """
+    makes records visible again after a short delay instead of the visibility timeout of the queue,
+    so a group waiting on an unavailable dataserver resumes soon after it is back. the delay doubles
+    with the receive count to spread them out.
+    Parameters
+    ----------
+    records - list - sqs records to return to the queue, reported as failed by the handler
+    """
+    by_queue = {}
+    for record in records:
+        if record.get('receiptHandle') and record.get('eventSourceARN'):
+            by_queue.setdefault(record['eventSourceARN'], []).append(record)
+    for queue_arn, queue_records in by_queue.items():
+        for offset in range(0, len(queue_records), 10):
+            entries = []
+            for i, record in enumerate(queue_records[offset:offset + 10]):
+                receives = int(nested_get(record, ['attributes', 'ApproximateReceiveCount']) or 1)
+                entries.append({'Id': str(i), 'ReceiptHandle': record['receiptHandle'],
+                                'VisibilityTimeout': min(defer_seconds * 2 ** (receives - 1), max_defer_seconds)})
+            try:
+                failed = sqs_client().change_message_visibility_batch(QueueUrl=queue_url(queue_arn),
+                                                                      Entries=entries).get('Failed', [])
+            except Exception:
+                logger.error("failed to defer records, they return after the visibility timeout", exc_info=True)
+                continue
+            for failure in failed:
+                logger.error(f"failed to defer record, it returns after the visibility timeout: {failure}")
+
+
+def count_deferrals(records):
+    """
+    counts a receive of each record that was deferred or held back behind a record of its group,
+    so it is not taken for a failed attempt
+    Parameters
+    ----------
+    records - list - sqs records returned to the queue without having failed
+    """
+    if not records:
+        return
+    try:
+        pipe = redis_host.pipeline(transaction=False)
+        for record in records:
+            key = f"{DEFERRALS_PREFIX}{record['messageId']}"
+            pipe.incr(key)
+            pipe.expire(key, deferrals_ttl_seconds)
+        pipe.execute()
+    except Exception:
+        logger.error("failed to count deferrals, they count as failed attempts", exc_info=True)
+
+
+def failed_receives(sqs_msg):
+    """
+    number of earlier receives of a record that failed, deferrals beyond max_deferrals count as failed
+    Parameters
+    ----------
+    sqs_msg - dict - sqs record
+
+    Returns
+    -------
+    int - failed attempts before this receive
+    """
+    earlier = int(nested_get(sqs_msg, ['attributes', 'ApproximateReceiveCount']) or 1) - 1
+    if earlier < max_record_failures:
+        # cannot have failed often enough, skip the round trip
+        return earlier
+    try:
+        deferrals = int(redis_host.get(f"{DEFERRALS_PREFIX}{sqs_msg['messageId']}") or 0)
+    except Exception:
+        logger.error(f"failed to read deferrals of {sqs_msg['messageId']}, processing it", exc_info=True)
         return 0
+    return earlier - min(deferrals, max_deferrals)
+
+
+def dead_letter(sqs_msg):
+    """
+    moves a record that failed max_record_failures times to the dlq, the records of its group go on
+    Parameters
+    ----------
+    sqs_msg - dict - sqs record
+
+    Returns
+    -------
+    bool - True if the record is in the dlq, False if it stays in the work queue
+    """
+    if not dlq_arn:
+        return False
+    attributes = {name: {'DataType': value['dataType'], 'StringValue': value['stringValue']}
+                  for name, value in (sqs_msg.get('messageAttributes') or {}).items() if 'stringValue' in value}
+    entry = {'QueueUrl': queue_url(dlq_arn), 'MessageBody': sqs_msg['body'],
+             'MessageGroupId': nested_get(sqs_msg, ['attributes', 'MessageGroupId']) or sqs_msg['messageId'],
+             'MessageDeduplicationId': sqs_msg['messageId']}
+    if attributes:
+        entry['MessageAttributes'] = attributes
+    try:
+        sqs_client().send_message(**entry)
+    except Exception:
+        logger.error(f"failed to move {sqs_msg['messageId']} to the dlq", exc_info=True)
+        return False
+    logger.error(f"moved {sqs_msg['messageId']} to the dlq after {max_record_failures} failed attempts")
+    return True
+
+
+def process_group(records):
+    """
+    processes the records of one fifo message group in order
+    Parameters
+    ----------
+    records - list - sqs records sharing a message group, in queue order
+
+    Returns
+    -------
+    list - messageIds to report as failed
+    """
+    for i, sqs_msg in enumerate(records):
+        if failed_receives(sqs_msg) >= max_record_failures:
+            if dead_letter(sqs_msg):
+                continue
+            count_deferrals(records[i + 1:])
+            return [record['messageId'] for record in records[i:]]
+        result = process_record(sqs_msg)
+        if result == DEFERRED:
+            # the group waits for the dataserver, the later records come back with the deferred one
+            count_deferrals(records[i:])
+            defer_records(records[i:])
+            return [record['messageId'] for record in records[i:]]
+        if not result:
+            # later records of the group must not overtake the failed one, return them to the queue as well
+            count_deferrals(records[i + 1:])
+            return [record['messageId'] for record in records[i:]]
+    return []
 
 
 def msg_handler(msg_batch, context):
@@ -178,161 +520,33 @@ def msg_handler(msg_batch, context):
 
     Returns
     -------
+    dict - sqs partial batch response listing the records that failed
 
     """
-    # cleanup tmp directory
-    tmp_files_cleaned = cleanup_tmp_directory()
-
     # setup metrics
     # metrics.set_property("MetricName", "WIS2GlobalCache")
     # check if 'Records' key exists in msg_batch
     if 'Records' in msg_batch:
         msg_batch = msg_batch['Records']
-    batch_item_failures = []
     # handle if msg_batch is a single msg
     if not isinstance(msg_batch, list):
         msg_batch = [msg_batch]
 
+    # message groups are independent, so they run concurrently; records within a group run in order
+    groups = {}
     for sqs_msg in msg_batch:
-        wis2_msg = None
-        try:
-            # if body is a string, convert to dict
-            if isinstance(sqs_msg['body'], str):
-                msg_body = json.loads(sqs_msg['body'])
-            else:
-                msg_body = sqs_msg['body']
-            wis2_msg = Wis2Message(msg_body, env)
-            # topic split
-            topic_keys = wis2_msg.topic.split('/')
-            msg_centre = topic_keys[3]
-            # check last cached
-            last_cached = redis_host.get(wis2_msg.data_id)
-            # print(f"received message: {wis2_msg.data_id}-{wis2_msg.pubtime}")
-            if not wis2_msg.is_unique(last_cached):
-                print(f"non-unique: {wis2_msg.data_id}-{wis2_msg.pubtime}")
-                continue
-            else:
-                if wis2_msg.do_cache:
-                    # the GC should cache the message
-                    try:
-                        # print(f'caching: {wis2_msg.data_id}-{wis2_msg.pubtime}')
-                        cached_bytes = wis2_msg.cache_msg_data(use_content=True)
-                    except TypeError:
-                        print(f"bad source link, skipping: {wis2_msg.data_id}")
-                        continue
-                    try:
-                        # check if integrity block exists
-                        if hasattr(wis2_msg, 'integrity_block'):
-                            # then validate as this is not required
-                            wis2_msg.validate_integrity()
-                    except Exception as e:
-                        print(f"failed integrity validation: {wis2_msg.data_id}")
-                        integrity_status = cache_metric(redis_host, "|".join(
-                            [msg_centre, 'wmo_wis2_gc_integrity_failed_total']), cache_value=1, operation='inc')
-                        # metrics.put_metric("wmo_wis2_gc_integrity_failed", 1)
-                        raise e
-                    # good to go - cache the data object:
-                    bucket_path = wis2_msg.upload_to_bucket(cached_bytes)
-                    # done with data object - delete it
-                    if hasattr(wis2_msg, 'tmp_path'):
-                        os.remove(wis2_msg.tmp_path)
-                    del cached_bytes
-                    gc.collect()
-                # otherwise - this is a pass through message, we relay but do not cache the data object
-                # nx sets only if key does not exist, returns True if successful
-                # is_new = redis_host.set(wis2_msg.data_id, wis2_msg.pubtime, ex=ttl_minutes * 60, nx=True)
-                # check uniqueness again
-                last_cached = redis_host.get(wis2_msg.data_id)
-                if not wis2_msg.is_unique(last_cached):
-                    print(f"non-unique (last minute dump): {wis2_msg.data_id}-{wis2_msg.pubtime}")
-                    continue
-                else:
-                    print(f"is_unique: {wis2_msg.data_id}-{wis2_msg.pubtime}")
-                    # then we haven't seen it before, or it's an update
-                    # redis set with ttl
-                    redis_host.set(wis2_msg.data_id, wis2_msg.pubtime_epoch, ex=ttl_minutes * 60)
-                if wis2_msg.do_cache:
-                    dnld_total = cache_metric(redis_host, "|".join(
-                        [msg_centre, 'wmo_wis2_gc_downloaded_total']), cache_value=1, operation='inc')
-                    dnld_last = cache_metric(redis_host, "|".join(
-                        [msg_centre, wis2_msg.dataserver, 'wmo_wis2_gc_dataserver_last_download_timestamp_seconds']),
-                                             cache_value=int(time.time()), operation='set')
-                    dataserver_status = cache_metric(redis_host, "|".join(
-                        [msg_centre, wis2_msg.dataserver, 'wmo_wis2_gc_dataserver_status_flag']), cache_value=1,
-                                                     operation='set')
-                if not wis2_msg.do_cache:
-                    # then increase wmo_wis2_gc_no_cache_total
-                    no_cache_total = cache_metric(redis_host, "|".join(
-                        [msg_centre, 'wmo_wis2_gc_no_cache_total']), cache_value=1, operation='inc')
-                # now format message, even if we did not cache it (pass through)
-                notification_msg = wis2_msg.format_cache_msg()
-                # send to mqtt broker/s
-                for broker in brokers:
-                    try:
-                        client_id = f"wis2_{randint(0, 100000000)}"
-                        # print(f"wis2 client id: {client_id}")
-                        # Publish the message
-                        paho.mqtt.publish.single(
-                            wis2_msg.new_topic,
-                            json.dumps(notification_msg),
-                            hostname=broker['host'],
-                            auth={'username': broker['username'], 'password': broker['password']},
-                            port=broker['port'],
-                            client_id=client_id,
-                            protocol=mqtt.MQTTv5,
-                            qos=1,
-                            tls={'ca_certs': None, 'tls_version': ssl.PROTOCOL_TLSv1_2, 'insecure': True}
-                        )
-                        # print(f"published data_id {wis2_msg.data_id} to {broker['host']} on topic {wis2_msg.new_topic}")
-                    except Exception as e:
-                        print(
-                            f"failed to publish data_id {wis2_msg.data_id} to {broker['host']} on topic {wis2_msg.new_topic}")
-                        if not dev_mode:
-                            raise e
-
-        except Exception as e:
-            logger.error(f"failed to process message: {sqs_msg['messageId']}", exc_info=True)
-            batch_item_failures.append({"itemIdentifier": sqs_msg['messageId']})
-            error_msg = {}
-            # add error to cache_message
-            error_topic = ['error']
-            # check if wis2_msg exists
-            if wis2_msg is not None:
-                msg_topic = wis2_msg.topic
-                error_topic = error_topic + msg_topic.split('/')
-                # merge error message with original message
-                error_msg = deepcopy(wis2_msg.msg)
-            error_msg['error'] = {"msg": str(e), "traceback": traceback.format_exc()}
-            # just the first broker for now
-            broker = brokers[0]
-            client_id = f"wis2_{randint(0, 100000000)}"
-            error_topic = "/".join(error_topic)
-            paho.mqtt.publish.single(
-                error_topic,
-                json.dumps(error_msg),
-                hostname=broker['host'],
-                auth={'username': broker['username'], 'password': broker['password']},
-                port=broker['port'],
-                client_id=client_id,
-                protocol=mqtt.MQTTv5,
-                qos=1,
-                tls={'ca_certs': None, 'tls_version': ssl.PROTOCOL_TLSv1_2, 'insecure': True}
-            )
-            logger.error(f"published error msg: {error_topic}")
-            logger.error(f"error msg: {json.dumps(error_msg)}")
-            # metrics
-            # todo - move parsing of these metrics components and or the metrics interactions to a different place
-            ds_name = 'unknown_dataserver'
-            if wis2_msg is not None and wis2_msg.dataserver is not None:
-                ds_name = wis2_msg.dataserver
-            dnld_error_total = cache_metric(redis_host, "|".join(
-                [msg_centre, ds_name, 'wmo_wis2_gc_downloaded_errors_total']), cache_value=1,
-                                            operation='inc')
-            if wis2_msg.dataserver is not None and wis2_msg.dataserver is not None:
-                dataserver_status = cache_metric(redis_host, "|".join(
-                    [msg_centre, wis2_msg.dataserver, 'wmo_wis2_gc_dataserver_status_flag']), cache_value=0,
-                                                 operation='set')
-
-    sqs_batch_response = {"batchItemFailures": []}  # hard coded due to issue with batchItemFailures
+        group_id = nested_get(sqs_msg, ['attributes', 'MessageGroupId']) or sqs_msg['messageId']
+        groups.setdefault(group_id, []).append(sqs_msg)
+    batch_item_failures = []
+    for failed_ids in record_executor.map(process_group, groups.values()):
+        batch_item_failures.extend({"itemIdentifier": message_id} for message_id in failed_ids)
+    # error notifications are not waited on per record, make sure they are out before the container freezes
+    for publisher in publishers:
+        unacked = publisher.flush(publish_timeout)
+        if unacked:
+            logger.error(f"{unacked} publishes to {publisher.host} were not acknowledged")
+
     print({"batchItemFailures": len(batch_item_failures)})
-    return sqs_batch_response
+    print({"http_sessions": http_sessions.sessions.stats(),
+           "dns_cache": {"hits": http_sessions.dns_cache.hits, "misses": http_sessions.dns_cache.misses}})
+    return {"batchItemFailures": batch_item_failures}
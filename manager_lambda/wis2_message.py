@@ -1,18 +1,52 @@
 import base64
 import hashlib
-import io
-import json
 import os
 import traceback
-import urllib
-from copy import deepcopy
+import urllib.parse
 from enum import Enum
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import uuid4
 from datetime import datetime as dt
-import requests
-import boto3
-import shutil
+import http_sessions
+import json_codec
+from rfc3339 import parse_rfc3339
+import s3_uploads
+from s3_uploads import MULTIPART_PART_SIZE, MULTIPART_THRESHOLD
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# global-cache property of the cache notifications
+REPORT_BY = os.getenv('REPORT_BY')
+# printable ascii except the quote and backslash, json encoders write these as they are
+JSON_VERBATIM = bytes(sorted(set(range(0x20, 0x7f)) - set(b'"\\')))
+
+if TYPE_CHECKING:
+    # imported on first download, containers that only pass notifications through never load it
+    import requests
+
+HASH_METHODS = {
+    "sha256": hashlib.sha256,
+    "sha384": hashlib.sha384,
+    "sha512": hashlib.sha512,
+    "sha3-256": hashlib.sha3_256,
+    "sha3-384": hashlib.sha3_384,
+    "sha3-512": hashlib.sha3_512
+}
+
+
+# attribute name -> path in the notification, all must be present
+REQUIRED_KEYS = {
+    'id': ['id'],
+    'data_id': ['properties', 'data_id'],
+    # 'metadata_id': ['properties', 'metadata_id'],
+    'topic': ['topic'],
+    'links': ['links'],
+    'pubtime': ['properties', 'pubtime']
+}
+
+
+class IntegrityError(Exception):
+    """Raised when a data object does not match the checksum in its message."""
+
 
 def nested_get(d: dict, keys: list) -> Any:
     """Gets value of nested key/s in dict.
@@ -33,10 +67,45 @@ def nested_get(d: dict, keys: list) -> Any:
     return d
 
 
+def json_verbatim(value: Any) -> bytes | None:
+    """Encodes a string that json encoders write unchanged, within the quotes.
+
+    Args:
+        value: The value to check.
+
+    Returns:
+        The ascii bytes of value, or None if it is not such a string.
+    """
+    if not isinstance(value, str) or not value.isascii():
+        return None
+    raw = value.encode('ascii')
+    # deletes every character that needs no escaping, anything left does
+    if raw.translate(None, JSON_VERBATIM):
+        return None
+    return raw
+
+
 # class to represent each WIS2 message
 class Wis2Message:
     # not using json schema validation at this time, but could
     # https://github.com/wmo-im/wis2-notification-message/blob/main/schemas/wis2-notification-message-bundled.json
+    __slots__ = (
+        'env', 'msg', 'new_uuid', 'new_topic',
+        # REQUIRED_KEYS
+        'id', 'data_id', 'topic', 'links', 'pubtime', 'pubtime_epoch',
+        'integrity_block', 'do_cache', 'is_valid',
+        # first link of each kind, classified once
+        'canonical_link', 'update_link', 'deletion_link',
+        'src_link', 'filename', 'dataserver', 'dnld_url',
+        # data object
+        'content', 'encoding', 'size', 'data_bytes',
+    )
+    content_encodings = (
+        "utf-8",
+        "base64",
+        "gzip"
+    )
+
     def __init__(self, msg_data: dict, env: dict = None):
         """Initializes Wis2Message.
 
@@ -47,16 +116,14 @@ class Wis2Message:
         self.pubtime_epoch = None
         self.env = env
         self.msg = msg_data
-        self.init_parse()
-        self.new_uuid = uuid4().__str__()
-        self.new_topic = self.topic.replace('origin', 'cache')
         self.is_valid = None
-        self.content_encodings = [
-            "utf-8",
-            "base64",
-            "gzip"
-        ]
         self.dataserver = None
+        self.filename = None
+        self.dnld_url = None
+        self.content = self.encoding = self.size = self.data_bytes = None
+        self.init_parse()
+        self.new_uuid = str(uuid4())
+        self.new_topic = self.topic.replace('origin', 'cache')
         self.src_link = self.get_source_link()
 
     def init_parse(self):
@@ -64,36 +131,35 @@ class Wis2Message:
 
         Raises:
             Exception: If required keys are missing.
+            ValueError: If the pubtime is not an RFC 3339 date-time.
         """
-        required_keys = {
-            'id': ['id'],
-            'data_id': ['properties', 'data_id'],
-            # 'metadata_id': ['properties', 'metadata_id'],
-            'topic': ['topic'],
-            'links': ['links'],
-            'pubtime': ['properties', 'pubtime']
-        }
-        for k, v in required_keys.items():
+        for k, v in REQUIRED_KEYS.items():
             prop_val = nested_get(self.msg, v)
             if prop_val is None:
                 raise Exception(f"required key {k} missing in message {self.msg}")
             setattr(self, k, prop_val)
-        setattr(self, 'integrity_block', nested_get(self.msg, ['properties', 'integrity']))
-        # setattr(self, "unique_id", self.data_id + self.pubtime)
-        setattr(self, 'do_cache', self.check_cache())
-        try:
-            self.pubtime_epoch = dt.strptime(self.pubtime, '%Y-%m-%dT%H:%M:%SZ').timestamp()
-        except:
-            # limit decimal places
-            if len(self.pubtime.split(':')) == 4:
-                # then the last colon should be a decimal - replace with period
-                self.pubtime = self.pubtime.rsplit(':', 1)[0] + '.' + self.pubtime.rsplit(':', 1)[1]
-            dt_parts = self.pubtime.split('.')
-            dt_seconds = dt_parts[1]
-            if len(dt_seconds) > 4:
-                dt_seconds = dt_seconds[:3]+"Z"
-            new_dt = ".".join([dt_parts[0], dt_seconds])
-            self.pubtime_epoch = dt.strptime(new_dt, '%Y-%m-%dT%H:%M:%S.%fZ').timestamp()
+        self.integrity_block = nested_get(self.msg, ['properties', 'integrity'])
+        self.classify_links()
+        self.do_cache = self.check_cache()
+        self.pubtime_epoch = parse_rfc3339(self.pubtime)
+
+    def classify_links(self):
+        """Picks the first canonical, update and deletion link in a single pass over the links."""
+        canonical_link = update_link = deletion_link = None
+        for link in self.links:
+            rel = link.get('rel')
+            if rel == 'canonical':
+                if canonical_link is None:
+                    canonical_link = link
+            elif rel == 'update':
+                if update_link is None:
+                    update_link = link
+            elif rel == 'deletion':
+                if deletion_link is None:
+                    deletion_link = link
+        self.canonical_link = canonical_link
+        self.update_link = update_link
+        self.deletion_link = deletion_link
 
     def get_source_link(self) -> str:
         """Extracts source link from message.
@@ -105,15 +171,8 @@ class Wis2Message:
             TypeError: If no canonical or update link found.
             ValueError: If URL cannot be parsed.
         """
-        # Find appropriate link
-        canonical_link = [link for link in self.links if link['rel'] == 'canonical']
-        update_link = [link for link in self.links if link['rel'] == 'update']
-        # support deletion links as well
-        delete_link = [link for link in self.links if link['rel'] == 'deletion']
-        if delete_link:
-            src_link = delete_link[0]
-        else:
-            src_link = update_link[0] if update_link else canonical_link[0] if canonical_link else None
+        # deletion takes precedence over update over canonical
+        src_link = self.deletion_link or self.update_link or self.canonical_link
 
         if not src_link:
             raise TypeError("missing src link")
@@ -157,8 +216,7 @@ class Wis2Message:
             True if message should be cached, False otherwise.
         """
         # first check if is delete message
-        delete_link = [link for link in self.links if link['rel'] == 'deletion']
-        if delete_link:
+        if self.deletion_link is not None:
             return False
         # check if cache property exists and or is set
         cache_msg_value = nested_get(self.msg, ['properties', 'cache'])
@@ -183,50 +241,39 @@ class Wis2Message:
         last_cache = float(last_cache)
         if self.pubtime_epoch <= last_cache:
             return False
-        else:
-            # check if update or delete link exists
-            if any([link for link in self.links if link['rel'] in ['update', 'deletion']]):
-                return True
-            else:
-                return False
-        return True
+        return self.is_update()
 
-    def cache_msg_data(self, use_content: bool = False) -> bytes:
-        """Caches message data from content or download.
+    def is_update(self) -> bool:
+        """Checks whether the message carries an update or deletion link.
 
-        Args:
-            use_content: If True, use inline content; else download.
+        Returns:
+            True if an update or deletion link exists, False otherwise.
+        """
+        return self.update_link is not None or self.deletion_link is not None
+
+    def cache_msg_data(self) -> bytes:
+        """Decodes the inline content of the message.
 
         Returns:
             The data bytes.
 
         Raises:
-            Exception: If encoding is unknown or unsupported.
+            Exception: If there is no inline content or its encoding is unknown or unsupported.
         """
-        dnld_link = self.src_link
-        dndld_keys = {'content': ['properties', 'content', 'value'],
-                      'encoding': ['properties', 'content', 'encoding'],
-                      'size': ['properties', 'content', 'size']}
-        for k, v in dndld_keys.items():
-            prop_val = nested_get(self.msg, v)
-            setattr(self, k, prop_val)
-        data_bytes = None
-        if use_content and self.content:
-            if self.encoding not in self.content_encodings:
-                raise Exception(f"unknown encoding {self.encoding} for {self.data_id}")
-            elif self.encoding == 'base64':
-                data_bytes = base64.b64decode(self.content)
-            elif self.encoding == 'utf-8':
-                data_bytes = self.content.encode()
-            else:
-                raise Exception(f"unsupported encoding {self.encoding} for {self.data_id}")
-
+        self.content = nested_get(self.msg, ['properties', 'content', 'value'])
+        self.encoding = nested_get(self.msg, ['properties', 'content', 'encoding'])
+        self.size = nested_get(self.msg, ['properties', 'content', 'size'])
+        if not self.content:
+            raise Exception(f"no inline content for {self.data_id}")
+        if self.encoding not in self.content_encodings:
+            raise Exception(f"unknown encoding {self.encoding} for {self.data_id}")
+        elif self.encoding == 'base64':
+            data_bytes = base64.b64decode(self.content)
+        elif self.encoding == 'utf-8':
+            data_bytes = self.content.encode()
         else:
-            data_file = self.download_file(dnld_link)
-            with open(data_file, "rb") as file:
-                data_bytes = file.read()
-        # set attribute
-        setattr(self, 'data_bytes', data_bytes)
+            raise Exception(f"unsupported encoding {self.encoding} for {self.data_id}")
+        self.data_bytes = data_bytes
         # set integrity block if missing in the msg
         self.set_integrity_block(data_bytes)
         return data_bytes
@@ -247,7 +294,7 @@ class Wis2Message:
             sh.update(data_bytes)
             b64_digest = base64.b64encode(sh.digest()).decode()
             # hex_digest = sh.hexdigest()
-            self.msg['properties']['integrity'] = self.integrity_block = {
+            self.integrity_block = {
                 "method": "sha512",
                 "value": b64_digest
             }
@@ -256,33 +303,54 @@ class Wis2Message:
     def format_cache_msg(self) -> dict:
         """Formats the message for caching.
 
+        The cache notification is an overlay on the original message, which is
+        left untouched: only the containers that change are new, all other
+        values, including inline content, are shared with the original.
+
         Returns:
-            The modified message dictionary for the cache.
+            The cache notification dictionary.
         """
         # message is the same, except for the msg_id (id is new uuid), links (new canonical link),
-        # and change the topic channel to cache
+        # the global cache property and the integrity block if it was missing, and no topic.
         # "type" (mimetype) should be retained from the original message.
-
-        cache_msg = self.msg
-        # update msg_id
-        cache_msg['id'] = self.new_uuid
-        # set the global cache property
-        cache_msg['properties']['global-cache'] = os.getenv('REPORT_BY')
-        # drop the topic
-        try:
-            cache_msg.pop('topic')
-        except:
-            pass
+        properties = dict(self.msg['properties'])
+        properties['global-cache'] = REPORT_BY
+        if self.integrity_block is not None:
+            properties['integrity'] = self.integrity_block
+        links = self.links
         if self.do_cache:
-            # overwrite the canonical link and update link if it exists
-            for link_type in ['canonical', 'update']:
-                links = [link for link in cache_msg['links'] if link['rel'] == link_type]
-                if links:
-                    original_link = cache_msg['links'].pop(cache_msg['links'].index(links[0]))
-                    new_link = deepcopy(original_link)
-                    new_link['href'] = self.dnld_url
-                    cache_msg['links'].append(new_link)
-        return cache_msg
+            # point the canonical link and update link if it exists at the cache bucket
+            links = [{**link, 'href': self.dnld_url}
+                     if link is self.canonical_link or link is self.update_link else link
+                     for link in links]
+        overlay = {'id': self.new_uuid, 'properties': properties, 'links': links}
+        return {k: overlay.get(k, v) for k, v in self.msg.items() if k != 'topic'}
+
+    def render_cache_msg(self) -> bytes:
+        """Serializes the cache notification for publishing.
+
+        With the stdlib json backend, inline content that would be written
+        unchanged, such as base64, is not run through the encoder: the rest of
+        the notification is serialized around a placeholder and the content
+        bytes are spliced in. orjson serializes it faster than it can be
+        checked. The result is the same as json_codec.dumps(format_cache_msg()).
+
+        Returns:
+            The cache notification as JSON bytes.
+        """
+        cache_msg = self.format_cache_msg()
+        content = cache_msg['properties'].get('content')
+        raw = None
+        if json_codec.backend == 'json' and isinstance(content, dict):
+            raw = json_verbatim(content.get('value'))
+        if raw is None:
+            return json_codec.dumps(cache_msg)
+        # properties is a copy already, the content block of the original stays as it is.
+        # the placeholder holds the unpredictable new uuid, the notification cannot contain it
+        placeholder = f"\0{self.new_uuid}"
+        cache_msg['properties']['content'] = {**content, 'value': placeholder}
+        head, tail = json_codec.dumps(cache_msg).split(json_codec.dumps(placeholder), 1)
+        return b''.join((head, b'"', raw, b'"', tail))
 
     @staticmethod
     def get_dt_str() -> str:
@@ -293,72 +361,13 @@ class Wis2Message:
         """
         return dt.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    def download_file(self, href: str, tmp_dir: str = '/tmp/') -> str:
-        """Downloads file from URL to temporary directory.
-
-        Args:
-            href: URL to download from.
-            tmp_dir: Directory to save to.
+    def download_session(self) -> 'requests.Session':
+        """Gets the HTTP session data objects are downloaded with.
 
         Returns:
-            Path to downloaded file.
-
-        Raises:
-            IOError: If disk space is insufficient.
-            requests.exceptions.RequestException: On download failure.
+            The container wide session of the dataserver, with limited retries.
         """
-        session = requests.Session()
-        # Configure limited retries to fail faster
-        retries = requests.packages.urllib3.util.retry.Retry(
-            total=2,  # Only retry once
-            backoff_factor=0.5,  # Short delay between retries
-            status_forcelist=[500, 502, 503, 504]  # Only retry on server errors
-        )
-
-        # Apply configuration to both HTTP and HTTPS connections
-        session.mount('http://', requests.adapters.HTTPAdapter(max_retries=retries))
-        session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries))
-
-        dev_mode = os.environ.get('DEV-MODE', 'False') not in ['True', 'true', '1', True]
-        tmp_path = os.path.join(tmp_dir, self.filename)
-        try:
-            # timeout=(10, 30) means: 10s connection timeout, 30s read timeout
-            with session.get(href, stream=True, timeout=(10, 30), verify=not dev_mode) as r:
-                r.raise_for_status()
-                expected_size = int(r.headers.get('content-length', 0))
-                downloaded_size = 0
-
-                # Make sure /tmp has enough space for larger files
-                if expected_size > 0:
-                    free_space = shutil.disk_usage('/tmp').free
-                    if free_space < expected_size:
-                        raise IOError(f"Not enough space in /tmp for file of size {expected_size} bytes. Free space: {free_space} bytes")
-                with open(tmp_path, 'wb') as f:
-                    # Increase chunk size for better performance with larger files
-                    for chunk in r.iter_content(chunk_size=32768):  # 32KB chunks
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_size += len(chunk)
-
-                # Verify download completeness for files with reported size
-                # too aggressive...
-                # if expected_size > 0 and downloaded_size != expected_size:
-                #     raise IOError(f"Downloaded size ({downloaded_size}) doesn't match expected size ({expected_size})")
-
-                # set attribute for deletion later
-                setattr(self, 'tmp_path', tmp_path)
-                return tmp_path
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to download file from {href}: {e}")
-            # Clean up partial download
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-            raise
-        except (IOError, OSError) as e:
-            print(f"I/O error while downloading {href}: {e}")
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-            raise
+        return http_sessions.sessions.get(self.dataserver)
 
     def validate_integrity(self) -> bool:
         """Validates data integrity against checksum.
@@ -367,31 +376,86 @@ class Wis2Message:
             True if valid.
 
         Raises:
-            Exception: If hashing method unsupported or checksum fails.
+            Exception: If hashing method unsupported.
+            IntegrityError: If checksum fails.
+        """
+        sh = self.integrity_hasher()
+        sh.update(self.data_bytes)
+        return self.check_digest(sh)
+
+    def integrity_hasher(self):
+        """Creates a hash object for the integrity method of the message.
+
+        Returns:
+            hashlib hash object, sha512 if the message has no integrity block.
+
+        Raises:
+            Exception: If hashing method unsupported.
         """
-        input_bytes = self.data_bytes
-        valid_methods = {
-            "sha256": hashlib.sha256,
-            "sha384": hashlib.sha384,
-            "sha512": hashlib.sha512,
-            "sha3-256": hashlib.sha3_256,
-            "sha3-384": hashlib.sha3_384,
-            "sha3-512": hashlib.sha3_512
-        }
+        if self.integrity_block is None:
+            return hashlib.sha512()
         method = self.integrity_block["method"]
-        if method not in valid_methods:
+        if method not in HASH_METHODS:
             raise Exception(f"Unsupported hashing method: {method}")
+        return HASH_METHODS[method]()
+
+    def check_digest(self, sh) -> bool:
+        """Checks a hash of the whole data object against the integrity block.
+
+        Sets the integrity block from the hash if the message has none.
 
-        sh = valid_methods[method]()
-        sh.update(input_bytes)
+        Args:
+            sh: hashlib hash object fed with the data object.
+
+        Returns:
+            True if valid.
+
+        Raises:
+            IntegrityError: If checksum fails.
+        """
         b64_digest = base64.b64encode(sh.digest()).decode()
+        if self.integrity_block is None:
+            self.integrity_block = {
+                "method": "sha512",
+                "value": b64_digest
+            }
         hex_digest = sh.hexdigest()
         if self.integrity_block["value"] not in [b64_digest, hex_digest]:
-            setattr(self, 'is_valid', False)
-            raise Exception(f"checksum failed for: {self.data_id}")
-        setattr(self, 'is_valid', True)
+            self.is_valid = False
+            raise IntegrityError(f"checksum failed for: {self.data_id}")
+        self.is_valid = True
         return True
 
+    def integrity_digest(self) -> str | None:
+        """Formats the integrity block as "method:base64 digest", hex values are converted.
+
+        Returns:
+            The digest string, or None if the message has no usable integrity block.
+        """
+        if not self.integrity_block:
+            return None
+        method = self.integrity_block.get("method")
+        value = self.integrity_block.get("value")
+        if method not in HASH_METHODS or not value:
+            return None
+        if len(value) == 2 * HASH_METHODS[method]().digest_size:
+            try:
+                value = base64.b64encode(bytes.fromhex(value)).decode()
+            except ValueError:
+                pass
+        return f"{method}:{value}"
+
+    def set_bucket_url(self) -> str:
+        """Sets the download url of the data object in the cache bucket.
+
+        Returns:
+            The bucket path key.
+        """
+        s3_key = self.format_s3_key()
+        dnld_url = os.path.join(f"https://{self.env['s3_bucket_name']}.s3.amazonaws.com", s3_key)
+        self.dnld_url = dnld_url
+        return s3_key
+
     def format_s3_key(self) -> str:
         """Formats S3 bucket key path.
 
@@ -415,18 +479,116 @@ class Wis2Message:
         Returns:
             The bucket path key.
         """
-
-        s3_client_obj = boto3.client('s3')
-        s3_key = self.format_s3_key()
         # construct download url
-        dnld_url = os.path.join(f"https://{self.env['s3_bucket_name']}.s3.amazonaws.com",
-                                s3_key)
-        setattr(self, 'dnld_url', dnld_url)
+        s3_key = self.set_bucket_url()
 
         if os.environ.get('DEV-MODE', 'False') in ['True', 'true', '1']:
             print(f"dev no upload: {s3_key}")
             return s3_key
-        s3_client_obj.upload_fileobj(Fileobj=io.BytesIO(data_bytes), Bucket=self.env['s3_bucket_name'],
-                                     Key=s3_key)
+        s3_uploads.put_bytes(self.env['s3_bucket_name'], s3_key, data_bytes, self.object_metadata())
         return s3_key
 
+    def object_metadata(self) -> dict:
+        """Builds the S3 user metadata stored with the data object.
+
+        Returns:
+            Metadata with the integrity digest, if known.
+        """
+        digest = self.integrity_digest()
+        return {'integrity': digest} if digest else {}
+
+    def has_content(self) -> bool:
+        """Checks whether the data object is inline in the message, so no download is needed.
+
+        Returns:
+            True if the message has inline content.
+        """
+        return bool(nested_get(self.msg, ['properties', 'content', 'value']))
+
+    def cache_to_bucket(self) -> str:
+        """Stores the data object in the cache bucket once its checksum validated.
+
+        Inline content is decoded and uploaded from memory, anything else is
+        streamed from the source link.
+
+        Returns:
+            The bucket path key.
+
+        Raises:
+            IntegrityError: If checksum fails, nothing is stored.
+        """
+        if self.has_content():
+            data_bytes = self.cache_msg_data()
+            self.validate_integrity()
+            return self.upload_to_bucket(data_bytes)
+        return self.stream_to_bucket(self.src_link)
+
+    def stream_to_bucket(self, href: str, multipart_threshold: int = MULTIPART_THRESHOLD,
+                         part_size: int = MULTIPART_PART_SIZE) -> str:
+        """Streams a download into the cache bucket without writing it to /tmp.
+
+        Each chunk feeds the integrity hash. Objects up to multipart_threshold
+        are collected in one buffer and sent with a single put_object after
+        the checksum validated, so they are held once, up to the threshold.
+        Larger ones go out part by part in a multipart upload while the
+        download continues. Every part is its own buffer, handed to the upload
+        without a copy, so memory peaks at the parts in flight plus the one
+        being filled, (concurrency + 1) * part_size. The upload is only
+        completed if the checksum validates and aborted otherwise.
+
+        Args:
+            href: URL to download from.
+            multipart_threshold: Size above which a multipart upload is used.
+            part_size: Size of each multipart part, at least 5 MiB.
+
+        Returns:
+            The bucket path key.
+
+        Raises:
+            IntegrityError: If checksum fails, nothing is stored.
+            requests.exceptions.RequestException: On download failure.
+        """
+        bucket = self.env['s3_bucket_name']
+        s3_key = self.set_bucket_url()
+        dev_mode = os.environ.get('DEV-MODE', 'False') in ['True', 'true', '1']
+
+        sh = self.integrity_hasher()
+        buffer = bytearray()
+        size = 0
+        upload = None
+        try:
+            # certificates are only verified in dev mode, as for every download before
+            with self.download_session().get(href, stream=True, timeout=(10, 30), verify=dev_mode) as r:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    sh.update(chunk)
+                    size += len(chunk)
+                    if dev_mode:
+                        continue
+                    buffer += chunk
+                    if upload is None and size > multipart_threshold:
+                        upload = s3_uploads.MultipartUpload(bucket, s3_key, self.object_metadata())
+                    while upload is not None and len(buffer) >= part_size:
+                        # the upload owns the part from here, the bytes past it start the next one
+                        rest = buffer[part_size:]
+                        del buffer[part_size:]
+                        upload.add_part(buffer)
+                        buffer = rest
+            self.size = size
+            self.check_digest(sh)
+            if dev_mode:
+                print(f"dev no upload: {s3_key}")
+            elif upload is not None:
+                if buffer:
+                    upload.add_part(buffer)
+                upload.complete()
+            else:
+                s3_uploads.s3_client().put_object(Body=buffer, Bucket=bucket, Key=s3_key,
+                                                  Metadata=self.object_metadata())
+            return s3_key
+        except Exception:
+            if upload is not None:
+                upload.abort()
+            raise
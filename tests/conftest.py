@@ -0,0 +1,30 @@
+import os
+import sys
+import time
+
+import pytest
+
+# the client and the manager lambda are deployed from their own directories and import their modules flat
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for directory in ('client', 'manager_lambda'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+
+@pytest.fixture
+def wait_until():
+    """polls a condition of a background thread, fails the test after timeout seconds"""
+    def wait(condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                pytest.fail('condition not met in time')
+            time.sleep(0.01)
+    return wait
+
+
+@pytest.fixture
+def redis_client():
+    fakeredis = pytest.importorskip('fakeredis')
+    # register_script needs a lua runtime
+    pytest.importorskip('lupa')
+    return fakeredis.FakeRedis(decode_responses=True)
@@ -0,0 +1,68 @@
+import socket
+import threading
+import time
+
+from broker_loop import BrokerEventLoop
+
+
+class FakeClient:
+    """paho client stand-in, reconnect() blocks until release is set"""
+
+    def __init__(self, host, connected=True):
+        self.host = host
+        self.port = 8883
+        self.release = threading.Event()
+        self.reconnect_calls = 0
+        self.reads = 0
+        self._sock = None
+        self._peer = None
+        if connected:
+            self._connect()
+
+    def _connect(self):
+        self._sock, self._peer = socket.socketpair()
+
+    def socket(self):
+        return self._sock
+
+    def reconnect(self):
+        self.reconnect_calls += 1
+        self.release.wait(5)
+        self._connect()
+
+    def want_write(self):
+        return False
+
+    def loop_read(self):
+        self._sock.recv(1024)
+        self.reads += 1
+
+    def loop_write(self):
+        pass
+
+    def loop_misc(self):
+        pass
+
+
+def test_blocking_connect_does_not_stall_other_brokers(wait_until):
+    stuck = FakeClient('stuck.example', connected=False)
+    healthy = FakeClient('healthy.example')
+    event_loop = BrokerEventLoop([stuck, healthy])
+
+    event_loop.run_once(timeout=0.01)
+    wait_until(lambda: stuck.reconnect_calls == 1)
+    healthy._peer.send(b'x')
+    st = time.monotonic()
+    event_loop.run_once(timeout=0.01)
+    assert time.monotonic() - st < 1
+    assert healthy.reads == 1
+
+    # no second attempt while the first one runs
+    event_loop.run_once(timeout=0.01)
+    assert stuck.reconnect_calls == 1
+
+    stuck.release.set()
+    wait_until(lambda: not event_loop._connecting)
+    stuck._peer.send(b'x')
+    event_loop.run_once(timeout=0.01)
+    assert stuck.reads == 1
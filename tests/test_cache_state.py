@@ -0,0 +1,65 @@
+from cache_state import CacheState, claim_key, digest_key
+
+TTL = 3600
+
+
+def test_claim_is_exclusive(redis_client):
+    state = CacheState(redis_client, TTL)
+    assert state.claim('d', 10.0, 'first') == (None, True, None)
+    last, claimed, _ = state.claim('d', 10.0, 'second')
+    assert claimed is False
+
+
+def test_release_only_drops_own_claim(redis_client):
+    state = CacheState(redis_client, TTL)
+    state.claim('d', 10.0, 'first')
+    state.release('d', 10.0, 'other')
+    assert redis_client.get(claim_key('d', 10.0)) == 'first'
+    state.release('d', 10.0, 'first')
+    assert redis_client.get(claim_key('d', 10.0)) is None
+
+
+def test_commit_records_pubtime_and_metrics(redis_client):
+    state = CacheState(redis_client, TTL)
+    state.claim('d', 10.0, 'token')
+    metrics = [('c|ds|wmo_wis2_gc_downloaded_total', 'inc', 1), ('c|ds|wmo_wis2_gc_dataserver_status_flag', 'set', 1)]
+    assert state.commit('d', 10.0, False, 'token', metrics)
+    assert float(redis_client.get('d')) == 10.0
+    assert 0 < redis_client.ttl('d') <= TTL
+    assert redis_client.get('c|ds|wmo_wis2_gc_downloaded_total') == '1'
+    assert redis_client.get('c|ds|wmo_wis2_gc_dataserver_status_flag') == '1'
+    # the claim is released with the commit
+    assert redis_client.get(claim_key('d', 10.0)) is None
+
+
+def test_commit_rejects_duplicates_but_takes_newer_updates(redis_client):
+    state = CacheState(redis_client, TTL)
+    metric = [('c|ds|wmo_wis2_gc_downloaded_total', 'inc', 1)]
+    assert state.commit('d', 10.0, False, 't1', metric)
+    # same pubtime, or a newer canonical notification of a data_id already cached
+    assert not state.commit('d', 10.0, True, 't2', metric)
+    assert not state.commit('d', 20.0, False, 't3', metric)
+    # a newer update is taken, an older one is not
+    assert state.commit('d', 20.0, True, 't4', metric)
+    assert not state.commit('d', 15.0, True, 't5', metric)
+    assert redis_client.get('c|ds|wmo_wis2_gc_downloaded_total') == '2'
+    assert float(redis_client.get('d')) == 20.0
+
+
+def test_claim_reads_last_pubtime_and_digest(redis_client):
+    state = CacheState(redis_client, TTL, digest_seconds=600)
+    state.commit('d', 10.0, False, 'token', s3_key='data/a.bufr', digest='sha512:abc')
+    last, claimed, digest = state.claim('d', 20.0, 'next', s3_key='data/a.bufr')
+    assert float(last) == 10.0 and claimed and digest == 'sha512:abc'
+    # the digest expires with the object it describes, not with the notification
+    assert 0 < redis_client.ttl(digest_key('data/a.bufr')) <= 600
+    assert redis_client.ttl('d') > 600
+
+
+def test_commit_without_digest_keeps_the_upload_expiry(redis_client):
+    state = CacheState(redis_client, TTL, digest_seconds=600)
+    state.commit('d', 10.0, True, 't1', s3_key='data/a.bufr', digest='sha512:abc')
+    redis_client.expire(digest_key('data/a.bufr'), 5)
+    # an unchanged object that was not uploaded again
+    assert state.commit('d', 20.0, True, 't2', s3_key='data/a.bufr')
+    assert redis_client.ttl(digest_key('data/a.bufr')) <= 5
@@ -0,0 +1,121 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, DataserverUnavailable
+
+STATUS = 'centre|host|wmo_wis2_gc_dataserver_breaker_status'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, 'time', lambda: now[0])
+    return now
+
+
+def fail(breaker, token):
+    breaker.acquire('host', token, STATUS)
+    return breaker.record('host', token, 'error', 0.1, STATUS)
+
+
+def test_caps_downloads_in_flight(redis_client, clock):
+    breaker = CircuitBreaker(redis_client, max_in_flight=2)
+    breaker.acquire('host', 'a', STATUS)
+    breaker.acquire('host', 'b', STATUS)
+    with pytest.raises(DataserverUnavailable, match='busy'):
+        breaker.acquire('host', 'c', STATUS)
+    breaker.record('host', 'a', 'ok', 0.1, STATUS)
+    breaker.acquire('host', 'c', STATUS)
+
+
+def test_busy_dataserver_is_not_waited_for(redis_client, clock, monkeypatch):
+    breaker = CircuitBreaker(redis_client, max_in_flight=1)
+    breaker.acquire('host', 'a', STATUS)
+    monkeypatch.setattr(circuit_breaker.time, 'sleep', lambda seconds: pytest.fail('waited for a busy dataserver'))
+    with pytest.raises(DataserverUnavailable, match='busy'):
+        breaker.acquire('host', 'b', STATUS)
+
+
+def test_stale_slots_expire(redis_client, clock):
+    breaker = CircuitBreaker(redis_client, max_in_flight=1, lease_seconds=60)
+    breaker.acquire('host', 'dead', STATUS)
+    clock[0] += 61
+    breaker.acquire('host', 'next', STATUS)
+
+
+def test_opens_on_error_rate_then_probes(redis_client, clock):
+    breaker = CircuitBreaker(redis_client, error_rate=0.5, min_requests=4, open_seconds=30)
+    for i in range(3):
+        assert fail(breaker, f"t{i}") == 'closed'
+    assert fail(breaker, 't3') == 'open'
+    assert redis_client.get(STATUS) == '2'
+    with pytest.raises(DataserverUnavailable, match='open'):
+        breaker.acquire('host', 'rejected', STATUS)
+    # half-open after open_seconds: a single probe, which closes the breaker on success
+    clock[0] += 31
+    breaker.acquire('host', 'probe', STATUS)
+    assert redis_client.get(STATUS) == '1'
+    with pytest.raises(DataserverUnavailable):
+        breaker.acquire('host', 'second', STATUS)
+    assert breaker.record('host', 'probe', 'ok', 0.1, STATUS) == 'closed'
+    assert redis_client.get(STATUS) == '0'
+
+
+def test_failed_probe_reopens(redis_client, clock):
+    breaker = CircuitBreaker(redis_client, min_requests=1, open_seconds=30)
+    assert fail(breaker, 't0') == 'open'
+    clock[0] += 31
+    assert fail(breaker, 'probe') == 'open'
+
+
+def test_guard_ignores_failures_that_are_not_the_dataservers(redis_client, clock):
+    breaker = CircuitBreaker(redis_client, min_requests=1)
+    with pytest.raises(KeyError):
+        with breaker.guard('host', 't', STATUS, failures=(IOError,)):
+            raise KeyError('bug')
+    with pytest.raises(IOError):
+        with breaker.guard('host', 't', STATUS, failures=(IOError,)):
+            raise IOError('timeout')
+    with pytest.raises(DataserverUnavailable):
+        breaker.acquire('host', 'next', STATUS)
+
+
+def test_opens_on_slow_downloads(redis_client, clock):
+    breaker = CircuitBreaker(redis_client, error_rate=0.5, min_requests=4, slow_seconds=5, slow_rate=0.5)
+    for i, latency in enumerate([0.2, 0.3, 6.0]):
+        breaker.acquire('host', f"t{i}", STATUS)
+        assert breaker.record('host', f"t{i}", 'ok', latency, STATUS) == 'closed'
+    breaker.acquire('host', 't3', STATUS)
+    # two of four downloads in the window took slow_seconds or longer, none failed
+    assert breaker.record('host', 't3', 'ok', 5.0, STATUS) == 'open'
+    with pytest.raises(DataserverUnavailable, match='open'):
+        breaker.acquire('host', 'rejected', STATUS)
+
+
+def test_slow_probe_reopens(redis_client, clock):
+    breaker = CircuitBreaker(redis_client, min_requests=1, open_seconds=30, slow_seconds=5)
+    assert fail(breaker, 't0') == 'open'
+    clock[0] += 31
+    breaker.acquire('host', 'probe', STATUS)
+    assert breaker.record('host', 'probe', 'ok', 8.0, STATUS) == 'open'
+
+
+def test_slow_downloads_leave_the_window(redis_client, clock):
+    breaker = CircuitBreaker(redis_client, min_requests=2, window_seconds=60, slow_seconds=5, slow_rate=0.6)
+    breaker.acquire('host', 'old', STATUS)
+    breaker.record('host', 'old', 'ok', 9.0, STATUS)
+    clock[0] += 61
+    breaker.acquire('host', 'fast', STATUS)
+    breaker.record('host', 'fast', 'ok', 0.1, STATUS)
+    breaker.acquire('host', 'slow', STATUS)
+    # one of the two downloads in the window is slow, with the old one it would be two of three
+    assert breaker.record('host', 'slow', 'ok', 9.0, STATUS) == 'closed'
+
+
+def test_guard_measures_the_download(redis_client, clock, monkeypatch):
+    breaker = CircuitBreaker(redis_client, min_requests=1, slow_seconds=5)
+    elapsed = [100.0]
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', lambda: elapsed[0])
+    with breaker.guard('host', 't', STATUS):
+        elapsed[0] += 7
+    assert redis_client.get(STATUS) == '2'
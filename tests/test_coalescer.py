@@ -0,0 +1,73 @@
+import time
+
+from coalescer import UpdateCoalescer
+
+
+def coalescer(window=0.05, max_delay=1.0):
+    forwarded = []
+    return UpdateCoalescer(lambda *args: forwarded.append(args), window, max_delay), forwarded
+
+
+def test_newer_pubtime_replaces_held_notification(wait_until):
+    c, forwarded = coalescer()
+    c.offer('d', 10.0, 'first')
+    c.offer('d', 20.0, 'second')
+    wait_until(lambda: forwarded)
+    time.sleep(0.1)
+    assert forwarded == [('second',)]
+    assert c.stats() == {'held': 0, 'forwarded': 1, 'superseded': 1, 'discarded': 0}
+
+
+def test_older_or_equal_pubtime_is_discarded(wait_until):
+    c, forwarded = coalescer()
+    c.offer('d', 20.0, 'held')
+    c.offer('d', 10.0, 'older')
+    c.offer('d', 20.0, 'equal')
+    wait_until(lambda: forwarded)
+    assert forwarded == [('held',)]
+    assert c.stats() == {'held': 0, 'forwarded': 1, 'superseded': 0, 'discarded': 2}
+
+
+def test_deletion_with_the_same_pubtime_replaces_canonical(wait_until):
+    c, forwarded = coalescer()
+    c.offer('d', 10.0, 'canonical', rank=0)
+    c.offer('d', 10.0, 'deletion', rank=2)
+    c.offer('d', 10.0, 'update', rank=1)
+    wait_until(lambda: forwarded)
+    assert forwarded == [('deletion',)]
+    assert c.stats()['superseded'] == 1
+
+
+def test_data_ids_are_held_separately(wait_until):
+    c, forwarded = coalescer()
+    c.offer('a', 10.0, 'a')
+    c.offer('b', 10.0, 'b')
+    wait_until(lambda: len(forwarded) == 2)
+    assert sorted(forwarded) == [('a',), ('b',)]
+
+
+def test_forwarded_within_max_delay_when_superseded_continuously(wait_until):
+    c, forwarded = coalescer(window=0.1, max_delay=0.3)
+    st = time.monotonic()
+    pubtime = 0.0
+    while not forwarded and time.monotonic() - st < 2:
+        pubtime += 1
+        c.offer('d', pubtime, pubtime)
+        time.sleep(0.02)
+    assert forwarded
+    assert time.monotonic() - st < 0.6
+
+
+def test_close_forwards_held_notifications():
+    c, forwarded = coalescer(window=60, max_delay=60)
+    c.offer('a', 10.0, 'a')
+    c.offer('b', 10.0, 'b')
+    c.offer('a', 20.0, 'a newer')
+    c.close()
+    assert forwarded == [('a newer',), ('b',)]
+    assert c.stats() == {'held': 0, 'forwarded': 2, 'superseded': 1, 'discarded': 0}
+    # nothing is held once closed
+    c.offer('c', 10.0, 'c')
+    assert forwarded[-1] == ('c',)
+    time.sleep(0.05)
+    assert len(forwarded) == 3
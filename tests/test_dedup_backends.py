@@ -0,0 +1,52 @@
+import pytest
+
+from dedup_backends import DedupBackend, InMemoryRedis, LocalDedupBackend, RedisDedupBackend, create_backend
+from dedup_store import BucketedDedupStore
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        DedupBackend()
+
+
+def test_local_backend_claims_first_copy_only():
+    backend = LocalDedupBackend(BucketedDedupStore(ttl_seconds=60))
+    assert backend.claim_many(['a', 'b', 'a']) == [True, True, False]
+    assert backend.claim_many(['b', 'c']) == [False, True]
+
+
+def test_redis_backend_shares_claims_between_clients():
+    redis = InMemoryRedis()
+    first, second = RedisDedupBackend(redis), RedisDedupBackend(redis)
+    assert first.claim_many(['a', 'b']) == [True, True]
+    assert second.claim_many(['a', 'b', 'c']) == [False, False, True]
+    # the front cache answers repeats without redis
+    assert first.claim_many(['a'])[0] is False
+    assert first.stats()['front_hits'] == 1
+    assert second.stats()['lost'] == 2
+
+
+def test_in_memory_redis_expires_claims():
+    now = [0.0]
+    redis = InMemoryRedis(clock=lambda: now[0])
+    assert redis.set('k', 1, nx=True, ex=10)
+    assert redis.set('k', 1, nx=True, ex=10) is None
+    now[0] = 11
+    assert redis.set('k', 1, nx=True, ex=10)
+
+
+def test_redis_backend_forwards_when_redis_is_down():
+    class Down(InMemoryRedis):
+        def set(self, *args, **kwargs):
+            raise ConnectionError('down')
+
+    backend = RedisDedupBackend(Down())
+    assert backend.claim_many(['a', 'b']) == [True, True]
+    assert backend.stats()['errors'] == 1
+
+
+def test_create_backend_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        create_backend('memcached', 60, 1024)
+    with pytest.raises(ValueError):
+        create_backend('redis', 60, 1024)
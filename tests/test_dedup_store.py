@@ -0,0 +1,88 @@
+from dedup_store import ENTRY_BYTES, BucketedDedupStore
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def store(clock, **kwargs):
+    return BucketedDedupStore(clock=clock, **kwargs)
+
+
+def test_second_copy_is_a_hit():
+    s = store(Clock())
+    assert not s.check_and_add('a')
+    assert s.check_and_add('a')
+    assert not s.check_and_add('b')
+    assert s.stats() == {'entries': 2, 'buckets': 1, 'capacity': 64 * 1024 * 1024 // ENTRY_BYTES,
+                         'hits': 1, 'misses': 2, 'evicted_early': 0}
+
+
+def test_keys_expire_with_their_bucket_at_the_ttl():
+    clock = Clock()
+    s = store(clock, ttl_seconds=300, bucket_seconds=60)
+    s.check_and_add('a')
+    clock.now = 299.9
+    assert s.check_and_add('a')
+    clock.now = 300
+    assert not s.check_and_add('a')
+    assert len(s) == 1
+
+
+def test_whole_bucket_expires_at_once():
+    # a key added at the end of a bucket goes with the keys added at its start
+    clock = Clock()
+    s = store(clock, ttl_seconds=300, bucket_seconds=60)
+    s.check_and_add('early')
+    clock.now = 59.9
+    s.check_and_add('late')
+    clock.now = 60
+    s.check_and_add('next bucket')
+    clock.now = 300
+    assert not s.check_and_add('late')
+    assert not s.check_and_add('early')
+    assert s.check_and_add('next bucket')
+
+
+def test_expiry_after_a_quiet_period_drops_every_bucket():
+    clock = Clock()
+    s = store(clock, ttl_seconds=300, bucket_seconds=60)
+    for i in range(5):
+        clock.now = i * 60
+        s.check_and_add(f"k{i}")
+    assert s.stats()['buckets'] == 5
+    clock.now = 10_000
+    assert not s.check_and_add('k4')
+    assert s.stats()['buckets'] == 1
+    assert len(s) == 1
+
+
+def test_memory_budget_drops_the_oldest_bucket_early():
+    clock = Clock()
+    s = store(clock, ttl_seconds=300, bucket_seconds=60, memory_budget_bytes=3 * ENTRY_BYTES)
+    s.check_and_add('a')
+    s.check_and_add('b')
+    clock.now = 60
+    s.check_and_add('c')
+    assert s.stats()['evicted_early'] == 0
+    s.check_and_add('d')
+    stats = s.stats()
+    assert stats['capacity'] == 3
+    assert stats['evicted_early'] == 2
+    assert stats['entries'] == 2
+    # well within the ttl, but evicted
+    assert not s.check_and_add('a')
+    assert s.check_and_add('c')
+
+
+def test_memory_budget_keeps_the_current_bucket():
+    s = store(Clock(), memory_budget_bytes=2 * ENTRY_BYTES)
+    for key in 'abcde':
+        s.check_and_add(key)
+    assert len(s) == 5
+    assert s.stats()['evicted_early'] == 0
+    assert s.check_and_add('a')
@@ -0,0 +1,104 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_sessions import DnsCache, SessionRegistry
+
+
+class FakeResolver:
+    def __init__(self, addresses):
+        self.addresses = addresses
+        self.calls = []
+
+    def __call__(self, host, port, family=0, type=0):
+        self.calls.append(host)
+        if host not in self.addresses:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port)) for address in self.addresses[host]]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class HostEcho(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.headers['Host'].encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    pytest.importorskip('requests')
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), HostEcho)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_addresses_are_cached_for_the_ttl():
+    resolver = FakeResolver({'data.example': ['192.0.2.1', '192.0.2.1', '192.0.2.2']})
+    clock = Clock()
+    cache = DnsCache(ttl_seconds=60, resolve=resolver, clock=clock)
+    assert cache.addresses('data.example', 443) == ['192.0.2.1', '192.0.2.2']
+    clock.now = 59.9
+    assert cache.addresses('data.example', 443) == ['192.0.2.1', '192.0.2.2']
+    assert (cache.hits, cache.misses) == (1, 1)
+    # expired at the ttl
+    clock.now = 60
+    resolver.addresses['data.example'] = ['192.0.2.3']
+    assert cache.addresses('data.example', 443) == ['192.0.2.3']
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_resolution_failures_are_not_cached():
+    resolver = FakeResolver({})
+    cache = DnsCache(resolve=resolver, clock=Clock())
+    with pytest.raises(socket.gaierror):
+        cache.addresses('data.example', 443)
+    resolver.addresses['data.example'] = ['192.0.2.1']
+    assert cache.addresses('data.example', 443) == ['192.0.2.1']
+
+
+def test_one_session_per_dataserver():
+    pytest.importorskip('requests')
+    registry = SessionRegistry()
+    session = registry.get('a.example')
+    assert registry.get('a.example') is session
+    assert registry.get('b.example') is not session
+
+
+def test_session_reuses_its_connection(server):
+    registry = SessionRegistry()
+    session = registry.get('127.0.0.1')
+    for _ in range(3):
+        assert session.get(f"http://127.0.0.1:{server}/data").status_code == 200
+    assert registry.stats()['127.0.0.1'] == {'requests': 3, 'connections': 1, 'reused': 2}
+
+
+def test_dataserver_sessions_use_the_cache_only(server):
+    # 127.0.0.2 refuses the connection, the next address is tried
+    resolver = FakeResolver({'data.example': ['127.0.0.2', '127.0.0.1']})
+    cache = DnsCache(resolve=resolver, clock=Clock())
+    getaddrinfo = socket.getaddrinfo
+    session = SessionRegistry(dns_cache=cache).get('data.example')
+    response = session.get(f"http://data.example:{server}/data")
+    assert response.text == f"data.example:{server}"
+    assert resolver.calls == ['data.example']
+    # redis, s3 and the broker still resolve through the system resolver
+    assert socket.getaddrinfo is getaddrinfo
@@ -0,0 +1,155 @@
+import signal
+import threading
+import time
+
+import pytest
+
+from ingest_pipeline import IngestPipeline
+
+
+class BlockingHandler:
+    """records every batch, holds the workers until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.handled = []
+
+    def __call__(self, batch):
+        self.started.set()
+        self.release.wait(5)
+        self.handled.extend(batch)
+
+
+def fill(pipeline, handler, count):
+    # the first message occupies the single worker, the rest wait in the queue
+    pipeline.submit('t', b'0')
+    assert handler.started.wait(5)
+    for i in range(1, count + 1):
+        assert pipeline.submit('t', str(i).encode())
+
+
+def test_unknown_policy_is_refused():
+    with pytest.raises(ValueError):
+        IngestPipeline(lambda batch: None, policy='spin')
+
+
+def test_drop_policy_discards_when_full():
+    handler = BlockingHandler()
+    pipeline = IngestPipeline(handler, workers=1, max_depth=2, policy='drop')
+    fill(pipeline, handler, 2)
+    assert not pipeline.submit('t', b'full')
+    stats = pipeline.stats()
+    assert stats['dropped'] == 1
+    assert stats['parked'] == 0
+    assert stats['depth'] == 2
+    handler.release.set()
+    assert pipeline.close(timeout=5)
+    assert [payload for _, payload, _ in handler.handled] == [b'0', b'1', b'2']
+
+
+def test_park_policy_waits_for_room():
+    handler = BlockingHandler()
+    pipeline = IngestPipeline(handler, workers=1, max_depth=1, policy='park', park_timeout=5)
+    fill(pipeline, handler, 1)
+    threading.Timer(0.1, handler.release.set).start()
+    assert pipeline.submit('t', b'parked')
+    stats = pipeline.stats()
+    assert stats['parked'] == 1
+    assert stats['parked_seconds'] > 0
+    assert stats['dropped'] == 0
+    assert pipeline.close(timeout=5)
+    assert handler.handled[-1] == ('t', b'parked', None)
+
+
+def test_park_timeout_drops():
+    handler = BlockingHandler()
+    pipeline = IngestPipeline(handler, workers=1, max_depth=1, policy='park', park_timeout=0.05)
+    fill(pipeline, handler, 1)
+    assert not pipeline.submit('t', b'late')
+    stats = pipeline.stats()
+    assert stats['parked'] == 1
+    assert stats['dropped'] == 1
+    handler.release.set()
+    assert pipeline.close(timeout=5)
+    assert b'late' not in [payload for _, payload, _ in handler.handled]
+
+
+def test_close_drains_queued_messages():
+    handler = BlockingHandler()
+    pipeline = IngestPipeline(handler, workers=1, max_depth=100)
+    fill(pipeline, handler, 20)
+    threading.Timer(0.05, handler.release.set).start()
+    assert pipeline.close(timeout=5)
+    assert len(handler.handled) == 21
+    assert pipeline.stats()['processed'] == 21
+    assert not pipeline.submit('t', b'after close')
+    assert pipeline.stats()['dropped'] == 1
+
+
+def test_close_gives_up_after_timeout():
+    handler = BlockingHandler()
+    pipeline = IngestPipeline(handler, workers=1)
+    fill(pipeline, handler, 1)
+    st = time.monotonic()
+    assert not pipeline.close(timeout=0.05)
+    assert time.monotonic() - st < 1
+    handler.release.set()
+
+
+def test_handler_exception_does_not_stop_the_worker():
+    handled = []
+
+    def handler(batch):
+        if any(payload == b'poison' for _, payload, _ in batch):
+            raise RuntimeError('bad batch')
+        handled.extend(batch)
+
+    pipeline = IngestPipeline(handler, workers=1, batch_size=1)
+    pipeline.submit('t', b'poison')
+    pipeline.submit('t', b'fine', 'broker-a')
+    assert pipeline.close(timeout=5)
+    assert handled == [('t', b'fine', 'broker-a')]
+    stats = pipeline.stats()
+    assert stats['handler_errors'] == 1
+    assert stats['processed'] == 2
+
+
+@pytest.mark.skipif(not hasattr(signal, 'setitimer'), reason='needs SIGALRM')
+def test_close_from_a_signal_on_the_parked_thread():
+    # SIGTERM runs close() on the network thread, possibly while it is parked in submit
+    handler = BlockingHandler()
+    pipeline = IngestPipeline(handler, workers=1, max_depth=1, policy='park', park_timeout=10)
+    fill(pipeline, handler, 1)
+    drained = []
+
+    def shutdown(signum, frame):
+        drained.append(pipeline.close(timeout=3))
+        raise SystemExit(0)
+
+    previous = signal.signal(signal.SIGALRM, shutdown)
+    try:
+        threading.Timer(0.2, handler.release.set).start()
+        signal.setitimer(signal.ITIMER_REAL, 0.05)
+        st = time.monotonic()
+        with pytest.raises(SystemExit):
+            pipeline.submit('t', b'parked')
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+    # the queued messages drained, the parked one was not waited for
+    assert drained == [True]
+    assert time.monotonic() - st < 2
+    assert [payload for _, payload, _ in handler.handled] == [b'0', b'1']
+
+
+def test_parked_submit_stops_once_closed():
+    handler = BlockingHandler()
+    pipeline = IngestPipeline(handler, workers=1, max_depth=1, policy='park', park_timeout=10)
+    fill(pipeline, handler, 1)
+    threading.Timer(0.05, pipeline.close, kwargs={'timeout': 0}).start()
+    st = time.monotonic()
+    assert not pipeline.submit('t', b'parked')
+    assert time.monotonic() - st < 2
+    assert pipeline.stats()['dropped'] == 1
+    handler.release.set()
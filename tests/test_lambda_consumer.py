@@ -0,0 +1,160 @@
+import time
+
+import pytest
+
+import wis2_lambda_consumer as consumer
+
+ARN = 'arn:aws:sqs:us-east-1:123456789012:wis2-gc.fifo'
+DLQ_ARN = 'arn:aws:sqs:us-east-1:123456789012:wis2-gc-dlq.fifo'
+
+
+class FakeSQS:
+    def __init__(self):
+        self.calls = []
+        self.dead_letters = []
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self.calls.append((QueueUrl, Entries))
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+    def send_message(self, **kwargs):
+        self.dead_letters.append(kwargs)
+        return {'MessageId': 'dlq'}
+
+
+@pytest.fixture
+def sqs(monkeypatch, redis_client):
+    fake = FakeSQS()
+    monkeypatch.setattr(consumer, 'sqs_client', lambda: fake)
+    monkeypatch.setattr(consumer, 'redis_host', redis_client)
+    monkeypatch.setattr(consumer, 'dlq_arn', DLQ_ARN)
+    return fake
+
+
+def record(message_id, receives=1):
+    return {'messageId': message_id, 'receiptHandle': f"handle-{message_id}", 'eventSourceARN': ARN,
+            'attributes': {'ApproximateReceiveCount': str(receives), 'MessageGroupId': 'g'}, 'body': '{}'}
+
+
+def test_deferred_group_comes_back_after_a_short_delay(monkeypatch, sqs, redis_client):
+    # b was deferred on both earlier receives
+    redis_client.set('deferrals:b', 2)
+    results = iter([True, consumer.DEFERRED])
+    monkeypatch.setattr(consumer, 'process_record', lambda sqs_msg: next(results))
+    records = [record('a'), record('b', receives=3), record('c')]
+    assert consumer.process_group(records) == ['b', 'c']
+    [(url, entries)] = sqs.calls
+    assert url == 'https://sqs.us-east-1.amazonaws.com/123456789012/wis2-gc.fifo'
+    assert [(entry['ReceiptHandle'], entry['VisibilityTimeout']) for entry in entries] == [
+        ('handle-b', consumer.defer_seconds * 4), ('handle-c', consumer.defer_seconds)]
+    assert (redis_client.get('deferrals:b'), redis_client.get('deferrals:c')) == ('3', '1')
+    assert redis_client.get('deferrals:a') is None
+
+
+def test_failed_group_keeps_the_visibility_timeout(monkeypatch, sqs, redis_client):
+    monkeypatch.setattr(consumer, 'process_record', lambda sqs_msg: sqs_msg['messageId'] != 'a')
+    assert consumer.process_group([record('a'), record('b')]) == ['a', 'b']
+    assert not sqs.calls
+    # b was only held back behind a
+    assert (redis_client.get('deferrals:a'), redis_client.get('deferrals:b')) == (None, '1')
+
+
+def test_record_failing_twice_is_moved_to_the_dlq(monkeypatch, sqs):
+    processed = []
+    monkeypatch.setattr(consumer, 'process_record', lambda sqs_msg: processed.append(sqs_msg['messageId']) or True)
+    failing = dict(record('a', receives=3), messageAttributes={'topic': {'stringValue': 't', 'dataType': 'String'}})
+    assert consumer.process_group([failing, record('b')]) == []
+    assert processed == ['b']
+    [dead_letter] = sqs.dead_letters
+    assert dead_letter['QueueUrl'] == 'https://sqs.us-east-1.amazonaws.com/123456789012/wis2-gc-dlq.fifo'
+    assert (dead_letter['MessageBody'], dead_letter['MessageGroupId']) == ('{}', 'g')
+    assert dead_letter['MessageAttributes'] == {'topic': {'DataType': 'String', 'StringValue': 't'}}
+
+
+def test_deferrals_are_not_failed_attempts(monkeypatch, sqs, redis_client):
+    monkeypatch.setattr(consumer, 'process_record', lambda sqs_msg: True)
+    # received 6 times, deferred on 4 of them: a single failed attempt
+    redis_client.set('deferrals:a', 4)
+    assert consumer.process_group([record('a', receives=6)]) == []
+    assert not sqs.dead_letters
+    # deferrals past max_deferrals count as failures
+    redis_client.set('deferrals:b', 20)
+    consumer.process_group([record('b', receives=consumer.max_deferrals + consumer.max_record_failures + 1)])
+    assert len(sqs.dead_letters) == 1
+
+
+def test_deferral_is_capped(sqs):
+    consumer.defer_records([record('a', receives=20)])
+    assert sqs.calls[0][1][0]['VisibilityTimeout'] == consumer.max_defer_seconds
+
+
+class ClaimedElsewhere:
+    """cache state of a notification another invocation is caching, records the keys it is asked about"""
+    def __init__(self):
+        self.s3_keys = []
+
+    def claim(self, data_id, pubtime, token, s3_key=None):
+        self.s3_keys.append(s3_key)
+        return None, False, None
+
+
+def test_topic_attribute_wins_over_the_payload(monkeypatch):
+    state = ClaimedElsewhere()
+    monkeypatch.setattr(consumer, 'cache_state', state)
+    body = {'id': '1', 'topic': 'origin/a/wis2/other-centre/data/core/weather',
+            'properties': {'data_id': 'a/71628', 'pubtime': '2025-01-01T00:00:00Z'},
+            'links': [{'rel': 'canonical', 'href': 'https://dd.example.org/71628.bufr4'}]}
+    sqs_msg = {'messageId': 'a', 'body': consumer.json_codec.dumps(body),
+               'messageAttributes': {'topic': {'stringValue': 'origin/a/wis2/ca-eccc-msc/data/core/weather',
+                                               'dataType': 'String'}}}
+    assert consumer.process_record(sqs_msg) is True
+    assert state.s3_keys == ['data/ca-eccc-msc/data/core/weather/71628.bufr4']
+
+
+def test_bad_source_link_releases_the_claim(monkeypatch, redis_client):
+    from cache_state import CacheState
+    from rfc3339 import parse_rfc3339
+    state = CacheState(redis_client, 3600)
+    monkeypatch.setattr(consumer, 'cache_state', state)
+    monkeypatch.setattr(consumer.Wis2Message, 'has_content', lambda self: True)
+
+    def bad_link(self):
+        raise TypeError('href is not a string')
+
+    monkeypatch.setattr(consumer.Wis2Message, 'cache_to_bucket', bad_link)
+    body = {'id': '1', 'topic': 'origin/a/wis2/ca-eccc-msc/data/core/weather',
+            'properties': {'data_id': 'a/71628', 'pubtime': '2025-01-01T00:00:00Z'},
+            'links': [{'rel': 'canonical', 'href': 'https://dd.example.org/71628.bufr4'}]}
+    assert consumer.process_record({'messageId': 'a', 'body': consumer.json_codec.dumps(body)}) is True
+    # a redelivery takes the claim at once instead of being suppressed until it expires
+    pubtime = parse_rfc3339('2025-01-01T00:00:00Z')
+    assert state.claim('a/71628', pubtime, 'redelivery')[1]
+
+
+class StubPublisher:
+    host = 'stub-broker'
+
+    def flush(self, timeout=None):
+        return 0
+
+
+def test_handler_fails_only_the_rest_of_the_failing_group(monkeypatch, sqs):
+    seen = {}
+
+    def process(sqs_msg):
+        group = sqs_msg['attributes']['MessageGroupId']
+        seen.setdefault(group, []).append(sqs_msg['messageId'])
+        # let the groups interleave on the worker threads
+        time.sleep(0.01)
+        return sqs_msg['messageId'] != 'a2'
+
+    monkeypatch.setattr(consumer, 'process_record', process)
+    monkeypatch.setattr(consumer, 'publishers', [StubPublisher()])
+    ids = ['a1', 'b1', 'a2', 'c1', 'b2', 'a3', 'c2', 'b3', 'c3']
+    records = [{'messageId': message_id, 'body': '{}',
+                'attributes': {'ApproximateReceiveCount': '1', 'MessageGroupId': message_id[0]}}
+               for message_id in ids]
+    response = consumer.msg_handler({'Records': records}, None)
+    assert [failure['itemIdentifier'] for failure in response['batchItemFailures']] == ['a2', 'a3']
+    # records of a group run in queue order, none after the failed one
+    assert seen == {'a': ['a1', 'a2'], 'b': ['b1', 'b2', 'b3'], 'c': ['c1', 'c2', 'c3']}
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from lazy_redis import LazyRedis
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'manager_lambda')
+
+
+def test_cold_start_does_not_import_redis():
+    pytest.importorskip('redis')
+    pytest.importorskip('paho.mqtt')
+    env = dict(os.environ, CACHE_ENDPOINT='localhost', MQTT_BROKER_HOST='localhost', DNS_CACHE_TTL_SECONDS='0')
+    result = subprocess.run([sys.executable, '-c', "import sys, wis2_lambda_consumer; print('redis' in sys.modules)"],
+                            cwd=LAMBDA_DIR, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == 'False'
+
+
+def test_client_is_created_on_first_use(monkeypatch):
+    redis = pytest.importorskip('redis')
+    created = []
+    monkeypatch.setattr(redis, 'Redis', lambda *args, **kwargs: created.append((args, kwargs)) or 'client')
+    lazy = LazyRedis('cache.example', port=6379, decode_responses=True)
+    assert created == []
+    assert lazy.client == 'client'
+    assert lazy.client == 'client'
+    assert created == [(('cache.example',), {'port': 6379, 'decode_responses': True})]
+
+
+def test_scripts_register_on_first_call(redis_client):
+    lazy = LazyRedis()
+    script = lazy.register_script("return redis.call('INCR', KEYS[1]) + tonumber(ARGV[1])")
+    # set here instead of connecting to a server
+    lazy._client = redis_client
+    assert script(keys=['n'], args=[10]) == 11
+    assert script(keys=['n'], args=[10]) == 12
+    assert lazy.get('n') == '2'
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client')
+
+
+def test_imports_from_a_checkout():
+    pytest.importorskip('boto3')
+    pytest.importorskip('paho.mqtt')
+    pytest.importorskip('dotenv')
+    # a fresh interpreter in client/, without the manager lambda on the path
+    env = {name: value for name, value in os.environ.items() if name != 'PYTHONPATH'}
+    result = subprocess.run([sys.executable, '-c', 'import main; print(main.json_codec.backend)'],
+                            cwd=CLIENT_DIR, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.fixture(scope='module')
+def main():
+    for module in ('boto3', 'paho.mqtt', 'dotenv'):
+        pytest.importorskip(module)
+    import main
+    return main
+
+
+def test_pubtime_epoch_parses_like_the_lambda(main):
+    from rfc3339 import parse_rfc3339
+    for pubtime in ('2025-03-09T12:34:56Z', '2025-03-09T12:34:56:250Z', '2025-03-09T12:34:56.123456789+0100'):
+        assert main.pubtime_epoch(pubtime) == parse_rfc3339(pubtime)
+    assert main.pubtime_epoch('2025-03-09T12:34:56+25:99') is None
+    assert main.pubtime_epoch(None) is None
+
+
+def notification(message_id, pubtime='2025-03-09T12:00:00Z', rel='canonical', data_id='ca-eccc-msc/data/71628'):
+    return {'id': message_id, 'properties': {'data_id': data_id, 'pubtime': pubtime},
+            'links': [{'rel': rel, 'href': 'https://dd.weather.gc.ca/71628.bufr4'}]}
+
+
+def test_copies_from_different_brokers_share_a_key(main):
+    assert main.dedup_key(notification('from-broker-a')) == main.dedup_key(notification('from-broker-b'))
+
+
+def test_updates_and_deletions_are_not_keyed_as_their_original(main):
+    keys = {main.dedup_key(notification('m', rel=rel)) for rel in ('canonical', 'update', 'deletion')}
+    assert len(keys) == 3
+    # a later update of the same data_id is a new key as well
+    assert main.dedup_key(notification('m', rel='update')) != main.dedup_key(
+        notification('m', pubtime='2025-03-09T12:05:00Z', rel='update'))
+    assert main.dedup_key(notification('m')) != main.dedup_key(notification('m', data_id='ca-eccc-msc/data/71629'))
+
+
+def test_link_kind_follows_the_lambda_precedence(main):
+    msg = notification('m')
+    msg['links'] = [{'rel': 'canonical'}, {'rel': 'update'}, {'rel': 'via'}]
+    assert main.link_kind(msg) == 'update'
+    msg['links'].append({'rel': 'deletion'})
+    assert main.link_kind(msg) == 'deletion'
+    msg['links'] = [{'rel': 'via'}]
+    assert main.link_kind(msg) == 'canonical'
+
+
+def test_notification_without_pubtime_falls_back_to_its_id(main):
+    msg = notification('message-id')
+    del msg['properties']['pubtime']
+    assert main.dedup_key(msg) == 'message-id'
@@ -0,0 +1,60 @@
+import pytest
+
+from message_groups import MAX_GROUP_ID_LENGTH, make_group_strategy
+
+TOPIC = 'cache/a/wis2/ca-eccc-msc/data/core/weather/surface-based-observations/synop'
+
+
+def test_data_id_strategy_strips_punctuation():
+    group = make_group_strategy('data_id')
+    assert group('ca-eccc-msc:data/core/2024_01.bufr', TOPIC) == 'caecccmscdatacore2024_01bufr'
+
+
+def test_data_id_strategy_keeps_the_tail_of_long_ids():
+    data_id = 'prefix' + 'x' * 200 + 'tail'
+    group_id = make_group_strategy('data_id')(data_id, TOPIC)
+    assert len(group_id) == MAX_GROUP_ID_LENGTH
+    assert group_id.endswith('tail')
+
+
+def test_sharded_strategy_is_stable_and_bounded():
+    group = make_group_strategy('sharded', shards=4)
+    data_ids = [f"centre/data/{i}" for i in range(200)]
+    groups = {group(data_id, TOPIC) for data_id in data_ids}
+    assert groups == {'shard-0', 'shard-1', 'shard-2', 'shard-3'}
+    # the same data_id always lands in the same shard, whatever the topic
+    assert group(data_ids[0], TOPIC) == group(data_ids[0], 'origin/a/wis2/other')
+
+
+def test_sharded_strategy_needs_a_shard():
+    with pytest.raises(ValueError):
+        make_group_strategy('sharded', shards=0)
+
+
+def test_centre_strategy_groups_by_centre():
+    group = make_group_strategy('centre')
+    assert group('one', TOPIC) == group('two', TOPIC) == 'caecccmsc'
+    assert group('one', 'cache/a/wis2/de-dwd/data') == 'dedwd'
+
+
+def test_centre_strategy_falls_back_to_the_topic():
+    # a topic too short to name a centre
+    assert make_group_strategy('centre')('one', 'cache/a') == 'cachea'
+
+
+@pytest.mark.parametrize('strategy, data_id, topic', [
+    ('data_id', '', TOPIC),
+    ('data_id', ':/.-', TOPIC),
+    ('centre', 'one', 'cache/a/wis2/-/data'),
+    ('centre', 'one', ''),
+])
+def test_missing_key_gets_a_stable_group(strategy, data_id, topic):
+    group = make_group_strategy(strategy)
+    group_id = group(data_id, topic)
+    assert group_id.startswith('key-')
+    assert group_id == group(data_id, topic)
+
+
+def test_unknown_strategy_is_refused():
+    with pytest.raises(ValueError):
+        make_group_strategy('topic')
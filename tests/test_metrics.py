@@ -0,0 +1,32 @@
+from metrics import CallbackMetric, Counter, Histogram, MetricsRegistry
+
+
+def test_counter_metadata_uses_the_sample_name():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter('wis2_client_reconnects', 'Reconnections', ('broker',)))
+    registry.register(CallbackMetric('wis2_client_sqs_sent', 'Sent', lambda: 3, metric_type='counter'))
+    counter.inc('globalbroker.example')
+    lines = registry.render().splitlines()
+    assert lines[:3] == ['# HELP wis2_client_reconnects_total Reconnections',
+                         '# TYPE wis2_client_reconnects_total counter',
+                         'wis2_client_reconnects_total{broker="globalbroker.example"} 1']
+    assert lines[3:6] == ['# HELP wis2_client_sqs_sent_total Sent', '# TYPE wis2_client_sqs_sent_total counter',
+                          'wis2_client_sqs_sent_total 3']
+
+
+def test_gauge_and_histogram_keep_their_name():
+    registry = MetricsRegistry()
+    registry.register(CallbackMetric('wis2_client_spill_bytes', 'Bytes', lambda: 0))
+    registry.register(Histogram('wis2_client_sqs_send_seconds', 'Latency', (0.1,))).observe(0.05)
+    text = registry.render()
+    assert '# TYPE wis2_client_spill_bytes gauge' in text
+    assert '# TYPE wis2_client_sqs_send_seconds histogram' in text
+    assert 'wis2_client_sqs_send_seconds_bucket{le="0.1"} 1' in text
+
+
+def test_escapes_label_values_and_help():
+    registry = MetricsRegistry()
+    registry.register(CallbackMetric('m', 'line one\nback\\slash', lambda: {'a"b\\c\nd': 1}, ('subscription',)))
+    lines = registry.render().splitlines()
+    assert lines[0] == '# HELP m line one\\nback\\\\slash'
+    assert lines[2] == 'm{subscription="a\\"b\\\\c\\nd"} 1'
@@ -0,0 +1,52 @@
+import threading
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from mqtt_publisher import MqttPublisher
+
+
+class FakeClient:
+    def __init__(self, rc=mqtt.MQTT_ERR_SUCCESS):
+        self.rc = rc
+        self.published = []
+
+    def reconnect(self):
+        raise AssertionError('only the network thread reconnects')
+
+    def publish(self, topic, payload, qos):
+        self.published.append((topic, payload))
+        info = mqtt.MQTTMessageInfo(len(self.published))
+        info.rc = self.rc
+        return info
+
+
+def publisher(client, connect_timeout=1):
+    p = MqttPublisher('broker.example', 8883, 'user', 'password', connect_timeout=connect_timeout)
+    p._client = client
+    return p
+
+
+def test_waits_for_the_network_thread_to_reconnect():
+    client = FakeClient()
+    p = publisher(client)
+    threading.Timer(0.1, p._connected.set).start()
+    p.publish('cache/a/wis2/x', b'{}')
+    assert client.published == [('cache/a/wis2/x', b'{}')]
+
+
+def test_raises_when_the_connection_does_not_come_back():
+    p = publisher(FakeClient(), connect_timeout=0.1)
+    with pytest.raises(ConnectionError):
+        p.publish('cache/a/wis2/x', b'{}')
+
+
+def test_message_queued_while_disconnected_is_not_published_twice():
+    client = FakeClient(rc=mqtt.MQTT_ERR_NO_CONN)
+    p = publisher(client)
+    p._connected.set()
+    info = p.publish('cache/a/wis2/x', b'{}')
+    assert len(client.published) == 1
+    # paho sends it after the reconnect, flush waits for the PUBACK
+    info._set_as_published()
+    assert p.flush(timeout=0.1) == 0
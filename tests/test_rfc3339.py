@@ -0,0 +1,54 @@
+import sys
+from datetime import datetime
+
+import pytest
+
+from rfc3339 import parse_rfc3339
+
+
+@pytest.mark.parametrize('value', [
+    '2025-01-01T00:00:01Z',
+    '2025-03-09T12:34:56.123Z',
+    '2025-03-09T12:34:56.123456Z',
+    '2025-03-09T12:34:56+02:00',
+    '2025-03-09T12:34:56-05:30',
+    '2025-03-09T12:34:56.5+0100',
+    '2024-02-29T23:59:59.999999-0000',
+    '2025-03-09 12:34:56Z',
+    '1969-12-31T23:59:59.25Z',
+])
+@pytest.mark.skipif(sys.version_info < (3, 11), reason='fromisoformat reads Z, +hhmm and short fractions from 3.11')
+def test_agrees_with_fromisoformat(value):
+    assert parse_rfc3339(value) == datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def test_missing_offset_is_utc():
+    assert parse_rfc3339('2025-03-09T12:34:56') == parse_rfc3339('2025-03-09T12:34:56Z')
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2025-03-09T12:34:56.123456789Z', '2025-03-09T12:34:56.123456Z'),
+    ('2025-03-09T12:34:56:250Z', '2025-03-09T12:34:56.250Z'),
+    ('2025-03-09t12:34:56,5z', '2025-03-09T12:34:56.5Z'),
+])
+def test_formats_beyond_fromisoformat(value, expected):
+    assert parse_rfc3339(value) == parse_rfc3339(expected)
+
+
+@pytest.mark.parametrize('value', [
+    '',
+    'yesterday',
+    '2025-03-09',
+    '2025-03-09T12:34Z',
+    '2025-13-01T00:00:00Z',
+    '2025-02-30T00:00:00Z',
+    '2025-03-09T24:00:00Z',
+    '2025-03-09T12:60:00Z',
+    '2025-03-09T12:34:56+25:00',
+    '2025-03-09T12:34:56+02:60',
+    '2025-03-09T12:34:56+25:99',
+    '2025-03-09T12:34:56 +02:00',
+])
+def test_rejects_invalid_input(value):
+    with pytest.raises(ValueError):
+        parse_rfc3339(value)
@@ -0,0 +1,153 @@
+import json
+import os
+
+from botocore.exceptions import ClientError
+
+from spill_buffer import REJECT_FILE, SpillBuffer
+from sqs_batcher import MAX_BATCH_BYTES
+
+
+class FakeQueue:
+    def __init__(self):
+        self.sent = []
+        self.failures = []
+
+    def send_message_batch(self, Entries):
+        failed = self.failures.pop(0)(Entries) if self.failures else []
+        failed_ids = {failure['Id'] for failure in failed}
+        self.sent.extend(entry for entry in Entries if entry['Id'] not in failed_ids)
+        return {'Failed': failed}
+
+
+def test_appended_records_drain_in_order(tmp_path, wait_until):
+    queue = FakeQueue()
+    spill = SpillBuffer(queue, str(tmp_path))
+    for i in range(25):
+        assert spill.append(f"body {i}", 'group', {'topic': {'DataType': 'String', 'StringValue': 't'}})
+    wait_until(lambda: len(queue.sent) == 25)
+    assert [entry['MessageBody'] for entry in queue.sent] == [f"body {i}" for i in range(25)]
+    assert queue.sent[0]['MessageAttributes']['topic']['StringValue'] == 't'
+    wait_until(lambda: spill.stats()['segments'] == 0)
+    assert spill.stats()['bytes'] == 0
+
+
+def test_retries_failed_entries(tmp_path, wait_until):
+    queue = FakeQueue()
+    queue.failures.append(lambda entries: [{'Id': entry['Id'], 'SenderFault': False, 'Code': 'ServiceUnavailable'}
+                                           for entry in entries if entry['MessageBody'] == 'b'])
+    spill = SpillBuffer(queue, str(tmp_path))
+    spill.append('b', 'g')
+    spill.append('a', 'g')
+    wait_until(lambda: sorted(entry['MessageBody'] for entry in queue.sent) == ['a', 'b'], timeout=5)
+
+
+def test_drops_when_full(tmp_path):
+    spill = SpillBuffer(FakeQueue(), str(tmp_path), max_bytes=100)
+    spill.append('x' * 40, 'g')
+    assert not spill.append('y' * 60, 'g')
+    assert spill.stats()['dropped'] == 1
+
+
+def test_drains_segments_left_by_a_previous_run(tmp_path, wait_until):
+    with open(os.path.join(tmp_path, 'segment-000000000003.log'), 'wb') as f:
+        f.write(b'{"body": "left over", "group_id": "g", "attributes": null}\n')
+    queue = FakeQueue()
+    spill = SpillBuffer(queue, str(tmp_path))
+    wait_until(lambda: [entry['MessageBody'] for entry in queue.sent] == ['left over'])
+    # new segments continue the sequence
+    spill.append('new', 'g')
+    wait_until(lambda: len(queue.sent) == 2)
+
+
+def test_skips_a_torn_trailing_line(tmp_path, wait_until):
+    with open(os.path.join(tmp_path, 'segment-000000000000.log'), 'wb') as f:
+        f.write(b'{"body": "whole", "group_id": "g", "attributes": null}\n{"body": "to')
+    queue = FakeQueue()
+    spill = SpillBuffer(queue, str(tmp_path))
+    wait_until(lambda: spill.stats()['segments'] == 0)
+    assert [entry['MessageBody'] for entry in queue.sent] == ['whole']
+    assert spill.stats()['dropped'] == 1
+
+
+def test_keeps_draining_after_an_unexpected_error(tmp_path, wait_until):
+    def boom(entries):
+        raise RuntimeError('unexpected')
+
+    queue = FakeQueue()
+    queue.failures.append(boom)
+    spill = SpillBuffer(queue, str(tmp_path))
+    spill.append('a', 'g')
+    wait_until(lambda: [entry['MessageBody'] for entry in queue.sent] == ['a'])
+    assert spill.stats()['drained'] == 1
+
+
+def client_error(code, status=400):
+    return ClientError({'Error': {'Code': code, 'Message': code}, 'ResponseMetadata': {'HTTPStatusCode': status}},
+                       'SendMessageBatch')
+
+
+def test_batches_count_the_topic_attribute(tmp_path, wait_until):
+    refused = []
+
+    def too_long(entries):
+        size = sum(len(entry['MessageBody']) + sum(len(name) + len(value['DataType']) + len(value['StringValue'])
+                                                   for name, value in entry['MessageAttributes'].items())
+                   for entry in entries)
+        if size > MAX_BATCH_BYTES:
+            refused.append(len(entries))
+            raise client_error('AWS.SimpleQueueService.BatchRequestTooLong')
+        return []
+
+    queue = FakeQueue()
+    queue.failures.extend([too_long] * 10)
+    spill = SpillBuffer(queue, str(tmp_path))
+    topic = {'topic': {'DataType': 'String', 'StringValue': 't' * 1000}}
+    for i in range(2):
+        spill.append(str(i) * (MAX_BATCH_BYTES // 2 - 500), 'g', topic)
+    wait_until(lambda: len(queue.sent) == 2)
+    assert not refused
+
+
+def test_splits_a_refused_batch_and_rejects_the_poison_entry(tmp_path, wait_until):
+    def poison(entries):
+        if any(entry['MessageBody'] == 'poison' for entry in entries):
+            raise client_error('InvalidParameterValue')
+        return []
+
+    queue = FakeQueue()
+    queue.failures.extend([poison] * 10)
+    spill = SpillBuffer(queue, str(tmp_path))
+    for body in ['a', 'b', 'poison', 'c', 'd']:
+        spill.append(body, 'g')
+    wait_until(lambda: spill.stats()['segments'] == 0)
+    assert [entry['MessageBody'] for entry in queue.sent] == ['a', 'b', 'c', 'd']
+    assert spill.stats()['rejected'] == 1
+    with open(os.path.join(tmp_path, REJECT_FILE)) as f:
+        [rejected] = [json.loads(line) for line in f]
+    assert (rejected['body'], rejected['error']) == ('poison', 'InvalidParameterValue')
+
+
+def test_rejects_entries_sqs_reports_as_sender_faults(tmp_path, wait_until):
+    queue = FakeQueue()
+    queue.failures.append(lambda entries: [{'Id': entry['Id'], 'SenderFault': True, 'Code': 'InvalidMessageContents'}
+                                           for entry in entries if entry['MessageBody'] == 'b'])
+    spill = SpillBuffer(queue, str(tmp_path))
+    spill.append('a', 'g')
+    spill.append('b', 'g')
+    wait_until(lambda: spill.stats()['segments'] == 0)
+    assert [entry['MessageBody'] for entry in queue.sent] == ['a']
+    assert spill.stats()['rejected'] == 1
+
+
+def test_waits_out_throttling_without_rejecting(tmp_path, wait_until):
+    def throttled(entries):
+        raise client_error('ThrottlingException')
+
+    queue = FakeQueue()
+    queue.failures.extend([throttled, throttled])
+    spill = SpillBuffer(queue, str(tmp_path))
+    spill.append('a', 'g')
+    spill.append('b', 'g')
+    wait_until(lambda: len(queue.sent) == 2, timeout=10)
+    assert spill.stats()['rejected'] == 0
+    assert not os.path.exists(os.path.join(tmp_path, REJECT_FILE))
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from sqs_batcher import MAX_BATCH_ENTRIES, SqsBatchSender
+
+
+class FakeQueue:
+    def __init__(self, fail=None):
+        self.fail = fail or (lambda entries, call: [])
+        self.calls = []
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send_message_batch(self, Entries):
+        with self._lock:
+            self.calls.append(Entries)
+            failed = self.fail(Entries, len(self.calls))
+            failed_ids = {f['Id'] for f in failed}
+            self.sent.extend(entry['MessageBody'] for entry in Entries if entry['Id'] not in failed_ids)
+        return {'Failed': failed}
+
+
+class FakeSpill:
+    def __init__(self):
+        self.records = []
+
+    def append(self, body, group_id, attributes=None):
+        self.records.append(body)
+        return True
+
+
+def test_batches_up_to_ten_entries(wait_until):
+    queue = FakeQueue()
+    sender = SqsBatchSender(queue, linger_seconds=0.05)
+    for i in range(25):
+        sender.send(f"m{i}", 'g')
+    wait_until(lambda: len(queue.sent) == 25)
+    assert all(len(call) <= MAX_BATCH_ENTRIES for call in queue.calls)
+    assert sender.stats()['entries_sent'] == 25
+
+
+def test_retries_transient_failures(wait_until):
+    # the first attempt of m1 fails
+    queue = FakeQueue(lambda entries, call: [{'Id': entry['Id'], 'SenderFault': False, 'Code': 'Throttled'}
+                                             for entry in entries if entry['MessageBody'] == 'm1' and call == 1])
+    sender = SqsBatchSender(queue, linger_seconds=0.01)
+    sender.send('m0', 'g')
+    sender.send('m1', 'g')
+    wait_until(lambda: sorted(queue.sent) == ['m0', 'm1'])
+    assert sender.stats()['entries_retried'] == 1
+
+
+def test_drops_sender_faults(wait_until):
+    queue = FakeQueue(lambda entries, call: [{'Id': entry['Id'], 'SenderFault': True, 'Code': 'InvalidMessage'}
+                                             for entry in entries])
+    sender = SqsBatchSender(queue, linger_seconds=0.01)
+    sender.send('bad', 'g')
+    wait_until(lambda: sender.stats()['entries_dropped'] == 1)
+    assert len(queue.calls) == 1
+
+
+def test_spills_after_max_attempts(wait_until):
+    queue = FakeQueue(lambda entries, call: [{'Id': entry['Id'], 'SenderFault': False, 'Code': 'Unavailable'}
+                                             for entry in entries])
+    spill = FakeSpill()
+    sender = SqsBatchSender(queue, linger_seconds=0.01, max_attempts=2, spill=spill)
+    sender.send('m', 'g')
+    wait_until(lambda: spill.records == ['m'])
+    assert len(queue.calls) == 2
+    assert sender.stats()['entries_spilled'] == 1
+
+
+def test_oversized_messages_are_dropped():
+    sender = SqsBatchSender(FakeQueue())
+    sender.send('x' * (256 * 1024 + 1), 'g')
+    assert sender.stats()['entries_dropped'] == 1
+
+
+def test_flush_waits_for_retries():
+    queue = FakeQueue(lambda entries, call: [{'Id': entry['Id'], 'SenderFault': False, 'Code': 'Throttled'}
+                                             for entry in entries if call == 1])
+    sender = SqsBatchSender(queue, linger_seconds=0.01)
+    sender.send('m', 'g')
+    assert sender.flush(timeout=5)
+    assert queue.sent == ['m']
+    assert sender.stats()['in_flight'] == 0
+
+
+def test_flush_waits_for_batches_in_flight():
+    def slow(entries, call):
+        time.sleep(0.2)
+        return []
+    queue = FakeQueue(slow)
+    sender = SqsBatchSender(queue, linger_seconds=0)
+    sender.send('m', 'g')
+    assert sender.flush(timeout=5)
+    assert queue.sent == ['m']
+
+
+def test_flush_gives_up_after_timeout():
+    release = threading.Event()
+    sender = SqsBatchSender(FakeQueue(lambda entries, call: release.wait(5) and []), linger_seconds=0)
+    sender.send('m', 'g')
+    assert not sender.flush(timeout=0.1)
+    release.set()
@@ -0,0 +1,169 @@
+import base64
+import copy
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import json_codec
+import s3_uploads
+from wis2_message import IntegrityError, Wis2Message
+
+DATA = os.urandom(5000)
+
+
+def notification(data=DATA, content=False):
+    msg = {
+        'id': '00000000-0000-0000-0000-000000000001',
+        'type': 'Feature',
+        'version': 'v04',
+        'geometry': None,
+        'properties': {
+            'data_id': 'ca-eccc-msc/data/core/weather/surface-based-observations/synop/WIGOS_0-20000-0-71628',
+            'pubtime': '2025-01-01T00:00:01Z',
+            'integrity': {'method': 'sha512', 'value': base64.b64encode(hashlib.sha512(data).digest()).decode()},
+        },
+        'links': [{'rel': 'canonical', 'type': 'application/bufr', 'href': 'https://dd.weather.gc.ca/71628.bufr4'}],
+        'topic': 'origin/a/wis2/ca-eccc-msc/data/core/weather/surface-based-observations/synop',
+    }
+    if content:
+        msg['properties']['content'] = {'encoding': 'base64', 'value': base64.b64encode(data).decode(),
+                                        'size': len(data)}
+    return msg
+
+
+class FakeResponse:
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for offset in range(0, len(self.data), self.chunk_size):
+            yield self.data[offset:offset + self.chunk_size]
+
+
+class FakeSession:
+    def __init__(self, data, chunk_size=300):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    def get(self, href, **kwargs):
+        return FakeResponse(self.data, self.chunk_size)
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.parts = []
+        self.aborted = False
+
+    def put_object(self, Bucket, Key, Body, Metadata):
+        self.objects[Key] = bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key, Metadata):
+        return {'UploadId': 'upload'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        # keep the body itself, it must not change while the upload holds it
+        self.parts.append((PartNumber, Body, bytes(Body)))
+        return {'ETag': str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = sorted(self.parts, key=lambda part: part[0])
+        assert all(bytes(body) == sent for _, body, sent in parts)
+        self.objects[Key] = b''.join(sent for _, _, sent in parts)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(s3_uploads, '_client', fake)
+    monkeypatch.setattr(s3_uploads, '_part_executor', ThreadPoolExecutor(max_workers=2))
+    monkeypatch.delenv('DEV-MODE', raising=False)
+    return fake
+
+
+def stream(monkeypatch, msg, session, **kwargs):
+    monkeypatch.setattr(Wis2Message, 'download_session', lambda self: session)
+    wis2_msg = Wis2Message(msg, {'s3_bucket_name': 'bucket'})
+    return wis2_msg.stream_to_bucket(wis2_msg.src_link, **kwargs), wis2_msg
+
+
+@pytest.mark.parametrize('threshold', [1500, 2500])
+def test_large_objects_are_uploaded_in_parts(s3, monkeypatch, threshold):
+    s3_key, wis2_msg = stream(monkeypatch, notification(), FakeSession(DATA), multipart_threshold=threshold,
+                              part_size=1000)
+    assert s3.objects[s3_key] == DATA
+    assert [len(sent) for _, _, sent in sorted(s3.parts, key=lambda part: part[0])] == [1000] * 5
+    assert wis2_msg.size == len(DATA)
+
+
+def test_small_objects_are_put_once(s3, monkeypatch):
+    s3_key, _ = stream(monkeypatch, notification(), FakeSession(DATA), multipart_threshold=10000, part_size=1000)
+    assert s3.objects[s3_key] == DATA
+    assert not s3.parts
+
+
+def test_checksum_failure_aborts_the_upload(s3, monkeypatch):
+    with pytest.raises(IntegrityError):
+        stream(monkeypatch, notification(b'other data'), FakeSession(DATA), multipart_threshold=1500,
+               part_size=1000)
+    assert s3.aborted
+    assert not s3.objects
+
+
+def test_cache_msg_data_decodes_inline_content():
+    wis2_msg = Wis2Message(notification(content=True), {'s3_bucket_name': 'bucket'})
+    assert wis2_msg.cache_msg_data() == DATA
+
+
+def test_cache_msg_data_needs_inline_content():
+    wis2_msg = Wis2Message(notification(), {'s3_bucket_name': 'bucket'})
+    with pytest.raises(Exception, match='no inline content'):
+        wis2_msg.cache_msg_data()
+
+
+@pytest.fixture(params=['json', 'orjson'])
+def codec(request):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    json_codec.use_backend(request.param)
+    yield request.param
+    json_codec.use_backend('auto')
+
+
+@pytest.mark.parametrize('msg', [
+    notification(),
+    notification(content=True),
+    # inline content the stdlib encoder has to escape
+    {**notification(), 'properties': {**notification()['properties'],
+                                      'content': {'encoding': 'utf-8', 'value': 'Tést "quoted"\n', 'size': 14}}},
+    # an update, and a message that is relayed but not cached
+    {**notification(), 'links': [{'rel': 'update', 'href': 'https://dd.weather.gc.ca/71628.bufr4'}]},
+    {**notification(), 'properties': {**notification()['properties'], 'cache': False}},
+], ids=['canonical', 'base64 content', 'escaped content', 'update', 'not cached'])
+def test_render_matches_the_formatted_message(codec, msg):
+    original = copy.deepcopy(msg)
+    wis2_msg = Wis2Message(msg, {'s3_bucket_name': 'bucket'})
+    if wis2_msg.do_cache:
+        wis2_msg.set_bucket_url()
+    rendered = wis2_msg.render_cache_msg()
+    assert rendered == json_codec.dumps(wis2_msg.format_cache_msg())
+    assert msg == original
+    cache_msg = json_codec.loads(rendered)
+    assert cache_msg['id'] == wis2_msg.new_uuid
+    assert 'topic' not in cache_msg
+    assert cache_msg['properties'].get('content') == original['properties'].get('content')